@@ -22,14 +22,10 @@ import argparse		# for parse the args
 import ConfigParser	# for parse the config file
 import os			# for log mkdir
 import sys			# for py version
-import time			# for time.sleep()
-import subprocess	# for starting rtl_fm and multimon-ng
 
 from includes import globalVars  # Global variables
 from includes import MyTimedRotatingFileHandler  # extension of TimedRotatingFileHandler
-from includes import checkSubprocesses  # check startup of the subprocesses
 from includes.helper import configHandler
-from includes.helper import freqConverter
 
 #
 # Check for exisiting config/config.ini-file
@@ -48,10 +44,10 @@ try:
 									description="BOSWatch is a Python Script to recive and decode german BOS information with rtl_fm and multimon-NG",
 									epilog="More options you can find in the extern config.ini file in the folder /config")
 	# parser.add_argument("-c", "--channel", help="BOS Channel you want to listen")
-	parser.add_argument("-f", "--freq", help="Frequency you want to listen to", required=True)
+	parser.add_argument("-f", "--freq", help="Frequency you want to listen to (not needed with section [Receivers] in config.ini)")
 	parser.add_argument("-d", "--device", help="Device you want to use (check with rtl_test)", type=int, default=0)
 	parser.add_argument("-e", "--error", help="Frequency-error of your device in PPM", default=0)
-	parser.add_argument("-a", "--demod", help="Demodulation functions", choices=['FMS', 'ZVEI', 'POC512', 'POC1200', 'POC2400'], required=True, nargs="+")
+	parser.add_argument("-a", "--demod", help="Demodulation functions", choices=['FMS', 'ZVEI', 'POC512', 'POC1200', 'POC2400'], nargs="+")
 	parser.add_argument("-s", "--squelch", help="Level of squelch", type=int, default=0)
 	parser.add_argument("-g", "--gain", help="Level of gain", type=int, default=100)
 	parser.add_argument("-u", "--usevarlog", help="Use '/var/log/boswatch' for logfiles instead of subdir 'log' in BOSWatch directory", action="store_true")
@@ -74,8 +70,7 @@ except:
 #
 try:
 	# initialization:
-	rtl_fm = None
-	multimon_ng = None
+	rawWriter = None
 	nmaHandler = None
 
 	try:
@@ -169,38 +164,16 @@ try:
 		logging.debug("BOSWatch given arguments")
 		if args.test:
 			logging.debug(" - Test-Mode!")
-
-		logging.debug(" - Frequency: %s", freqConverter.freqToHz(args.freq))
+		logging.debug(" - Frequency: %s", args.freq)
 		logging.debug(" - Device: %s", args.device)
 		logging.debug(" - PPM Error: %s", args.error)
 		logging.debug(" - Squelch: %s", args.squelch)
 		logging.debug(" - Gain: %s", args.gain)
-
-		demodulation = ""
-		if "FMS" in args.demod:
-			demodulation += "-a FMSFSK "
-			logging.debug(" - Demod: FMS")
-		if "ZVEI" in args.demod:
-			demodulation += "-a ZVEI1 "
-			logging.debug(" - Demod: ZVEI")
-		if "POC512" in args.demod:
-			demodulation += "-a POCSAG512 "
-			logging.debug(" - Demod: POC512")
-		if "POC1200" in args.demod:
-			demodulation += "-a POCSAG1200 "
-			logging.debug(" - Demod: POC1200")
-		if "POC2400" in args.demod:
-			demodulation += "-a POCSAG2400 "
-			logging.debug(" - Demod: POC2400")
-
+		logging.debug(" - Demod: %s", args.demod)
 		logging.debug(" - Use /var/log: %s", args.usevarlog)
 		logging.debug(" - Verbose Mode: %s", args.verbose)
 		logging.debug(" - Quiet Mode: %s", args.quiet)
 
-		if not args.quiet: #only if not quiet mode
-			from includes import shellHeader
-			shellHeader.printHeader(args)
-
 		if args.test:
 			logging.warning("!!! We are in Test-Mode !!!")
 
@@ -217,8 +190,11 @@ try:
 		logging.debug("reading config file")
 		globalVars.config = ConfigParser.ConfigParser()
 		globalVars.config.read(globalVars.script_path+"/config/config.ini")
+		# typed snapshot for the hot path
+		from includes import configSnapshot
+		globalVars.settings = configSnapshot.createSnapshot(globalVars.config)
 		# if given loglevel is debug:
-		if globalVars.config.getint("BOSWatch","loglevel") == 10:
+		if globalVars.settings.BOSWatch.loglevel == 10:
 			configHandler.checkConfig("BOSWatch")
 			configHandler.checkConfig("multicastAlarm")
 			configHandler.checkConfig("Filters")
@@ -227,6 +203,10 @@ try:
 			configHandler.checkConfig("POC")
 			configHandler.checkConfig("Plugins")
 			configHandler.checkConfig("Filters")
+			if globalVars.config.has_section("Receivers"):
+				configHandler.checkConfig("Receivers")
+			if globalVars.config.has_section("ClientServer"):
+				configHandler.checkConfig("ClientServer")
 			#NMAHandler is outputed below
 	except:
 		# we couldn't work without config -> exit
@@ -239,35 +219,70 @@ try:
 	# Set the loglevel and backupCount of the file handler
 	#
 	try:
-		logging.debug("set loglevel of fileHandler to: %s",globalVars.config.getint("BOSWatch","loglevel"))
-		fh.setLevel(globalVars.config.getint("BOSWatch","loglevel"))
-		logging.debug("set backupCount of fileHandler to: %s", globalVars.config.getint("BOSWatch","backupCount"))
-		fh.setBackupCount(globalVars.config.getint("BOSWatch","backupCount"))
+		logging.debug("set loglevel of fileHandler to: %s", globalVars.settings.BOSWatch.loglevel)
+		fh.setLevel(globalVars.settings.BOSWatch.loglevel)
+		logging.debug("set backupCount of fileHandler to: %s", globalVars.settings.BOSWatch.backupCount)
+		fh.setBackupCount(globalVars.settings.BOSWatch.backupCount)
 	except:
 		# It's an error, but we could work without that stuff...
 		logging.error("cannot set loglevel of fileHandler")
 		logging.debug("cannot set loglevel of fileHandler", exc_info=True)
 
 
+	#
+	# Load receivers
+	#
+	try:
+		from includes import receiver
+		receiver.loadReceivers(args)
+		if not args.quiet: #only if not quiet mode
+			from includes import shellHeader
+			shellHeader.printHeader(args, receiver.receivers)
+	except:
+		# we couldn't work without receiver -> exit
+		logging.critical("cannot load receivers")
+		logging.debug("cannot load receivers", exc_info=True)
+		exit(1)
+
+
 	# initialization was fine, continue with main program...
 
+	# a client only decodes, the alarms are processed by the server
+	processAlarms = globalVars.settings.ClientServer.mode != "client"
+
 	#
 	# Load plugins
 	#
 	try:
-		from includes import pluginLoader
-		pluginLoader.loadPlugins()
+		if processAlarms:
+			from includes import pluginLoader
+			pluginLoader.loadPlugins()
 	except:
 		# we couldn't work without plugins -> exit
 		logging.critical("cannot load Plugins")
 		logging.debug("cannot load Plugins", exc_info=True)
 		exit(1)
 
+	#
+	# Start alarm dispatcher
+	#
+	try:
+		if processAlarms:
+			from includes import alarmDispatcher
+			alarmDispatcher.start()
+			from includes import retryQueue
+			retryQueue.start()
+	except:
+		# we couldn't work without dispatcher -> exit
+		logging.critical("cannot start alarm dispatcher")
+		logging.debug("cannot start alarm dispatcher", exc_info=True)
+		exit(1)
+
 	#
 	# Load filters
 	#
 	try:
-		if globalVars.config.getboolean("BOSWatch","useRegExFilter"):
+		if processAlarms and globalVars.settings.BOSWatch.useRegExFilter:
 			from includes import regexFilter
 			regexFilter.loadFilters()
 	except:
@@ -279,7 +294,7 @@ try:
 	# Load description lists
 	#
 	try:
-		if globalVars.config.getboolean("FMS","idDescribed") or globalVars.config.getboolean("ZVEI","idDescribed") or globalVars.config.getboolean("POC","idDescribed"):
+		if processAlarms and (globalVars.settings.FMS.idDescribed or globalVars.settings.ZVEI.idDescribed or globalVars.settings.POC.idDescribed):
 			from includes import descriptionList
 			descriptionList.loadDescriptionLists()
 	except:
@@ -288,86 +303,99 @@ try:
 		logging.debug("cannot load description lists", exc_info=True)
 
 	#
-	# Start rtl_fm
+	# Watch description lists and filters for changes, reload on SIGHUP
 	#
 	try:
-		if not args.test:
-			logging.debug("starting rtl_fm")
-			command = ""
-			if globalVars.config.has_option("BOSWatch","rtl_path"):
-				command = globalVars.config.get("BOSWatch","rtl_path")
-			command = command+"rtl_fm -d "+str(args.device)+" -f "+str(freqConverter.freqToHz(args.freq))+" -M fm -p "+str(args.error)+" -E DC -F 0 -l "+str(args.squelch)+" -g "+str(args.gain)+" -s 22050"
-			rtl_fm = subprocess.Popen(command.split(),
-					#stdin=rtl_fm.stdout,
-					stdout=subprocess.PIPE,
-					stderr=open(globalVars.log_path+"rtl_fm.log","a"),
-					shell=False)
-			# rtl_fm doesn't self-destruct, when an error occurs
-			# wait a moment to give the subprocess a chance to write the logfile
-			time.sleep(3)
-			checkSubprocesses.checkRTL()
-		else:
-			logging.warning("!!! Test-Mode: rtl_fm not started !!!")
+		from includes import signalHandler
+		if processAlarms and globalVars.settings.BOSWatch.watchFiles:
+			from includes import fileWatcher
+			fileWatcher.start()
 	except:
-		# we couldn't work without rtl_fm -> exit
-		logging.critical("cannot start rtl_fm")
-		logging.debug("cannot start rtl_fm", exc_info=True)
+		# It's an error, but we could work without that stuff...
+		logging.error("cannot start file watcher")
+		logging.debug("cannot start file watcher", exc_info=True)
+
+	#
+	# Start client or server
+	#
+	try:
+		if globalVars.settings.ClientServer.mode in ("client", "server"):
+			from includes import clientServer
+			if globalVars.settings.ClientServer.mode == "client":
+				clientServer.startClient()
+			else:
+				clientServer.startServer()
+	except:
+		# we couldn't work without connection -> exit
+		logging.critical("cannot start %s", globalVars.settings.ClientServer.mode)
+		logging.debug("cannot start %s", globalVars.settings.ClientServer.mode, exc_info=True)
 		exit(1)
 
 	#
-	# Start multimon
+	# Load the plugins in the background (while rtl_fm and multimon-ng start),
+	# the alarms wait for their plugins
+	#
+	try:
+		if processAlarms:
+			from includes import pluginLoader
+			pluginLoader.startLoading()
+	except:
+		# we couldn't work without plugins -> exit
+		logging.critical("cannot load Plugins")
+		logging.debug("cannot load Plugins", exc_info=True)
+		exit(1)
+
+	#
+	# Start rtl_fm and multimon-ng of all receivers
 	#
 	try:
 		if not args.test:
-			logging.debug("starting multimon-ng")
-			command = ""
-			if globalVars.config.has_option("BOSWatch","multimon_path"):
-				command = globalVars.config.get("BOSWatch","multimon_path")
-			command = command+"multimon-ng "+str(demodulation)+" -f alpha -t raw /dev/stdin - "
-			multimon_ng = subprocess.Popen(command.split(),
-				stdin=rtl_fm.stdout,
-				stdout=subprocess.PIPE,
-				stderr=open(globalVars.log_path+"multimon.log","a"),
-				shell=False)
-			# multimon-ng  doesn't self-destruct, when an error occurs
-			# wait a moment to give the subprocess a chance to write the logfile
-			time.sleep(3)
-			checkSubprocesses.checkMultimon()
+			receiver.startReceivers()
 		else:
-			logging.warning("!!! Test-Mode: multimon-ng not started !!!")
+			logging.warning("!!! Test-Mode: rtl_fm and multimon-ng not started !!!")
 	except:
-		# we couldn't work without multimon-ng -> exit
-		logging.critical("cannot start multimon-ng")
-		logging.debug("cannot start multimon-ng", exc_info=True)
+		# we couldn't work without rtl_fm and multimon-ng -> exit
+		logging.critical("cannot start receivers")
+		logging.debug("cannot start receivers", exc_info=True)
 		exit(1)
 
+	#
+	# Watch the liveness of the receivers, start the status endpoint
+	#
+	try:
+		if not args.test:
+			from includes import liveness
+			liveness.start()
+	except:
+		# It's an error, but we could work without that stuff...
+		logging.error("cannot start liveness watchdog")
+		logging.debug("cannot start liveness watchdog", exc_info=True)
+
 	#
 	# Get decoded data from multimon-ng and call BOSWatch-decoder
 	#
 	if not args.test:
 		logging.debug("start decoding")
-		while True:
-			decoded = str(multimon_ng.stdout.readline()) #Get line data from multimon stdout
-			from includes import decoder
-			decoder.decode(freqConverter.freqToHz(args.freq), decoded)
-
-			# write multimon-ng raw data
-			if globalVars.config.getboolean("BOSWatch","writeMultimonRaw"):
-				try:
-					rawMmOut = open(globalVars.log_path+"mm_raw.txt", "a")
-					rawMmOut.write(decoded)
-				except:
-					logging.warning("cannot write raw multimon data")
-				finally:
-					rawMmOut.close()
+
+		# write multimon-ng raw data
+		if globalVars.settings.BOSWatch.writeMultimonRaw:
+			try:
+				from includes import multimonReader
+				rawWriter = multimonReader.RawDataWriter(globalVars.log_path+"mm_raw.txt")
+			except:
+				logging.warning("cannot write raw multimon data")
+				logging.debug("cannot write raw multimon data", exc_info=True)
+
+		receiver.decodeLoop(rawWriter)
 	else:
 		logging.debug("start testing")
+		from includes import decoder
+		freq = receiver.receivers[0].freq if receiver.receivers else 0
 		testFile = open(globalVars.script_path+"/citest/testdata.txt","r")
 		for testData in testFile:
 			if (len(testData.rstrip(' \t\n\r')) > 1) and ("#" not in testData[0]):
 				logging.info("Testdata: %s", testData.rstrip(' \t\n\r'))
-				from includes import decoder
-				decoder.decode(freqConverter.freqToHz(args.freq), testData)
+				decoder.decode(freq, testData)
 				#time.sleep(1)
 		logging.debug("test finished")
 
@@ -383,16 +411,16 @@ except:
 finally:
 	try:
 		logging.debug("BOSWatch shuting down")
-		if multimon_ng and multimon_ng.pid:
-			logging.debug("terminate multimon-ng (%s)", multimon_ng.pid)
-			multimon_ng.terminate()
-			multimon_ng.wait()
-			logging.debug("multimon-ng terminated")
-		if rtl_fm and rtl_fm.pid:
-			logging.debug("terminate rtl_fm (%s)", rtl_fm.pid)
-			rtl_fm.terminate()
-			rtl_fm.wait()
-			logging.debug("rtl_fm terminated")
+		from includes import receiver
+		receiver.stopReceivers()
+		if rawWriter:
+			rawWriter.close()
+		from includes import clientServer
+		clientServer.stop(3)
+		from includes import fileWatcher
+		fileWatcher.stop(3)
+		from includes import liveness
+		liveness.stop(3)
 		logging.debug("exiting BOSWatch")
 	except:
 		logging.warning("failed in clean-up routine")
@@ -401,10 +429,17 @@ finally:
 	finally:
 		# Close Logging
 		logging.debug("close Logging")
-		# Waiting for all Threads to write there logs
-		if globalVars.config.getboolean("BOSWatch","processAlarmAsync") == True:
-			logging.debug("waiting 3s for threads...")
-			time.sleep(3)
+		# Waiting for all queued alarms to write there logs
+		logging.debug("waiting max. 3s for alarm dispatcher...")
+		from includes import alarmDispatcher
+		alarmDispatcher.stop(3)
+		# unload before the retry queue stops, so the calls failed in onUnload() are stored
+		from includes import pluginLoader
+		pluginLoader.unloadPlugins()
+		from includes import retryQueue
+		retryQueue.stop(3)
+		from includes.helper import httpClient
+		httpClient.closeAll()
 		logging.info("BOSWatch exit()")
 		logging.shutdown()
 		if nmaHandler:
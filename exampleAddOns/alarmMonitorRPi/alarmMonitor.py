@@ -33,7 +33,7 @@ import os
 import time
 import socket # for socket
 import json # for data
-from threading import Thread
+from threading import Thread, Lock
 import pygame
 
 import globalData
@@ -254,77 +254,115 @@ try:
 	logging.info("alarmMonitor started - on standby")
 		
 	#
-	# Main Program
-	# (Threads will set abort to True if an error occurs)
+	# Processing of the messages
+	# (every client has its own thread, the lock keeps one message at a time)
 	#
-	while globalData.abort == False:
-		# accept connections from outside
-		(clientsocket, address) = sock.accept()
-		logging.debug("connected client: %s", address)
+	messageLock = Lock()
 
-		# recv message as json_string
-		json_string = clientsocket.recv( 4096 ) # buffer size is 1024 bytes
-		try:
-			# parsing jason
-			parsed_json = json.loads(json_string)
-			logging.debug("parsed message: %s", parsed_json)
-		except ValueError:
-			# we will ignore waste in json_string
-			logging.warning("No JSON object could be decoded: %s", json_string)
-			pass
-		else:
+	def processMessage(json_string):
+		with messageLock:
 			try:
-				logging.debug("Alarmmessage arrived")
-				logging.debug("-- ric: %s", parsed_json['ric'])
-				logging.debug("-- functionChar: %s", parsed_json['functionChar'])
+				# parsing jason
+				parsed_json = json.loads(json_string)
+				logging.debug("parsed message: %s", parsed_json)
+			except ValueError:
+				# we will ignore waste in json_string
+				logging.warning("No JSON object could be decoded: %s", json_string)
+				pass
+			else:
+				try:
+					logging.debug("Alarmmessage arrived")
+					logging.debug("-- ric: %s", parsed_json['ric'])
+					logging.debug("-- functionChar: %s", parsed_json['functionChar'])
 				
-				# current time for this loop:
-				curtime = int(time.time())
+					# current time for this loop:
+					curtime = int(time.time())
 
-				# keep alive calculation with additional RICs
-				if int(parsed_json['ric']) in keepAliveRICs:
-					logging.info("POCSAG is alive")
-					globalData.lastAlarm = curtime
-					globalData.countKeepAlive += 1
+					# keep alive calculation with additional RICs
+					if int(parsed_json['ric']) in keepAliveRICs:
+						logging.info("POCSAG is alive")
+						globalData.lastAlarm = curtime
+						globalData.countKeepAlive += 1
 
-				# (test) alarm processing
-				elif int(parsed_json['ric']) in alarmRICs:
-					if parsed_json['functionChar'] in functionCharTestAlarm:
-						logging.info("--> Probealarm: %s", parsed_json['ric'])
-						globalData.screenBackground = pygame.Color(globalData.config.get("AlarmMonitor","colourYellow"))
-						globalData.countTestAlarm += 1
-					elif parsed_json['functionChar'] in functionCharAlarm:
-						logging.info("--> Alarm: %s", parsed_json['ric'])
-						globalData.screenBackground = pygame.Color(globalData.config.get("AlarmMonitor","colourRed"))
-						globalData.countAlarm += 1
+					# (test) alarm processing
+					elif int(parsed_json['ric']) in alarmRICs:
+						if parsed_json['functionChar'] in functionCharTestAlarm:
+							logging.info("--> Probealarm: %s", parsed_json['ric'])
+							globalData.screenBackground = pygame.Color(globalData.config.get("AlarmMonitor","colourYellow"))
+							globalData.countTestAlarm += 1
+						elif parsed_json['functionChar'] in functionCharAlarm:
+							logging.info("--> Alarm: %s", parsed_json['ric'])
+							globalData.screenBackground = pygame.Color(globalData.config.get("AlarmMonitor","colourRed"))
+							globalData.countAlarm += 1
 						
-					# forward data to alarmMonitor
-					globalData.data = parsed_json
-					globalData.data['timestamp'] = curtime
-					logging.debug("-- data: %s", parsed_json)
-					# save 5 alarm history entries
-					globalData.alarmHistory.append(globalData.data)
-					if len(globalData.alarmHistory) > 5:
-						globalData.alarmHistory.pop(0)
-					# update lastAlarm for keep alive calculation
-					globalData.lastAlarm = curtime
-					# enable display for n seconds:
-					globalData.enableDisplayUntil = curtime + globalData.config.getint("AlarmMonitor","showAlarmTime")
-					# tell alarm-thread to turn on the display
-					globalData.navigation = "alarmPage"
-					globalData.showDisplay = True;
+						# forward data to alarmMonitor
+						globalData.data = parsed_json
+						globalData.data['timestamp'] = curtime
+						logging.debug("-- data: %s", parsed_json)
+						# save 5 alarm history entries
+						globalData.alarmHistory.append(globalData.data)
+						if len(globalData.alarmHistory) > 5:
+							globalData.alarmHistory.pop(0)
+						# update lastAlarm for keep alive calculation
+						globalData.lastAlarm = curtime
+						# enable display for n seconds:
+						globalData.enableDisplayUntil = curtime + globalData.config.getint("AlarmMonitor","showAlarmTime")
+						# tell alarm-thread to turn on the display
+						globalData.navigation = "alarmPage"
+						globalData.showDisplay = True;
 					
-					# play alarmSound...
-					if not alarmSound == False:
-						# ... but only one per time...
-						if pygame.mixer.get_busy() == False:
-							alarmSound.play()
-							logging.debug("sound started")
+						# play alarmSound...
+						if not alarmSound == False:
+							# ... but only one per time...
+							if pygame.mixer.get_busy() == False:
+								alarmSound.play()
+								logging.debug("sound started")
 					
-			except KeyError:
-				# we will ignore waste in json_string
-				logging.warning("No RIC found: %s", json_string)
-				pass
+				except KeyError:
+					# we will ignore waste in json_string
+					logging.warning("No RIC found: %s", json_string)
+					pass
+
+	def handleClient(clientsocket, address):
+		logging.debug("connected client: %s", address)
+		# BOSWatch keeps the connection open, every message is one line of JSON
+		# the timeout lets the thread check the abort flag
+		clientsocket.settimeout(1)
+		rest = ""
+		try:
+			while globalData.abort == False:
+				try:
+					chunk = clientsocket.recv(4096)
+				except socket.timeout:
+					continue
+				if not chunk:
+					break
+				lines = (rest + chunk).split("\n")
+				rest = lines.pop()
+				for json_string in lines:
+					processMessage(json_string)
+		except:
+			logging.error("error in connection of client: %s", address)
+			logging.debug("error in connection of client: %s", address, exc_info=True)
+		finally:
+			logging.debug("client disconnected: %s", address)
+			clientsocket.close()
+
+	#
+	# Main Program
+	# (Threads will set abort to True if an error occurs)
+	#
+	# the timeout lets the loop check the abort flag
+	sock.settimeout(1)
+	while globalData.abort == False:
+		# accept connections from outside, every client is served by its own thread
+		try:
+			(clientsocket, address) = sock.accept()
+		except socket.timeout:
+			continue
+		clientThread = Thread(target=handleClient, args=(clientsocket, address))
+		clientThread.daemon = True
+		clientThread.start()
 	
 except KeyboardInterrupt:
 	logging.warning("Keyboard Interrupt")	
@@ -32,6 +32,7 @@ import logging
 import logging.handlers
 
 import socket # for udp-socket
+import threading # a thread for every client
 import pibrella # for pi-board
 import json # for data
 
@@ -96,37 +97,47 @@ try:
 	# our Alarm-RICs:
 	ric_alarm = [12345677, 12345676, 12345675]
 
+	# every client is served by its own thread
+	def handleClient(clientsocket, address):
+		global siren_stopped
+		logging.debug("connected client: %s", address)
+
+		# BOSWatch keeps the connection open, every message is one line of JSON
+		for json_string in clientsocket.makefile():
+			try:
+				# parse json
+				parsed_json = json.loads(json_string)
+				logging.debug("parsed message: %s", parsed_json)
+			except ValueError:
+				# parsing error is foolish, but we don't have to exit
+				logging.warning("No JSON object could be decoded: %s", json_string)
+				pass
+			else:
+				# DAU-Test-RIC received
+				if parsed_json['ric'] == "1234567":
+					logging.debug("POCSAG is alive")
+					pibrella.light.green.blink(1, 1)
+
+				elif int(parsed_json['ric']) in ric_alarm:
+					logging.debug("We have do to something")
+					if parsed_json['functionChar'] == "a":
+						logging.info("-> Probealarm: %s", parsed_json['ric'])
+						pibrella.light.yellow.blink(1, 1)
+					elif parsed_json['functionChar'] == "b":
+						logging.info("-> Alarm: %s", parsed_json['ric'])
+						pibrella.light.red.blink(1, 1)
+						# change variable to False to start the siren
+						siren_stopped = False
+
+		logging.debug("client disconnected: %s", address)
+		clientsocket.close()
+
 	while True:
 		# accept connections from outside
 		(clientsocket, address) = sock.accept()
-		logging.debug("connected client: %s", address)
-
-		# receive message as json string
-		json_string = clientsocket.recv( 4096 ) # buffer size is 4096 bytes
-		try:
-			# parse json
-			parsed_json = json.loads(json_string)
-			logging.debug("parsed message: %s", parsed_json)
-		except ValueError:
-			# parsing error is foolish, but we don't have to exit
-			logging.warning("No JSON object could be decoded: %s", json_string)
-			pass
-		else:
-			# DAU-Test-RIC received
-			if parsed_json['ric'] == "1234567":
-				logging.debug("POCSAG is alive")
-				pibrella.light.green.blink(1, 1)
-
-			elif int(parsed_json['ric']) in ric_alarm:
-				logging.debug("We have do to something")
-				if parsed_json['functionChar'] == "a":
-					logging.info("-> Probealarm: %", parsed_json['ric'])
-					pibrella.light.yellow.blink(1, 1)
-				elif parsed_json['functionChar'] == "b":
-					logging.info("-> Alarm: %", parsed_json['ric'])
-					pibrella.light.red.blink(1, 1)
-					# change variable to False to start the siren
-					siren_stopped = False
+		clientThread = threading.Thread(target=handleClient, args=(clientsocket, address))
+		clientThread.daemon = True
+		clientThread.start()
 
 except KeyboardInterrupt:
 	logging.warning("Keyboard Interrupt")
@@ -0,0 +1,338 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Dispatcher for the alarm processing.
+Every alarm is fanned out to all plugins at the same time: a fixed number of
+worker threads takes the plugin calls out of a bounded queue.
+Every plugin has its own limit of concurrent calls and its own timeout,
+so a slow or hanging plugin couldn't delay the other plugins.
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be set in the config.ini
+"""
+
+import logging # Global logger
+import threading
+import time
+import Queue
+from collections import deque
+from copy import deepcopy # copy objects to avoid issues if the objects will be changed during the processing
+
+from includes import globalVars  # Global variables
+
+
+# local variables
+jobQueue = None
+workerList = []
+workerCount = 0
+queueSize = 0
+outstanding = 0 # jobs not finished yet (queued, waiting for a free plugin slot or running)
+
+pluginSlots = {} # pluginName -> PluginSlot
+loadedAt = {} # pluginName -> time the plugin was available, no timeout starts before
+runningJobs = {} # worker name -> running AlarmJob
+retiredWorkers = set() # workers replaced because of a hanging plugin
+lock = threading.Lock()
+stopEvent = threading.Event()
+
+
+class AlarmJob(object):
+	"""Single call of a plugin for an alarm"""
+	def __init__(self, pluginName, typ, freq, data, timeout, replay=False):
+		self.pluginName = pluginName
+		self.typ = typ
+		self.freq = freq
+		self.data = data
+		self.timeout = timeout
+		self.replay = replay # replay of the retryQueue - a failure is returned in result
+		self.result = None # return value of run()
+		self.queued = time.time()
+		self.started = 0
+		self.timedOut = False
+		self.done = threading.Event()
+
+	def getDeadline(self):
+		"""
+		Time until the job has to be finished - for the caller, the waiting and the running job
+		The timeout starts when the job is queued, but not before the plugin is loaded.
+
+		@return:    time or None while the plugin is loading
+		"""
+		if self.pluginName not in loadedAt:
+			return None
+		return max(self.queued, loadedAt[self.pluginName]) + self.timeout
+
+
+class PluginSlot(object):
+	"""Concurrency limit, timeout and waiting jobs of a plugin"""
+	def __init__(self, limit, timeout):
+		self.limit = limit
+		self.timeout = timeout
+		self.active = 0
+		self.queued = 0 # jobs in jobQueue or waiting - limited by queueSize
+		self.waiting = deque()
+
+
+def _getOption(section, option, default):
+	"""
+	Local helper to read an optional integer from the plugin's section in the config.ini
+
+	@return:    value of the option or the given default
+	"""
+	if globalVars.config.has_option(section, option):
+		return globalVars.config.getint(section, option)
+	return default
+
+
+def _getSlot(pluginName):
+	"""
+	Local helper to get the slot of a plugin
+	Must be called with the lock held
+
+	@return:    PluginSlot of the plugin
+	"""
+	if pluginName not in pluginSlots:
+		limit = _getOption(pluginName, "processAlarmConcurrency", globalVars.settings.BOSWatch.processAlarmConcurrency)
+		timeout = _getOption(pluginName, "processAlarmTimeout", globalVars.settings.BOSWatch.processAlarmTimeout)
+		pluginSlots[pluginName] = PluginSlot(max(limit, 1), max(timeout, 1))
+		logging.debug("%s: concurrency limit %s, timeout %ss", pluginName, pluginSlots[pluginName].limit, pluginSlots[pluginName].timeout)
+	return pluginSlots[pluginName]
+
+
+def _startWorker():
+	"""
+	Local helper to start a new worker thread
+
+	@return:    nothing
+	"""
+	global workerCount
+	worker = threading.Thread(target=_worker, name="alarmWorker-"+str(workerCount))
+	worker.daemon = True
+	workerCount += 1
+	workerList.append(worker)
+	worker.start()
+
+
+def start():
+	"""
+	Start the worker threads and the watchdog of the dispatcher
+
+	@requires:  Configuration has to be set in the config.ini
+	@requires:  enabled plugins in pluginLoader
+
+	@return:    nothing
+	@exception: Exception if starting the workers failed
+	"""
+	global jobQueue
+	global queueSize
+	try:
+		workers = globalVars.settings.BOSWatch.processAlarmWorkers
+		if workers < 1:
+			# one worker for every plugin - so every alarm reaches all plugins at the same time
+			from includes import pluginLoader
+			workers = max(len(pluginLoader.getPluginNames()), 1)
+		queueSize = max(globalVars.settings.BOSWatch.processAlarmQueueSize, 1)
+		logging.debug("starting alarm dispatcher with %s workers (queue size: %s)", workers, queueSize)
+
+		stopEvent.clear()
+		jobQueue = Queue.Queue()
+		for i in range(workers):
+			_startWorker()
+
+		watchdog = threading.Thread(target=_watchdog, name="alarmWatchdog")
+		watchdog.daemon = True
+		watchdog.start()
+	except:
+		logging.error("cannot start alarm dispatcher")
+		logging.debug("cannot start alarm dispatcher", exc_info=True)
+		raise
+
+
+def stop(timeout=3):
+	"""
+	Give the queued plugin calls the chance to finish and stop the workers
+
+	@type    timeout: integer
+	@param   timeout: max. seconds to wait for the queued plugin calls
+
+	@return:    nothing
+	"""
+	if not workerList:
+		return
+	logging.debug("stopping alarm dispatcher (queue depth: %s)", getQueueDepth())
+	stopEvent.set()
+	for worker in workerList:
+		jobQueue.put(None)
+	deadline = time.time() + timeout
+	for worker in workerList[:]:
+		worker.join(max(deadline - time.time(), 0))
+		if worker.is_alive():
+			logging.warning("%s still running - stop waiting", worker.name)
+			break
+	del workerList[:]
+
+
+def getQueueDepth():
+	"""
+	Number of plugin calls, which are not finished yet
+
+	@return:    queue depth as integer
+	"""
+	return outstanding
+
+
+def putAlarm(typ, freq, data, plugins, replay=False):
+	"""
+	Put one job for every plugin into the queue
+	Every plugin may have queueSize calls waiting, so a hanging plugin
+	couldn't block the calls of the other plugins.
+
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data (structure see readme.md in plugin folder)
+	@param   data: Contains the parameter
+	@type    plugins: list of pluginNames
+	@param   plugins: the plugins to call with this alarm
+	@type    replay: boolean
+	@param   replay: replay of the retryQueue (a failed call isn't put into the retryQueue again)
+
+	@return:    list of the queued AlarmJobs
+	"""
+	global outstanding
+	jobs = []
+	if jobQueue is None or stopEvent.is_set():
+		logging.debug("alarm dispatcher not running - %s dropped", typ)
+		return jobs
+	# the caller may change data while the plugins are running
+	data = deepcopy(data)
+	for pluginName in plugins:
+		with lock:
+			slot = _getSlot(pluginName)
+			if slot.queued >= queueSize:
+				logging.error("alarm queue of %s is full (%s) - %s dropped", pluginName, queueSize, typ)
+				continue
+			slot.queued += 1
+			outstanding += 1
+			if pluginName in globalVars.pluginList:
+				loadedAt.setdefault(pluginName, time.time())
+			job = AlarmJob(pluginName, typ, freq, data, slot.timeout, replay)
+		jobQueue.put(job)
+		jobs.append(job)
+	if jobs:
+		logging.debug("alarm queue depth: %s", outstanding)
+	return jobs
+
+
+def waitForJobs(jobs):
+	"""
+	Wait until all given jobs are finished or their timeout is reached
+	A plugin, which is too slow, will be logged and no longer waited for.
+
+	@type    jobs: list of AlarmJobs
+	@param   jobs: jobs returned by putAlarm()
+
+	@return:    nothing
+	"""
+	for job in jobs:
+		while not job.done.is_set():
+			deadline = job.getDeadline()
+			if deadline is not None and time.time() >= deadline:
+				logging.warning("%s not finished within %ss - continue without waiting", job.pluginName, job.timeout)
+				break
+			# the timeout of a loading plugin starts later
+			job.done.wait(1 if deadline is None else deadline - time.time())
+
+
+def _worker():
+	"""
+	Worker thread - runs the jobs from the queue
+	If the plugin has no free slot, the job will wait in the plugin's deque
+	and will be executed by the worker which frees the slot.
+	A job which has passed its timeout while waiting is dropped.
+	A worker which was retired by the watchdog finishes its plugin's jobs and ends.
+
+	@return:    nothing
+	"""
+	global outstanding
+	from includes import alarmHandler
+	from includes import pluginLoader
+	name = threading.current_thread().name
+
+	while True:
+		job = jobQueue.get()
+		if job is None:
+			break
+		with lock:
+			slot = _getSlot(job.pluginName)
+			if slot.active >= slot.limit:
+				# no free slot - leave the job to the running ones
+				slot.waiting.append(job)
+				continue
+			slot.active += 1
+
+		while job:
+			with lock:
+				slot.queued -= 1
+				deadline = job.getDeadline()
+				if deadline is not None and time.time() > deadline:
+					# the caller has stopped waiting for this job
+					logging.warning("%s: %s waited longer than %ss - dropped", job.pluginName, job.typ, job.timeout)
+					job.timedOut = True
+				else:
+					job.started = time.time()
+					runningJobs[name] = job
+			if job.started:
+				try:
+					# wait for a loading plugin, its timeout starts afterwards
+					pluginLoader.getPlugin(job.pluginName)
+					with lock:
+						loadedAt.setdefault(job.pluginName, time.time())
+					job.result = alarmHandler.runPlugin(job.pluginName, job.typ, job.freq, job.data, not job.replay)
+				except:
+					logging.error("Error in alarm worker")
+					logging.debug("Error in alarm worker", exc_info=True)
+			with lock:
+				if job.started:
+					del runningJobs[name]
+					if job.timedOut:
+						logging.info("%s returned after %ss", job.pluginName, int(time.time() - job.started))
+				job.done.set()
+				outstanding -= 1
+				if slot.waiting:
+					job = slot.waiting.popleft()
+				else:
+					slot.active -= 1
+					job = None
+
+		if name in retiredWorkers:
+			with lock:
+				retiredWorkers.discard(name)
+				workerList.remove(threading.current_thread())
+			logging.debug("%s retired", name)
+			break
+
+
+def _watchdog():
+	"""
+	Watchdog thread - checks the running jobs against their deadline (see AlarmJob.getDeadline)
+	A worker with a hanging plugin is retired and replaced by a new one,
+	so the number of usable workers stays the same.
+
+	@return:    nothing
+	"""
+	while not stopEvent.wait(1):
+		now = time.time()
+		with lock:
+			for name, job in runningJobs.items():
+				deadline = job.getDeadline()
+				if not job.timedOut and deadline is not None and now > deadline:
+					job.timedOut = True
+					job.done.set()
+					logging.warning("%s timed out after %ss - dropped", job.pluginName, job.timeout)
+					if name not in retiredWorkers:
+						retiredWorkers.add(name)
+						_startWorker()
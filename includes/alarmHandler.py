@@ -12,10 +12,26 @@ Handler for the filter and plugins at an alarm
 
 import logging # Global logger
 import time    # timestamp
+import threading
 
 from includes import globalVars  # Global variables
 from copy import deepcopy # copy objects to avoid issues if the objects will be changed by the plugin's during runtime and during asynch/threaded processing 
 
+# local variables
+current = threading.local() # state of the plugin call in this thread
+
+
+def isReplay():
+	"""
+	Check if the running plugin call is a replay of the retry queue
+	A plugin which collects alarms (f.e. the eMail digest) has to handle a replay
+	directly, so that a failure reaches the retry queue.
+
+	@return:    True if called from a replay
+	"""
+	return getattr(current, "replay", False)
+
+
 ##
 #
 # decide to run AlarmHandler sync or async
@@ -23,6 +39,8 @@ from copy import deepcopy # copy objects to avoid issues if the objects will be
 def processAlarmHandler(typ, freq, data):
 	"""
 	Function to decide if the alarm process will call sync
+	In sync mode we wait until all plugins are finished (or timed out),
+	in async mode we return directly after queueing the plugin calls.
 
 	@type    typ:  string (FMS|ZVEI|POC)
 	@param   typ:  Typ of the dataset
@@ -35,27 +53,97 @@ def processAlarmHandler(typ, freq, data):
 	@requires:  Configuration has to be set in the config.ini
 
 	@return:    nothing
-	@exception: Exception if starting a Thread failed
 	"""
-	if globalVars.config.getboolean("BOSWatch","processAlarmAsync") == True:
+	if globalVars.settings.BOSWatch.processAlarmAsync:
 		logging.debug("starting processAlarm async")
-		try:
-			from threading import Thread
-			Thread(target=processAlarm, args=(typ, freq, deepcopy(data))).start()
-		except:
-			logging.error("Error in starting alarm processing async")
-			logging.debug("Error in starting alarm processing async", exc_info=True)
+		processAlarm(typ, freq, data, False)
 	else:
 		processAlarm(typ, freq, data)
 
 
+##
+#
+# get the plugins to call for an alarm
+#
+def getPlugins(typ, freq, data):
+	"""
+	Function to get all plugins, which have to be called for the alarm
+	If enabled, the RegEx-filter will be checked
+
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data (structure see readme.md in plugin folder)
+	@param   data: Contains the parameter
+
+	@requires:  enabled plugins in pluginLoader
+
+	@return:    list of pluginNames
+	"""
+	from includes import pluginLoader
+	plugins = pluginLoader.getPluginNames()
+	# if enabled use RegEx-filter
+	if globalVars.settings.BOSWatch.useRegExFilter:
+		from includes import regexFilter
+		passed = regexFilter.getPassingPlugins(typ, data, plugins, freq)
+		plugins = [pluginName for pluginName in plugins if pluginName in passed]
+	return plugins
+
+
+##
+#
+# call a single plugin
+#
+def runPlugin(pluginName, typ, freq, data, retry=True):
+	"""
+	Function to call the run() of a single plugin
+	If the plugin isn't loaded yet, we wait for it (see pluginLoading).
+	If the plugin returns False (temporary failure), the call is put into the retry queue
+
+	@type    pluginName: string
+	@param   pluginName: Name of the plugin to call
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data (structure see readme.md in plugin folder)
+	@param   data: Contains the parameter
+	@type    retry: boolean
+	@param   retry: put a failed call into the retry queue (False for the replays of the retry queue)
+
+	@return:    result of run() - False if run() has thrown an exception
+	"""
+	from includes import pluginLoader
+	plugin = pluginLoader.getPlugin(pluginName)
+	if not plugin:
+		logging.debug("%s not loaded - %s dropped", pluginName, typ)
+		return None
+	logging.debug("call Plugin: %s", pluginName)
+	current.replay = not retry
+	try:
+		result = plugin.run(typ, freq, deepcopy(data))
+	except:
+		# call next plugin, if one has thrown an exception
+		logging.debug("%s failed", pluginName, exc_info=True)
+		return False
+	finally:
+		current.replay = False
+	logging.debug("return from: %s", pluginName)
+	if result is False and retry:
+		from includes import retryQueue
+		retryQueue.put(pluginName, typ, freq, data)
+	return result
+
+
 ##
 #
 # main function for central filtering and calling the plugins
 #
-def processAlarm(typ, freq, data):
+def processAlarm(typ, freq, data, wait=True):
 	"""
 	Function to process filters and plugins at Alarm
+	The alarm is passed to all plugins at the same time by the alarmDispatcher
 
 	@type    typ:  string (FMS|ZVEI|POC)
 	@param   typ:  Typ of the dataset
@@ -63,37 +151,24 @@ def processAlarm(typ, freq, data):
 	@param   freq: frequency of the SDR Stick
 	@type    data: map of data (structure see readme.md in plugin folder)
 	@param   data: Contains the parameter
+	@type    wait: boolean
+	@param   wait: wait until all plugins are finished or timed out
 
 	@requires:  active plugins in pluginList
+	@requires:  started alarmDispatcher
 
 	@return:    nothing
 	@exception: Exception if Alarm processing itself failed
 	"""
 	try:
+		from includes import alarmDispatcher
 		logging.debug("[  ALARM  ]")
 		# timestamp, to make sure, that all plugins use the same time
 		data['timestamp'] = int(time.time())
-		# Go to all plugins in pluginList
-		for pluginName, plugin in globalVars.pluginList.items():
-			# if enabled use RegEx-filter
-			if globalVars.config.getint("BOSWatch","useRegExFilter"):
-				from includes import regexFilter
-				if regexFilter.checkFilters(typ, data, pluginName, freq):
-					logging.debug("call Plugin: %s", pluginName)
-					try:
-						plugin.run(typ, freq, deepcopy(data))
-						logging.debug("return from: %s", pluginName)
-					except:
-						# call next plugin, if one has thrown an exception
-						pass
-			else: # RegEX filter off - call plugin directly
-				logging.debug("call Plugin: %s", pluginName)
-				try:
-					plugin.run(typ, freq, deepcopy(data))
-					logging.debug("return from: %s", pluginName)
-				except:
-					# call next plugin, if one has thrown an exception
-					pass
+		# Go to all plugins, which passed the filter
+		jobs = alarmDispatcher.putAlarm(typ, freq, data, getPlugins(typ, freq, data))
+		if wait:
+			alarmDispatcher.waitForJobs(jobs)
 		logging.debug("[END ALARM]")
 	except:
 		logging.error("Error in alarm processing")
@@ -3,7 +3,7 @@
 #
 """
 Functions for checking the subprocesses rtl_fm and multimon-ng
-Used in boswatch.py at startup and designated for watching-service
+The receivers check every line of stderr with checkLine() at startup and while running
 
 @author: 		Jens Herrmann
 """
@@ -12,43 +12,72 @@ import logging
 
 from includes import globalVars  # Global variables
 
+# messages of the subprocesses on stderr
+rtlErrors = ("exiting", "Failed to open")
+rtlReady = "Output at" # last line of rtl_fm at startup
+multimonErrors = ("invalid", "error")
+multimonReady = "Enabled demodulators" # multimon-ng starts decoding
 
-def checkRTL():
+
+def checkLine(line, errors):
+	"""
+	check a line of stderr for an error message
+
+	@type    line: string
+	@param   line: line of stderr
+	@type    errors: tuple of strings
+	@param   errors: rtlErrors or multimonErrors
+
+	@return:    True if the line contains an error
+	"""
+	for error in errors:
+		if error in line:
+			return True
+	return False
+
+
+def checkRTL(logFile="rtl_fm.log"):
 	"""
 	check startup of rtl_fm
 
+	@type    logFile: string
+	@param   logFile: name of the logfile of rtl_fm in the log_path
+
 	@exception: OSError when rtl_fm returns an error
 	@exception: Exception when checkRTL throws an unexpected error
 	"""
 	try:
-		rtlLog = open(globalVars.log_path+"rtl_fm.log","r").read()
-		if ("exiting" in rtlLog) or  ("Failed to open" in rtlLog):
+		rtlLog = open(globalVars.log_path+logFile,"r").read()
+		if checkLine(rtlLog, rtlErrors):
 			logging.debug("\n%s", rtlLog)
 			raise OSError("starting rtl_fm returns an error")
 	except OSError:
 		raise
 	except:
 		# we couldn't work without rtl_fm
-		logging.critical("cannot check rtl_fm.log")
-		logging.debug("cannot check rtl_fm.log", exc_info=True)
+		logging.critical("cannot check %s", logFile)
+		logging.debug("cannot check %s", logFile, exc_info=True)
 		raise
 
-def checkMultimon():
+def checkMultimon(logFile="multimon.log"):
 	"""
 	check startup of multimon-ng
 
+	@type    logFile: string
+	@param   logFile: name of the logfile of multimon-ng in the log_path
+
 	@exception: OSError when multimon-ng returns an error
 	@exception: Exception when checkMultimon throws an unexpected error
 	"""
 	try:
-		multimonLog = open(globalVars.log_path+"multimon.log","r").read()
-		if ("invalid" in multimonLog) or ("error" in multimonLog):
+		multimonLog = open(globalVars.log_path+logFile,"r").read()
+		if checkLine(multimonLog, multimonErrors):
 			logging.debug("\n%s", multimonLog)
 			raise OSError("starting multimon-ng returns an error")
 	except OSError:
 		raise
 	except:
 		# we couldn't work without multimon-ng
-		logging.critical("cannot check multimon.log")
-		logging.debug("cannot check multimon.log", exc_info=True)
+		logging.critical("cannot check %s", logFile)
+		logging.debug("cannot check %s", logFile, exc_info=True)
 		raise
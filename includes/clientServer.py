@@ -0,0 +1,250 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Client/server mode of BOSWatch (see Konzept.md)
+A client only runs rtl_fm, multimon-ng and the parsers of the decoders and sends
+the parsed datasets over a persistent TCP connection to the server.
+The server receives the datasets of all clients and processes them like its own:
+doubleFilter, RegEx filter, description lists and the plugins - so double alarms
+received by several clients are filtered out and every alarm reaches the plugins once.
+
+Frame: 4 byte length (network byte order) + JSON {"client", "typ", "freq", "data"}
+The server confirms every frame with one ack byte after it is in the input queue.
+A frame without ack is sent again after the reconnect (at-least-once), doubles
+are filtered by the doubleFilter of the server.
+
+Without authentication the server has to be protected by its bind address
+(default: localhost) or by allowed_clients - it doesn't start on another address
+without allowed_clients.
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be set in the config.ini
+"""
+
+import logging # Global logger
+import threading
+import socket
+import struct
+import json
+import Queue
+import SocketServer
+
+from includes import globalVars  # Global variables
+from includes.helper import stringConverter
+
+# local variables
+sendQueue = Queue.Queue(1000)
+senderThread = None
+server = None
+stopEvent = threading.Event()
+
+header = struct.Struct("!I")
+maxFrameSize = 1024 * 1024
+ack = "\x06"
+localAddresses = ("127.0.0.1", "::1", "localhost")
+
+
+def packRecord(typ, freq, data):
+	"""
+	Pack a parsed dataset into a frame
+
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data
+	@param   data: dataset returned by the parser of the decoder
+
+	@return:    frame as string
+	"""
+	record = {"client":globalVars.settings.ClientServer.name, "typ":typ, "freq":freq, "data":data}
+	try:
+		payload = json.dumps(record)
+	except UnicodeDecodeError:
+		# no valid UTF-8 from multimon-ng
+		payload = json.dumps(record, encoding="latin-1")
+	return header.pack(len(payload)) + payload
+
+
+def receiveExactly(sock, size):
+	"""
+	Read exactly size bytes from the socket
+
+	@return:    string or None if the connection was closed
+	"""
+	chunks = []
+	while size > 0:
+		chunk = sock.recv(size)
+		if not chunk:
+			return None
+		chunks.append(chunk)
+		size -= len(chunk)
+	return "".join(chunks)
+
+
+##
+#
+# Client
+#
+def startClient():
+	"""
+	Start the sender thread of the client
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	"""
+	global senderThread
+	logging.debug("starting client for server %s:%s", globalVars.settings.ClientServer.server, globalVars.settings.ClientServer.port)
+	stopEvent.clear()
+	senderThread = threading.Thread(target=_sender, name="clientSender")
+	senderThread.daemon = True
+	senderThread.start()
+
+
+def sendRecord(typ, freq, data):
+	"""
+	Queue a parsed dataset for the server
+
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data
+	@param   data: dataset returned by the parser of the decoder
+
+	@return:    nothing
+	"""
+	try:
+		sendQueue.put_nowait(packRecord(typ, freq, data))
+	except Queue.Full:
+		logging.error("send queue is full - %s dropped", typ)
+	except:
+		logging.error("cannot send %s to server", typ)
+		logging.debug("cannot send %s to server", typ, exc_info=True)
+
+
+def _sender():
+	"""
+	Sender thread - keeps one connection to the server and sends the queued frames
+	A lost connection or a missing ack reopens the connection with increasing delay,
+	the frame is sent again.
+
+	@return:    nothing
+	"""
+	sock = None
+	delay = 1
+	while True:
+		frame = sendQueue.get()
+		if frame is None:
+			break
+		while not stopEvent.is_set():
+			try:
+				if not sock:
+					sock = socket.create_connection((globalVars.settings.ClientServer.server, globalVars.settings.ClientServer.port), 10)
+					sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+					logging.info("connected to server %s:%s", globalVars.settings.ClientServer.server, globalVars.settings.ClientServer.port)
+					delay = 1
+				sock.sendall(frame)
+				if receiveExactly(sock, len(ack)) != ack:
+					raise socket.error("no ack of the server")
+				break
+			except socket.error:
+				logging.warning("connection to server failed - retry in %ss", delay)
+				logging.debug("connection to server failed", exc_info=True)
+				if sock:
+					sock.close()
+					sock = None
+				stopEvent.wait(delay)
+				delay = min(delay * 2, 60)
+	if sock:
+		sock.close()
+
+
+##
+#
+# Server
+#
+class RecordHandler(SocketServer.BaseRequestHandler):
+	"""Reads the frames of one client and puts them into the input queue"""
+
+	def handle(self):
+		from includes import receiver
+		address = self.client_address[0]
+		allowed = globalVars.settings.ClientServer.allowed_clients
+		if allowed and address not in allowed:
+			logging.warning("client %s not allowed", address)
+			return
+		logging.info("client %s connected", address)
+		try:
+			while True:
+				length = receiveExactly(self.request, header.size)
+				if length is None:
+					break
+				(length,) = header.unpack(length)
+				if length > maxFrameSize:
+					logging.error("frame of client %s too large (%s bytes)", address, length)
+					break
+				payload = receiveExactly(self.request, length)
+				if payload is None:
+					break
+				record = stringConverter.convertJsonToUTF8(json.loads(payload))
+				logging.debug("received %s from %s (%s)", record["typ"], record["client"], address)
+				receiver.inputQueue.put(("record", record["client"], (record["typ"], record["freq"], record["data"])))
+				self.request.sendall(ack)
+		except:
+			logging.error("error in connection of client %s", address)
+			logging.debug("error in connection of client %s", address, exc_info=True)
+		logging.info("client %s disconnected", address)
+
+
+class RecordServer(SocketServer.ThreadingMixIn, SocketServer.TCPServer):
+	"""TCP server with one thread per client"""
+	daemon_threads = True
+	allow_reuse_address = True
+
+
+def startServer():
+	"""
+	Start the server for the clients
+	Without server the server listens on localhost only, other addresses need allowed_clients.
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: Exception if the server couldn't be started
+	"""
+	global server
+	settings = globalVars.settings.ClientServer
+	address = settings.server or "127.0.0.1"
+	if address not in localAddresses and not settings.allowed_clients:
+		raise Exception("server on "+address+" without allowed_clients")
+	logging.debug("starting server on %s:%s", address, settings.port)
+	server = RecordServer((address, settings.port), RecordHandler)
+	serverThread = threading.Thread(target=server.serve_forever, name="recordServer")
+	serverThread.daemon = True
+	serverThread.start()
+
+
+def stop(timeout=3):
+	"""
+	Stop the client or the server
+	The client tries to send the queued frames within the timeout.
+
+	@type    timeout: integer
+	@param   timeout: max. seconds to wait for the sender
+
+	@return:    nothing
+	"""
+	if senderThread:
+		try:
+			sendQueue.put(None, True, timeout)
+		except Queue.Full:
+			pass
+		senderThread.join(timeout)
+		stopEvent.set()
+	if server:
+		server.shutdown()
+		server.server_close()
@@ -0,0 +1,163 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Typed and immutable snapshot of the config.ini
+The snapshot is created once at startup in boswatch.py and stored in globalVars.settings,
+so the decoders, filters and the alarmHandler read their configuration by attribute access
+(f.e. globalVars.settings.POC.allow_ric) instead of parsing the strings of the ConfigParser on every call.
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be read into globalVars.config
+"""
+
+import logging # Global logger
+from collections import namedtuple
+
+from includes.helper.ricList import RicList
+from includes.helper.configHandler import toList
+
+#
+# ListStructure [0..n] = (section, [(option, type, default), ...])
+# a missing option gets the default value
+#
+schema = (
+	("BOSWatch", (
+		("loglevel", "int", 10),
+		("backupCount", "int", 7),
+		("rtl_path", "str", ""),
+		("multimon_path", "str", ""),
+		("processAlarmAsync", "bool", False),
+		("processAlarmWorkers", "int", 0),
+		("processAlarmQueueSize", "int", 100),
+		("processAlarmConcurrency", "int", 1),
+		("processAlarmTimeout", "int", 30),
+		("useRegExFilter", "bool", False),
+		("doubleFilter_ignore_entries", "int", 10),
+		("doubleFilter_ignore_time", "int", 5),
+		("doubleFilter_check_msg", "bool", False),
+		("writeMultimonRaw", "bool", False),
+		("httpTimeout", "int", 10),
+		("retryQueue", "bool", True),
+		("retryQueueSize", "int", 1000),
+		("retryQueueMaxAge", "int", 1800),
+		("watchFiles", "bool", True),
+		("pluginLoading", "str", "background"),
+		("pluginWarmup", "int", 0),
+		("startupTimeout", "int", 10),
+		("restartDelay", "int", 5),
+		("stallTimeout", "int", 30),
+		("livenessOutputTimeout", "int", 0),
+		("livenessNetIdentTimeout", "int", 0),
+		("livenessAction", "str", "restart"),
+		("statusPort", "int", 0),
+		("statusAddress", "str", "127.0.0.1"),
+	)),
+	("ClientServer", (
+		("mode", "str", "standalone"),
+		("server", "str", ""),
+		("port", "int", 8113),
+		("name", "str", ""),
+		("allowed_clients", "set", frozenset()),
+	)),
+	("FMS", (
+		("idDescribed", "bool", False),
+		("checkCRC", "bool", False),
+	)),
+	("ZVEI", (
+		("idDescribed", "bool", False),
+	)),
+	("POC", (
+		("allow_ric", "riclist", RicList()),
+		("deny_ric", "riclist", RicList()),
+		("filter_range_start", "int", 0),
+		("filter_range_end", "int", 9999999),
+		("filter_ranges", "riclist", RicList()),
+		("idDescribed", "bool", False),
+		("onlysubric", "bool", False),
+		("rica", "str", ""),
+		("ricb", "str", ""),
+		("ricc", "str", ""),
+		("ricd", "str", ""),
+		("netIdent_ric", "riclist", RicList()),
+		("netIdent_history", "bool", False),
+		("geo_enable", "bool", False),
+		("geo_format", "str", ""),
+		("geo_order", "list", ()),
+	)),
+	("multicastAlarm", (
+		("multicastAlarm", "bool", False),
+		("multicastAlarm_ignore_time", "int", 15),
+		("multicastAlarm_delimiter_ric", "riclist", RicList()),
+		("multicastAlarm_ric", "riclist", RicList()),
+	)),
+)
+
+
+def readOption(config, section, option, typ):
+	"""
+	Read a single option in the given type
+
+	@return:    value of the option
+	@exception: ValueError if the option couldn't be converted
+	"""
+	if typ == "int":
+		return config.getint(section, option)
+	elif typ == "bool":
+		return config.getboolean(section, option)
+	elif typ == "set":
+		return frozenset(toList(config.get(section, option)))
+	elif typ == "riclist":
+		return RicList(toList(config.get(section, option)))
+	elif typ == "list":
+		return toList(config.get(section, option))
+	return config.get(section, option)
+
+
+def legacyFilterRange(options, values):
+	"""
+	Without filter_ranges the old filter_range_start/filter_range_end are used.
+	They are exclusive, the ranges of a RicList are inclusive.
+
+	@return:    values with the filled filter_ranges
+	"""
+	names = [option[0] for option in options]
+	index = names.index("filter_ranges")
+	if not values[index]:
+		start = values[names.index("filter_range_start")]
+		end = values[names.index("filter_range_end")]
+		values[index] = RicList(ranges=[(start+1, end-1)])
+	return values
+
+
+def createSnapshot(config):
+	"""
+	Create the snapshot of all sections in schema
+
+	@type    config: ConfigParser
+	@param   config: the read config.ini
+
+	@return:    namedtuple with one namedtuple per section
+	@exception: Exception if an option has an invalid value
+	"""
+	try:
+		logging.debug("create config snapshot")
+		sections = []
+		for (section, options) in schema:
+			values = []
+			for (option, typ, default) in options:
+				if config.has_option(section, option):
+					values.append(readOption(config, section, option, typ))
+				else:
+					logging.debug(" - [%s] %s not set, use default: %s", section, option, default)
+					values.append(default)
+			if section == "POC":
+				values = legacyFilterRange(options, values)
+			sectionTuple = namedtuple(section+"Settings", [option[0] for option in options])
+			sections.append(sectionTuple(*values))
+		return namedtuple("Settings", [section[0] for section in schema])(*sections)
+	except:
+		logging.error("cannot create config snapshot")
+		logging.debug("cannot create config snapshot", exc_info=True)
+		raise
@@ -11,9 +11,29 @@ Search for decode string and call the right decoder function
 
 import logging # Global logger
 
+from includes import globalVars  # Global variables
+from includes import liveness  # netIdent of the frequencies
+from includes.decoders import fms
+from includes.decoders import zvei
+from includes.decoders import poc
+
+# decoders by typ
+decoders = {"FMS": fms, "ZVEI": zvei, "POC": poc}
+
+# multimon-ng prefix (text in front of the first colon) -> typ
+prefixes = {
+	"FMS": "FMS",
+	"ZVEI1": "ZVEI",
+	"POCSAG512": "POC",
+	"POCSAG1200": "POC",
+	"POCSAG2400": "POC"
+	}
+
 def decode(freq, decoded):
 	"""
 	Search for decode string and call the right decoder function
+	The prefix of the line selects the decoder with one dictionary lookup,
+	the parser of the decoder reads the fields with one anchored regex.
 
 	@type    freq: string
 	@param   freq: frequency of the SDR Stick
@@ -24,26 +44,39 @@ def decode(freq, decoded):
 	@exception: Exception if decoder file call failed
 	"""
 	try:
-		# FMS Decoder Section
-		# check FMS: -> check CRC -> validate -> check double alarm -> log
-		if "FMS:" in decoded:
-			logging.debug("received FMS")
-			from includes.decoders import fms
-			fms.decode(freq, decoded)
-
-		# ZVEI Decoder Section
-		# check ZVEI: -> validate -> check double alarm -> log
-		elif "ZVEI1:" in decoded:
-			logging.debug("received ZVEI")
-			from includes.decoders import zvei
-			zvei.decode(freq, decoded)
-
-		# POCSAG Decoder Section
-		# check POCSAG -> validate -> check double alarm -> log
-		elif "POCSAG512:" in decoded or "POCSAG1200:" in decoded or "POCSAG2400:" in decoded:
-			logging.debug("received POCSAG")
-			from includes.decoders import poc
-			poc.decode(freq, decoded)
+		# FMS: check CRC -> validate, ZVEI: validate, POCSAG: validate -> check double alarm -> log
+		prefix = decoded.split(":", 1)[0].strip()
+		typ = prefixes.get(prefix)
+		if typ:
+			logging.debug("received %s", prefix)
+			processRecord(typ, freq, decoders[typ].parse(freq, decoded))
 
 	except:
 		logging.exception("cannot start decoder")
+
+
+def processRecord(typ, freq, data):
+	"""
+	Process a parsed dataset - in client mode it is sent to the server
+
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data
+	@param   data: dataset returned by the parser of the decoder (None if not valid)
+
+	@return:    nothing
+	@exception: Exception if processing failed
+	"""
+	if not data:
+		return
+	if typ == "POC" and data["ric"] in globalVars.settings.POC.netIdent_ric:
+		liveness.netIdentReceived(freq)
+	if globalVars.settings.ClientServer.mode == "client":
+		from includes import clientServer
+		clientServer.sendRecord(typ, freq, data)
+	elif typ in decoders:
+		decoders[typ].process(freq, data)
+	else:
+		logging.warning("unknown typ: %s", typ)
@@ -15,14 +15,28 @@ import re      # Regex for validation
 from includes import globalVars  # Global variables
 from includes import doubleFilter  # double alarm filter
 
+# FMS line of multimon-ng, the fields are found by their labels (not by columns):
+# FMS: 43f314170000 (9=Rotkreuz       3=Bayern 1         Ort 0x25=037FZG  7141Status  3=Einsatz Ab     0=FZG->LST 2=IV (mit NA,mit SIGNAL)) CRC correct
+pattern = re.compile(
+	r"\s*FMS:\s*[0-9a-fA-F]+\s*\("
+	r"(?P<service>.)=[^=]*\s"                           # Organisation
+	r"(?P<country>.)=[^=]*"                             # Bundesland
+	r"Ort\s*0x(?P<location>..)=\S*?\s*"                # Ort
+	r"FZG\s*(?P<vehicle>.{4})"                         # Fahrzeug
+	r"\s*Status\s*(?P<status>.)=[^=]*\s"                # Status
+	r"(?P<direction>.)=(?P<directionText>.{0,7})"      # Richtung, Richtung (Text)
+	r"[^=]*\s\d=(?P<tsi>.{0,3})"                        # Taktische Kurzinformation
+	r"(?:[^)]*\)+\s*(?P<crc>CRC correct))?")
+validFMS = re.compile(r"[0-9a-f]{8}[0-9a-f][01]$")
+
 ##
 #
-# FMS decoder function
-# validate -> check double alarm -> log
+# FMS parser function
+# validate -> build dataset
 #
-def decode(freq, decoded):
+def parse(freq, decoded):
 	"""
-	Export FMS Information from Multimon-NG RAW String and call alarmHandler.processAlarmHandler()
+	Export FMS Information from Multimon-NG RAW String
 
 	@type    freq: string
 	@param   freq: frequency of the SDR Stick
@@ -31,52 +45,95 @@ def decode(freq, decoded):
 
 	@requires:  Configuration has to be set in the config.ini
 
-	@return:    nothing
-	@exception: Exception if FMS decode failed
+	@return:    dataset of the FMS (without description) or None if not valid
+	@exception: Exception if FMS parsing failed
 	"""
 	try:
-		fms_service = decoded[19]            # Organisation
-		fms_country = decoded[36]            # Bundesland
-		fms_location = decoded[61:63]        # Ort
-		fms_vehicle = decoded[72:76]         # Fahrzeug
-		fms_status = decoded[84]             # Status
-		fms_direction = decoded[101]         # Richtung
-		fms_directionText = decoded[103:110] # Richtung (Text)
-		fms_tsi = decoded[114:117]           # Taktische Kruzinformation
-
-		proceed = True # no CRC-check required - proceed
+		record = pattern.match(decoded)
+		if not record:
+			logging.warning("No valid FMS: %s", decoded.strip())
+			return None
 
 		# shall we use the CRC-check?
-		if (globalVars.config.getboolean("FMS", "CheckCRC")):
-			if "CRC correct" not in decoded:
+		if globalVars.settings.FMS.checkCRC:
+			if not record.group("crc"):
 				# if CRC must be checked and is not correct - dont proceed
-				proceed = False
-
-		if (proceed == True):
-			fms_id = fms_service+fms_country+fms_location+fms_vehicle+fms_status+fms_direction # build FMS id
-			# if FMS is valid
-			if re.search("[0-9a-f]{8}[0-9a-f]{1}[01]{1}", fms_id):
-				# check for double alarm
-				if doubleFilter.checkID("FMS", fms_id):
-					logging.info("FMS:%s Status:%s Richtung:%s TSI:%s", fms_id[0:8], fms_status, fms_direction, fms_tsi)
-					data = {"fms":fms_id[0:8], "status":fms_status, "direction":fms_direction, "directionText":fms_directionText, "tsi":fms_tsi, "description":fms_id[0:8]}
-					# If enabled, look up description
-					if globalVars.config.getint("FMS", "idDescribed"):
-						from includes import descriptionList
-						data["description"] = descriptionList.getDescription("FMS", fms_id[0:8])
-					# processing the alarm
-					try:
-						from includes import alarmHandler
-						alarmHandler.processAlarmHandler("FMS", freq, data)
-					except:
-						logging.error("processing alarm failed")
-						logging.debug("processing alarm failed", exc_info=True)
-				# in every time save old data for double alarm
-				doubleFilter.newEntry(fms_id)
-			else:
-				logging.warning("No valid FMS: %s", fms_id)
+				logging.warning("FMS CRC incorrect")
+				return None
+
+		(fms_service, fms_country, fms_location, fms_vehicle, fms_status, fms_direction, fms_directionText, fms_tsi) = record.group("service", "country", "location", "vehicle", "status", "direction", "directionText", "tsi")
+		fms_id = fms_service+fms_country+fms_location+fms_vehicle+fms_status+fms_direction # build FMS id
+		# if FMS is valid
+		if validFMS.match(fms_id):
+			return {"fms":fms_id[0:8], "status":fms_status, "direction":fms_direction, "directionText":fms_directionText, "tsi":fms_tsi}
 		else:
-			logging.warning("FMS CRC incorrect")
+			logging.warning("No valid FMS: %s", fms_id)
 	except:
 		logging.error("error while decoding")
 		logging.debug("error while decoding", exc_info=True)
+	return None
+
+##
+#
+# FMS process function
+# check double alarm -> log -> alarm
+#
+def process(freq, data):
+	"""
+	Check a parsed FMS for double alarm and call alarmHandler.processAlarmHandler()
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data
+	@param   data: dataset returned by parse()
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: Exception if FMS processing failed
+	"""
+	try:
+		fms_id = data["fms"]+data["status"]+data["direction"]
+		# check for double alarm
+		if doubleFilter.checkID("FMS", fms_id):
+			logging.info("FMS:%s Status:%s Richtung:%s TSI:%s", data["fms"], data["status"], data["direction"], data["tsi"])
+			data["description"] = data["fms"]
+			# If enabled, look up description
+			if globalVars.settings.FMS.idDescribed:
+				from includes import descriptionList
+				data["description"] = descriptionList.getDescription("FMS", data["fms"])
+			# processing the alarm
+			try:
+				from includes import alarmHandler
+				alarmHandler.processAlarmHandler("FMS", freq, data)
+			except:
+				logging.error("processing alarm failed")
+				logging.debug("processing alarm failed", exc_info=True)
+		# in every time save old data for double alarm
+		doubleFilter.newEntry(fms_id)
+	except:
+		logging.error("error while processing")
+		logging.debug("error while processing", exc_info=True)
+
+##
+#
+# FMS decoder function
+# parse -> process
+#
+def decode(freq, decoded):
+	"""
+	Export FMS Information from Multimon-NG RAW String and call alarmHandler.processAlarmHandler()
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    decoded: string
+	@param   decoded: RAW Information from Multimon-NG
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: none
+	"""
+	data = parse(freq, decoded)
+	if data:
+		process(freq, data)
@@ -16,6 +16,14 @@ import re      # Regex for validation
 from includes import globalVars  # Global variables
 from includes import doubleFilter  # double alarm filter
 
+# POCSAG line of multimon-ng, the text is optional:
+# POCSAG1200: Address: 1001200  Function: 1  Alpha:   BOSWatch-Test: okay
+pattern = re.compile(r"\s*POCSAG(?P<bitrate>512|1200|2400):\s*Address:\s*(?P<ric>\S*)\s*Function:\s*(?P<function>\S?)(?:.*?Alpha:(?P<msg>.*))?")
+# control characters of multimon-ng in the text
+controlChars = re.compile(r"<NUL>?|< NUL>|<EOT>")
+validRIC = re.compile(r"[0-9]{7}$")
+validFunction = re.compile(r"[0-3]$")
+
 ##
 #
 # Simple local filter
@@ -35,59 +43,51 @@ def isAllowed(poc_id):
 
 	allowed = 0
 	has_geo = False
+	settings = globalVars.settings
 
 	# 1.) If allowed RICs is set, only they will path,
 	#       If RIC is the right one return True, else False
-	if globalVars.config.get("POC", "allow_ric"):
-		if poc_id in globalVars.config.get("POC", "allow_ric"):
+	if settings.POC.allow_ric:
+		if poc_id in settings.POC.allow_ric:
 			logging.info("RIC %s is allowed", poc_id)
 			return True
 		else:
 			logging.info("RIC %s is not in the allowed list", poc_id)
 			allowed = 0
 	# 2.) If denied RIC, return False
-	if poc_id in globalVars.config.get("POC", "deny_ric"):
+	if poc_id in settings.POC.deny_ric:
 		logging.info("RIC %s is denied by config.ini", poc_id)
 		return False # RIC is denied - strongest way to block
 	# 3.) Check Range, return False if outside def. range
-	if globalVars.config.getint("POC", "filter_range_start") < int(poc_id) < globalVars.config.getint("POC", "filter_range_end"):
+	if poc_id in settings.POC.filter_ranges:
 		logging.info("RIC %s in between filter range", poc_id)
 		return True
 	else:
 		logging.info("RIC %s out of filter range", poc_id)
 		allowed = 0
 	# 4.) Implementation for net identifiers
-	if globalVars.config.get("POC", "netIdent_ric"):
-		if poc_id in globalVars.config.get("POC", "netIdent_ric"):
-			logging.info("RIC %s as net identifier", poc_id)
-			return True
-		else:
-			allowed = 0
+	if poc_id in settings.POC.netIdent_ric:
+		logging.info("RIC %s as net identifier", poc_id)
+		return True
 	# 5.) Implementation for multicastAlarm
-	if globalVars.config.get("multicastAlarm", "multicastAlarm_delimiter_ric"):
-		if poc_id in globalVars.config.get("multicastAlarm", "multicastAlarm_delimiter_ric"):
-			logging.info("RIC %s as multicastAlarm delimiter", poc_id)
-			return True
-		else:
-			allowed = 0
-	if globalVars.config.get("multicastAlarm", "multicastAlarm_ric"):
-		if poc_id in globalVars.config.get("multicastAlarm", "multicastAlarm_ric"):
-			logging.info("RIC %s as multicastAlarm message", poc_id)
-			return True
-		else:
-			allowed = 0
+	if poc_id in settings.multicastAlarm.multicastAlarm_delimiter_ric:
+		logging.info("RIC %s as multicastAlarm delimiter", poc_id)
+		return True
+	if poc_id in settings.multicastAlarm.multicastAlarm_ric:
+		logging.info("RIC %s as multicastAlarm message", poc_id)
+		return True
 
 	if allowed == 0:
 		return False
 	return True
 ##
 #
-# POCSAG decoder function
-# validate -> check double alarm -> log
+# POCSAG parser function
+# validate -> build dataset
 #
-def decode(freq, decoded):
+def parse(freq, decoded):
 	"""
-	Export POCSAG information from Multimon-NG string and call alarmHandler.processAlarmHandler()
+	Export POCSAG information from Multimon-NG string
 
 	@type    freq: string
 	@param   freq: frequency of the SDR Stick
@@ -96,107 +96,149 @@ def decode(freq, decoded):
 
 	@requires:  Configuration has to be set in the config.ini
 
-	@return:    nothing
-	@exception: Exception if POCSAG decode failed
+	@return:    dataset of the POCSAG (without description) or None if not valid
+	@exception: Exception if POCSAG parsing failed
 	"""
 	has_geo = False
 	
 	try:
-		bitrate = 0
-
-		if "POCSAG512:" in decoded:
-			bitrate = 512
-			poc_id = decoded[20:27].replace(" ", "").zfill(7)
-			poc_sub = str(int(decoded[39])+1)
-
-		elif "POCSAG1200:" in decoded:
-			bitrate = 1200
-			poc_id = decoded[21:28].replace(" ", "").zfill(7)
-			poc_sub = str(int(decoded[40])+1)
-
-		elif "POCSAG2400:" in decoded:
-			bitrate = 2400
-			poc_id = decoded[21:28].replace(" ", "").zfill(7)
-			poc_sub = str(int(decoded[40])+1)
-
-		if bitrate is 0:
+		record = pattern.match(decoded)
+		if not record:
 			logging.warning("POCSAG Bitrate not found")
 			logging.debug(" - (%s)", decoded)
-		else:
-			logging.debug("POCSAG Bitrate: %s", bitrate)
-
-			if "Alpha:" in decoded: #check if there is a text message
-                		poc_text = decoded.split('Alpha:   ')[1].strip().replace('<NUL><NUL>','').replace('<NUL>','').replace('<NUL','').replace('< NUL>','').replace('<EOT>','').strip()
-                		if globalVars.config.getint("POC","geo_enable"):
-                    			try:
-                        			logging.debug("Using %s to find geo-tag in %s", globalVars.config.get("POC","geo_format"),poc_text)
-                        			m = re.search(globalVars.config.get("POC","geo_format"),poc_text)
-                        			if m:
-                            				logging.debug("Found geo-tag in message, parsing...")
-                            				has_geo = True
-                            				geo_order = globalVars.config.get("POC","geo_order").split(',')
-							if geo_order[0].lower == "lon":
-								lat = m.group(1) + "." + m.group(2)
-								lon = m.group(3) + "." + m.group(4)
-							else:
-								lon = m.group(1) + "." + m.group(2)
-								lat = m.group(3) + "." + m.group(4)
-								logging.debug("Finished parsing geo; lon: %s, lat: %s", lon, lat)
+			return None
+
+		bitrate = int(record.group("bitrate"))
+		logging.debug("POCSAG Bitrate: %s", bitrate)
+		poc_id = record.group("ric").zfill(7)
+		poc_function = record.group("function")
+		poc_sub = str(int(poc_function)+1)
+
+		if record.group("msg") is not None: #check if there is a text message
+			poc_text = controlChars.sub("", record.group("msg").strip()).strip()
+			if globalVars.settings.POC.geo_enable:
+				try:
+					logging.debug("Using %s to find geo-tag in %s", globalVars.settings.POC.geo_format, poc_text)
+					m = re.search(globalVars.settings.POC.geo_format, poc_text)
+					if m:
+						logging.debug("Found geo-tag in message, parsing...")
+						has_geo = True
+						geo_order = globalVars.settings.POC.geo_order
+						if geo_order[0].lower == "lon":
+							lat = m.group(1) + "." + m.group(2)
+							lon = m.group(3) + "." + m.group(4)
 						else:
-							logging.debug("No geo-tag found")
-							has_geo = False
-					except:
+							lon = m.group(1) + "." + m.group(2)
+							lat = m.group(3) + "." + m.group(4)
+							logging.debug("Finished parsing geo; lon: %s, lat: %s", lon, lat)
+					else:
+						logging.debug("No geo-tag found")
 						has_geo = False
-						logging.error("Exception parsing geo-information",exc_info=true)
-				else:
+				except:
 					has_geo = False
+					logging.error("Exception parsing geo-information", exc_info=True)
 			else:
-				poc_text = ""
-			if re.search("[0-9]{7}", poc_id) and re.search("[1-4]{1}", poc_sub): #if POC is valid
-				if isAllowed(poc_id):
-
-					# check for double alarm
-					if doubleFilter.checkID("POC", poc_id+poc_sub, poc_text):
-						data = {"ric":poc_id, "function":poc_sub, "msg":poc_text, "bitrate":bitrate, "description":poc_id, "has_geo":has_geo}
-						if has_geo == True:
-							data["lon"] = lon
-							data["lat"] = lat
-						# Add function as character a-d to dataset
-						data["functionChar"] = data["function"].replace("1", "a").replace("2", "b").replace("3", "c").replace("4", "d")
-
-						logging.info("POCSAG%s: %s %s %s ", data["bitrate"], data["ric"], data["function"], data["msg"])
-
-						# If enabled, look up description
-						if globalVars.config.getint("POC", "idDescribed"):
-							from includes import descriptionList
-							data["description"] = descriptionList.getDescription("POC", data["ric"]+data["functionChar"])
-
-						# multicastAlarm processing if enabled and a message without text or delimiter RIC or netIdent_ric received
-						if globalVars.config.getint("multicastAlarm", "multicastAlarm") and data["ric"] != globalVars.config.get("POC", "netIdent_ric") and (data["msg"] == "" or data["ric"] in globalVars.config.get("multicastAlarm", "multicastAlarm_delimiter_ric")):
-							logging.debug(" - multicastAlarm without msg")
-							from includes import multicastAlarm
-							multicastAlarm.newEntrymultiList(data)
-
-						# multicastAlarm processing if enabled and alarm message has been received
-						elif globalVars.config.getint("multicastAlarm", "multicastAlarm") and data["msg"] != "" and data["ric"] in globalVars.config.get("multicastAlarm", "multicastAlarm_ric"):
-							logging.debug(" - multicastAlarm with message")
-							from includes import multicastAlarm
-							multicastAlarm.multicastAlarmExec(freq, data)
-
-						else:
-							# processing the alarm
-							try:
-								from includes import alarmHandler
-								alarmHandler.processAlarmHandler("POC", freq, data)
-							except:
-								logging.error("processing alarm failed")
-								logging.debug("processing alarm failed", exc_info=True)
-					# in every time save old data for double alarm
-					doubleFilter.newEntry(poc_id+poc_sub, poc_text)
-				else:
-					logging.debug("POCSAG%s: %s is not allowed", bitrate, poc_id)
-			else:
-				logging.warning("No valid POCSAG%s RIC: %s SUB: %s", bitrate, poc_id, poc_sub)
+				has_geo = False
+		else:
+			poc_text = ""
+		if validRIC.match(poc_id) and validFunction.match(poc_function): #if POC is valid
+			data = {"ric":poc_id, "function":poc_sub, "msg":poc_text, "bitrate":bitrate, "has_geo":has_geo}
+			if has_geo == True:
+				data["lon"] = lon
+				data["lat"] = lat
+			return data
+		else:
+			logging.warning("No valid POCSAG%s RIC: %s SUB: %s", bitrate, poc_id, poc_sub)
 	except:
 		logging.error("error while decoding")
 		logging.debug("error while decoding", exc_info=True)
+	return None
+
+##
+#
+# POCSAG process function
+# check allowed -> check double alarm -> log -> alarm
+#
+def process(freq, data):
+	"""
+	Check a parsed POCSAG against the filters and for double alarm and call alarmHandler.processAlarmHandler()
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data
+	@param   data: dataset returned by parse()
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: Exception if POCSAG processing failed
+	"""
+	try:
+		poc_id = data["ric"]
+		poc_sub = data["function"]
+		poc_text = data["msg"]
+		if isAllowed(poc_id):
+
+			# check for double alarm
+			if doubleFilter.checkID("POC", poc_id+poc_sub, poc_text):
+				data["description"] = poc_id
+				# Add function as character a-d to dataset
+				data["functionChar"] = data["function"].replace("1", "a").replace("2", "b").replace("3", "c").replace("4", "d")
+
+				logging.info("POCSAG%s: %s %s %s ", data["bitrate"], data["ric"], data["function"], data["msg"])
+
+				# If enabled, look up description
+				if globalVars.settings.POC.idDescribed:
+					from includes import descriptionList
+					data["description"] = descriptionList.getDescription("POC", data["ric"]+data["functionChar"])
+
+				# multicastAlarm processing if enabled and a message without text or delimiter RIC or netIdent_ric received
+				if globalVars.settings.multicastAlarm.multicastAlarm and data["ric"] not in globalVars.settings.POC.netIdent_ric and (data["msg"] == "" or data["ric"] in globalVars.settings.multicastAlarm.multicastAlarm_delimiter_ric):
+					logging.debug(" - multicastAlarm without msg")
+					from includes import multicastAlarm
+					multicastAlarm.newEntrymultiList(data)
+
+				# multicastAlarm processing if enabled and alarm message has been received
+				elif globalVars.settings.multicastAlarm.multicastAlarm and data["msg"] != "" and data["ric"] in globalVars.settings.multicastAlarm.multicastAlarm_ric:
+					logging.debug(" - multicastAlarm with message")
+					from includes import multicastAlarm
+					multicastAlarm.multicastAlarmExec(freq, data)
+
+				else:
+					# processing the alarm
+					try:
+						from includes import alarmHandler
+						alarmHandler.processAlarmHandler("POC", freq, data)
+					except:
+						logging.error("processing alarm failed")
+						logging.debug("processing alarm failed", exc_info=True)
+			# in every time save old data for double alarm
+			doubleFilter.newEntry(poc_id+poc_sub, poc_text)
+		else:
+			logging.debug("POCSAG%s: %s is not allowed", data["bitrate"], poc_id)
+	except:
+		logging.error("error while processing")
+		logging.debug("error while processing", exc_info=True)
+
+##
+#
+# POCSAG decoder function
+# parse -> process
+#
+def decode(freq, decoded):
+	"""
+	Export POCSAG information from Multimon-NG string and call alarmHandler.processAlarmHandler()
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    decoded: string
+	@param   decoded: RAW Information from Multimon-NG
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: none
+	"""
+	data = parse(freq, decoded)
+	if data:
+		process(freq, data)
@@ -15,6 +15,10 @@ import re      # Regex for validation
 from includes import globalVars  # Global variables
 from includes import doubleFilter  # double alarm filter
 
+# ZVEI line of multimon-ng, f.e.: ZVEI1: 12345
+pattern = re.compile(r"\s*ZVEI1:\s*(?P<zvei>\S{0,5})")
+validZVEI = re.compile(r"[0-9]{5}$")
+
 ##
 #
 # Local function to remove the 'E'
@@ -39,46 +43,98 @@ def removeE(zvei):
 
 ##
 #
-# ZVEI decoder function
-# validate -> check double alarm -> log
+# ZVEI parser function
+# validate -> build dataset
 #
-def decode(freq, decoded):
+def parse(freq, decoded):
 	"""
-	Export ZVEI Information from Multimon-NG RAW String and call alarmHandler.processAlarmHandler()
+	Export ZVEI Information from Multimon-NG RAW String
 
 	@type    freq: string
 	@param   freq: frequency of the SDR Stick
 	@type    decoded: string
 	@param   decoded: RAW Information from Multimon-NG
 
-	@requires:  Configuration has to be set in the config.ini
-
-	@return:    nothing
-	@exception: Exception if ZVEI decode failed
+	@return:    dataset of the ZVEI (without description) or None if not valid
+	@exception: Exception if ZVEI parsing failed
 	"""
 	try:
-		zvei_id = decoded[7:12]    # ZVEI Code
-		zvei_id = removeE(zvei_id) # remove E (repeated tone)
-		if re.search("[0-9]{5}", zvei_id): # if ZVEI is valid
-			# check for double alarm
-			if doubleFilter.checkID("ZVEI", zvei_id):
-				logging.info("5-Ton: %s", zvei_id)
-				data = {"zvei":zvei_id, "description":zvei_id}
-				# If enabled, look up description
-				if globalVars.config.getint("ZVEI", "idDescribed"):
-					from includes import descriptionList
-					data["description"] = descriptionList.getDescription("ZVEI", zvei_id)
-				# processing the alarm
-				try:
-					from includes import alarmHandler
-					alarmHandler.processAlarmHandler("ZVEI", freq, data)
-				except:
-					logging.error("processing alarm failed")
-					logging.debug("processing alarm failed", exc_info=True)
-			# in every time save old data for double alarm
-			doubleFilter.newEntry(zvei_id)
+		record = pattern.match(decoded)
+		if not record:
+			logging.warning("No valid ZVEI: %s", decoded.strip())
+			return None
+		zvei_id = record.group("zvei") # ZVEI Code
+		zvei_id = removeE(zvei_id)     # remove E (repeated tone)
+		if validZVEI.match(zvei_id): # if ZVEI is valid
+			return {"zvei":zvei_id}
 		else:
 			logging.warning("No valid ZVEI: %s", zvei_id)
 	except:
 		logging.error("error while decoding")
 		logging.debug("error while decoding", exc_info=True)
+	return None
+
+##
+#
+# ZVEI process function
+# check double alarm -> log -> alarm
+#
+def process(freq, data):
+	"""
+	Check a parsed ZVEI for double alarm and call alarmHandler.processAlarmHandler()
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data
+	@param   data: dataset returned by parse()
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: Exception if ZVEI processing failed
+	"""
+	try:
+		zvei_id = data["zvei"]
+		# check for double alarm
+		if doubleFilter.checkID("ZVEI", zvei_id):
+			logging.info("5-Ton: %s", zvei_id)
+			data["description"] = zvei_id
+			# If enabled, look up description
+			if globalVars.settings.ZVEI.idDescribed:
+				from includes import descriptionList
+				data["description"] = descriptionList.getDescription("ZVEI", zvei_id)
+			# processing the alarm
+			try:
+				from includes import alarmHandler
+				alarmHandler.processAlarmHandler("ZVEI", freq, data)
+			except:
+				logging.error("processing alarm failed")
+				logging.debug("processing alarm failed", exc_info=True)
+		# in every time save old data for double alarm
+		doubleFilter.newEntry(zvei_id)
+	except:
+		logging.error("error while processing")
+		logging.debug("error while processing", exc_info=True)
+
+##
+#
+# ZVEI decoder function
+# parse -> process
+#
+def decode(freq, decoded):
+	"""
+	Export ZVEI Information from Multimon-NG RAW String and call alarmHandler.processAlarmHandler()
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    decoded: string
+	@param   decoded: RAW Information from Multimon-NG
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: none
+	"""
+	data = parse(freq, decoded)
+	if data:
+		process(freq, data)
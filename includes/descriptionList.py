@@ -12,43 +12,62 @@ Function to expand the dataset with a description.
 import logging # Global logger
 import csv # for loading the description files
 import re # for matching IDs with a regular expression
+import os
+import io
+import hashlib
+import marshal # cache of the description lists
 
 from includes import globalVars  # Global variables
 from includes.helper import stringConverter
 
 
 # local variables
-fmsDescribtionList  = {}
-zveiDescribtionList = {}
-ricDescribtionList  = {}
+descriptionLists = {} # typ -> {id: description}
+loadedLists = {} # csv-file -> (cache key, list) - unchanged files are not loaded again
+
+validID = re.compile("^[0-9A-F]+$", re.IGNORECASE)
+cacheVersion = 1 # increase if the structure of the lists changes
 
 
 ##
 #
 # Local function will load the csv-file
 #
-def loadCSV(typ, idField):
+def loadCSV(typ, idField, csvData=None):
 	"""
 	Local function for loading csv-file into python list
 	Structure: [id] = description
 
+	@type    csvData: string
+	@param   csvData: content of the csv-file (None: read the file)
+
 	@return:    Python list of descriptions
 	"""
 	resultList = {}
 	try:
 		logging.debug("-- loading %s.csv", typ)
-		with open(globalVars.script_path+'/csv/'+typ+'.csv') as csvfile:
-			# DictReader expected structure described in first line of csv-file
-			reader = csv.DictReader(csvfile)
-			for row in reader:
-				logging.debug(row)
-				# only import rows with an integer as id, allow subrics though
-				if re.match("^[0-9A-F]+$", row[idField], re.IGNORECASE):
+		if csvData is None:
+			with open(globalVars.script_path+'/csv/'+typ+'.csv', 'rb') as csvfile:
+				csvData = csvfile.read()
+		reader = csv.reader(io.BytesIO(csvData))
+		# expected structure described in first line of csv-file
+		header = next(reader)
+		idIndex = header.index(idField)
+		descriptionIndex = header.index('description')
+		for row in reader:
+			# only import rows with an integer as id, allow subrics though
+			if len(row) > max(idIndex, descriptionIndex) and validID.match(row[idIndex]):
+				description = row[descriptionIndex]
+				try:
+					description.decode('UTF-8')
+				except UnicodeDecodeError:
 					try:
-						resultList[row[idField].lower()] = stringConverter.convertToUTF8(row['description'])
+						description = stringConverter.convertToUTF8(description)
 					except:
 						# skip entry in case of an exception
-						pass
+						continue
+				# equal descriptions are stored once (also in the cache)
+				resultList[row[idIndex].lower()] = intern(description)
 		logging.debug("-- loading csv finished")
 	except:
 		logging.error("loading csvList for typ: %s failed", typ)
@@ -57,6 +76,88 @@ def loadCSV(typ, idField):
 	return resultList;
 
 
+##
+#
+# Local function to join main and sub RIC descriptions
+#
+def joinSubRics(ricList):
+	"""
+	Local function to build the POCSAG lookup index with the main
+	and sub RIC description already joined for every RIC+functionChar
+	A sub RIC without main RIC has no entry (unless onlysubric is set).
+
+	@type    ricList: map
+	@param   ricList: descriptions returned by loadCSV()
+
+	@return:    Python list of descriptions
+	"""
+	if globalVars.settings.POC.onlysubric:
+		return ricList
+	resultList = {}
+	for (ric, description) in ricList.iteritems():
+		for functionChar in "abcd":
+			subDescription = ricList.get(ric+functionChar)
+			if subDescription is None:
+				resultList[ric+functionChar] = description
+			else:
+				resultList[ric+functionChar] = description + " " + subDescription
+	return resultList
+
+
+##
+#
+# Local function will load the index from the cache or the csv-file
+#
+def loadIndex(typ, idField, variant=None, build=None):
+	"""
+	Local function for loading a description list
+	The list is cached in the log directory, keyed by modification time
+	and hash of the csv-file, so only a changed file is parsed again.
+
+	@type    variant: any marshal-able value
+	@param   variant: config which changes the list (part of the cache key)
+	@type    build:   function
+	@param   build:   builds the final list from the result of loadCSV()
+
+	@return:    Python list of descriptions
+	@exception: Exception if loading the csv-file failed
+	"""
+	csvPath = globalVars.script_path+'/csv/'+typ+'.csv'
+	cachePath = globalVars.log_path+typ+'Description.cache'
+	with open(csvPath, 'rb') as csvfile:
+		csvData = csvfile.read()
+	cacheKey = (cacheVersion, marshal.version, os.path.getmtime(csvPath), hashlib.sha1(csvData).hexdigest(), variant)
+	if typ in loadedLists and loadedLists[typ][0] == cacheKey:
+		logging.debug("-- %s.csv unchanged", typ)
+		return loadedLists[typ][1]
+
+	try:
+		with open(cachePath, 'rb') as cacheFile:
+			(key, resultList) = marshal.load(cacheFile)
+		if key == cacheKey:
+			logging.debug("-- %s.csv loaded from cache: %s entries", typ, len(resultList))
+			loadedLists[typ] = (cacheKey, resultList)
+			return resultList
+		logging.debug("-- %s.csv changed", typ)
+	except (IOError, EOFError, ValueError, TypeError):
+		logging.debug("-- no cache for %s.csv", typ)
+
+	resultList = loadCSV(typ, idField, csvData)
+	if build:
+		resultList = build(resultList)
+
+	try:
+		# write a new file and replace the old one, so a crash never leaves half a cache
+		with open(cachePath+'.tmp', 'wb') as cacheFile:
+			marshal.dump((cacheKey, resultList), cacheFile, 2)
+		os.rename(cachePath+'.tmp', cachePath)
+	except:
+		logging.warning("cannot write cache for %s.csv", typ)
+		logging.debug("cannot write cache for %s.csv", typ, exc_info=True)
+	loadedLists[typ] = (cacheKey, resultList)
+	return resultList
+
+
 ##
 #
 # call this for loading the description lists
@@ -71,20 +172,17 @@ def loadDescriptionLists():
 	try:
 		logging.debug("loading description lists")
 
-		if globalVars.config.getint("FMS", "idDescribed"):
+		if globalVars.settings.FMS.idDescribed:
 			logging.debug("- load FMS description list")
-			global fmsDescribtionList
-			fmsDescribtionList = loadCSV("fms", "fms")
+			descriptionLists["FMS"] = loadIndex("fms", "fms")
 
-		if globalVars.config.getint("ZVEI", "idDescribed"):
+		if globalVars.settings.ZVEI.idDescribed:
 			logging.debug("- load ZVEI description list")
-			global zveiDescribtionList
-			zveiDescribtionList = loadCSV("zvei", "zvei")
+			descriptionLists["ZVEI"] = loadIndex("zvei", "zvei")
 
-		if globalVars.config.getint("POC", "idDescribed"):
+		if globalVars.settings.POC.idDescribed:
 			logging.debug("- load pocsag description list")
-			global ricDescribtionList
-			ricDescribtionList = loadCSV("poc", "ric")
+			descriptionLists["POC"] = loadIndex("poc", "ric", globalVars.settings.POC.onlysubric, joinSubRics)
 
 	except:
 		logging.error("cannot load description lists")
@@ -99,33 +197,16 @@ def getDescription(typ, data):
 	"""
 	Get description for id.
 	Will return id if no description will be found.
+	For POCSAG the id is RIC+functionChar, main and sub RIC are already joined.
 
 	@return:    description as string
 	"""
-	resultStr = data
-	logging.debug("look up description lists")
 	try:
-		if typ == "FMS":
-			resultStr = fmsDescribtionList[data]
-		elif typ == "ZVEI":
-			resultStr = zveiDescribtionList[data]
-		elif typ == "POC":
-			if globalVars.config.getint("POC", "onlysubric"):
-				resultStr = ricDescribtionList[data] # only SubRIC
-			else:
-				resultStr = ricDescribtionList[data[:-1]] # MainRIC
-				resultStr += " " + ricDescribtionList[data] # SubRIC
-		else:
-			logging.warning("Invalid Typ: %s", typ)
-
+		resultStr = descriptionLists[typ].get(data, data)
 	except KeyError:
-		# will be thrown when there is no description for the id
-		# -> nothing to do...
-		pass
-
-	except:
-		logging.error("Error during look up description lists")
-		logging.debug("Error during look up description lists", exc_info=True)
+		if typ not in ("FMS", "ZVEI", "POC"):
+			logging.warning("Invalid Typ: %s", typ)
+		resultStr = data
 
 	logging.debug(" - result for %s: %s", data, resultStr)
 	return resultStr
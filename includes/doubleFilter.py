@@ -13,13 +13,16 @@ and the time ignoring the id in case of a double alarm
 
 import logging # Global logger
 import time    # timestamp for doublealarm
+from collections import deque
 
 from includes import globalVars  # Global variables
 
 #
-# ListStructure [0..n] = (Data, TimeStamp, msg)
+# doubleIndex[ID] = deque of (TimeStamp, msg), oldest first
+# doubleQueue = deque of (ID, TimeStamp) in order of insertion, for removing the oldest entries
 #
-doubleList = []
+doubleIndex = {}
+doubleQueue = deque()
 
 
 def checkID(typ, data, msg=""):
@@ -32,41 +35,61 @@ def checkID(typ, data, msg=""):
 	@return:    False if double was found
 	"""
 	timestamp = int(time.time()) # Get Timestamp
+	ignoreTime = globalVars.settings.BOSWatch.doubleFilter_ignore_time
 
 	logging.debug("checkID: %s (%s)", data, msg)
-	for (xID, xTimestamp, xMsg) in doubleList:
-		# given ID found?
+	# only the entries of the given ID have to be checked
+	for (xTimestamp, xMsg) in doubleIndex.get(data, ()):
 		# return False if the first entry in double_ignore_time is found, we will not check for younger ones...
-		if data == xID and timestamp < xTimestamp + globalVars.config.getint("BOSWatch", "doubleFilter_ignore_time"):
-			logging.debug("-- previous id %s is within doubleFilter_ignore_time (%ss)", xID, globalVars.config.getint("BOSWatch", "doubleFilter_ignore_time"))
+		if timestamp < xTimestamp + ignoreTime:
+			logging.debug("-- previous id %s is within doubleFilter_ignore_time (%ss)", data, ignoreTime)
 			# if wanted, we have to check the msg additional
-			if "POC" in typ and globalVars.config.getint("BOSWatch", "doubleFilter_check_msg"):
+			if "POC" in typ and globalVars.settings.BOSWatch.doubleFilter_check_msg:
 				logging.debug("-- compare msg:")
 				logging.debug("---- current msg: (%s)", msg.strip())
 				logging.debug("---- previous msg: (%s)", xMsg)
 				# if msg is a substring of xMsg we found a double
 				if msg.strip() in xMsg:
-					logging.info("%s double alarm (id+msg): %s within %s second(s)", typ, xID, timestamp-xTimestamp)
+					logging.info("%s double alarm (id+msg): %s within %s second(s)", typ, data, timestamp-xTimestamp)
 					return False
 			else:
-				logging.info("%s double alarm (id): %s within %s second(s)", typ, xID, timestamp-xTimestamp)
+				logging.info("%s double alarm (id): %s within %s second(s)", typ, data, timestamp-xTimestamp)
 				return False
 	return True
 
 
+def removeOldest():
+	"""
+	remove the oldest entry from the double alarm list
+
+	@return:    nothing
+	"""
+	(xID, _) = doubleQueue.popleft()
+	entries = doubleIndex[xID]
+	entries.popleft()
+	if not entries:
+		del doubleIndex[xID]
+
+
 def newEntry(data, msg = ""):
 	"""
 	new entry in double alarm list
 
 	@return:    nothing
 	"""
-	global doubleList
 	timestamp = int(time.time()) # Get Timestamp
-	doubleList.append((data, timestamp, msg.strip()))
+	doubleIndex.setdefault(data, deque()).append((timestamp, msg.strip()))
+	doubleQueue.append((data, timestamp))
 
 	logging.debug("Added %s to doubleList", data)
 
+	# entries older than doubleFilter_ignore_time couldn't be a double anymore
+	ignoreTime = globalVars.settings.BOSWatch.doubleFilter_ignore_time
+	while doubleQueue and timestamp >= doubleQueue[0][1] + ignoreTime:
+		removeOldest()
+
 	# now check if list has more than n entries:
-	if len(doubleList) > globalVars.config.getint("BOSWatch", "doubleFilter_ignore_entries"):
+	maxEntries = globalVars.settings.BOSWatch.doubleFilter_ignore_entries
+	while len(doubleQueue) > maxEntries:
 		# we have to kill the oldest one
-		doubleList.pop(0)
+		removeOldest()
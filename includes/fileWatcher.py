@@ -0,0 +1,283 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Reload of the description lists and the [Filters] without restart
+A background thread watches the csv-files and the config.ini (inotify,
+mtime polling if inotify isn't available). Changed files are loaded
+in this thread and replace the old lists at once - the decoding never waits.
+A reload of all lists can be requested with SIGHUP (see signalHandler), without
+watcher thread (watchFiles = 0) it runs in a short reload thread.
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be set in the config.ini
+"""
+
+import logging # Global logger
+import threading
+import os
+import select
+import struct
+import errno
+import ConfigParser
+
+from includes import globalVars  # Global variables
+
+# local variables
+watcherThread = None
+wakeupPipe = None # (read, write) - wakes the thread for reload and stop
+reloadRequested = False
+running = False
+mtimes = {} # watched file -> last modification time
+reloadLock = threading.Lock() # one reload thread at a time
+
+pollInterval = 5 # seconds between two checks without inotify
+settleTime = 1 # seconds without change before a file is loaded
+
+# inotify events (see inotify.h)
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+
+
+def getWatchedFiles():
+	"""
+	Local helper for the files to watch
+
+	@return:    map of file -> reload function
+	"""
+	from includes import descriptionList
+	files = {}
+	settings = globalVars.settings
+	if settings.BOSWatch.useRegExFilter:
+		files[globalVars.script_path+"/config/config.ini"] = reloadFilters
+	for (typ, section) in (("fms", settings.FMS), ("zvei", settings.ZVEI), ("poc", settings.POC)):
+		if section.idDescribed:
+			files[globalVars.script_path+"/csv/"+typ+".csv"] = descriptionList.loadDescriptionLists
+	return files
+
+
+def getMtime(path):
+	"""
+	Local helper to get the modification time of a file
+
+	@return:    modification time or None if the file doesn't exist
+	"""
+	try:
+		return os.path.getmtime(path)
+	except OSError:
+		return None
+
+
+def reloadFilters():
+	"""
+	Read the [Filters] of the config.ini again
+	The other sections are only read at start.
+
+	@return:    nothing
+	"""
+	from includes import regexFilter
+	config = ConfigParser.ConfigParser()
+	if not config.read(globalVars.script_path+"/config/config.ini"):
+		logging.error("cannot read config.ini - filters not reloaded")
+		return
+	regexFilter.loadFilters(config)
+
+
+def openInotify(paths):
+	"""
+	Local helper to watch the directories of the files with inotify
+	The directories are watched, because editors replace the files.
+
+	@return:    inotify file descriptor or None if inotify isn't available
+	"""
+	try:
+		import ctypes
+		import ctypes.util
+		libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+		fd = libc.inotify_init()
+		if fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init failed")
+		for directory in set(os.path.dirname(path) for path in paths):
+			if libc.inotify_add_watch(fd, directory, IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+				os.close(fd)
+				raise OSError(ctypes.get_errno(), "inotify_add_watch failed for "+directory)
+		return fd
+	except:
+		logging.debug("inotify not available - use polling", exc_info=True)
+		return None
+
+
+def readInotify(fd):
+	"""
+	Local helper to read the pending inotify events
+
+	@return:    set of the changed file names (without directory)
+	"""
+	names = set()
+	data = os.read(fd, 65536)
+	offset = 0
+	while offset + 16 <= len(data):
+		(wd, mask, cookie, length) = struct.unpack_from("iIII", data, offset)
+		names.add(data[offset+16:offset+16+length].rstrip("\0"))
+		offset += 16 + length
+	return names
+
+
+def start():
+	"""
+	Start the watcher thread
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	"""
+	global watcherThread
+	global wakeupPipe
+	global running
+	files = getWatchedFiles()
+	if not files:
+		logging.debug("no files to watch")
+		return
+	# watch first, so no change after the snapshot of the mtimes is missed
+	fd = openInotify(files.keys())
+	for path in files:
+		mtimes[path] = getMtime(path)
+	wakeupPipe = os.pipe()
+	running = True
+	watcherThread = threading.Thread(target=watcher, args=(files, fd), name="fileWatcher")
+	watcherThread.daemon = True
+	watcherThread.start()
+
+
+def stop(timeout=3):
+	"""
+	Stop the watcher thread
+
+	@type    timeout: integer
+	@param   timeout: max. seconds to wait for a running reload
+
+	@return:    nothing
+	"""
+	global running
+	if not watcherThread:
+		return
+	running = False
+	os.write(wakeupPipe[1], "s")
+	watcherThread.join(timeout)
+
+
+def requestReload():
+	"""
+	Request a reload of all lists - also from a signal handler
+	The reload runs in the watcher thread or, if no files are watched, in a reload thread.
+
+	@return:    nothing
+	"""
+	global reloadRequested
+	if not watcherThread:
+		reloadThread = threading.Thread(target=reloadAll, name="reload")
+		reloadThread.daemon = True
+		reloadThread.start()
+		return
+	reloadRequested = True
+	os.write(wakeupPipe[1], "r")
+
+
+def reloadAll():
+	"""
+	Thread - reloads all lists once, started by requestReload() without watcher thread
+
+	@return:    nothing
+	"""
+	if not globalVars.settings or globalVars.settings.ClientServer.mode == "client":
+		logging.warning("reload requested, but no lists are loaded")
+		return
+	with reloadLock:
+		logging.info("reload requested")
+		for reload in set(getWatchedFiles().values()):
+			try:
+				reload()
+			except:
+				logging.error("reload failed")
+				logging.debug("reload failed", exc_info=True)
+		logging.info("reload finished")
+
+
+def wait(fd, timeout):
+	"""
+	Local helper to wait for inotify events or a wakeup
+
+	@return:    set of changed file names (None: timeout or wakeup)
+	"""
+	waitFor = [wakeupPipe[0]]
+	if fd is not None:
+		waitFor.append(fd)
+	try:
+		(ready, _, _) = select.select(waitFor, [], [], timeout)
+	except select.error as e:
+		if e.args[0] == errno.EINTR:
+			return None
+		raise
+	if wakeupPipe[0] in ready:
+		os.read(wakeupPipe[0], 512)
+	if fd is not None and fd in ready:
+		return readInotify(fd)
+	return None
+
+
+def watcher(files, fd):
+	"""
+	Thread - waits for changes and reloads the changed lists
+
+	@type    files: map
+	@param   files: file -> reload function
+	@type    fd:    integer
+	@param   fd:    inotify file descriptor (None: polling)
+
+	@return:    nothing
+	"""
+	global reloadRequested
+	names = set(os.path.basename(path) for path in files)
+	logging.debug("watching %s with %s", ", ".join(sorted(files)), "inotify" if fd is not None else "polling")
+	try:
+		while running:
+			# with inotify the mtimes are checked once per minute as fallback only
+			changed = wait(fd, 60 if fd is not None else pollInterval)
+			if not running:
+				break
+			if changed is not None and not changed & names and not reloadRequested:
+				continue
+			# wait until the files are written completely
+			while changed and running:
+				changed = wait(fd, settleTime)
+
+			reloads = set()
+			for (path, reload) in files.items():
+				mtime = getMtime(path)
+				if mtime != mtimes[path] or reloadRequested:
+					if mtime != mtimes[path]:
+						logging.info("%s changed", os.path.basename(path))
+					mtimes[path] = mtime
+					reloads.add(reload)
+			if reloads and fd is None:
+				# polling - wait until the files are written completely
+				wait(fd, settleTime)
+				for path in files:
+					mtimes[path] = getMtime(path)
+			if reloadRequested:
+				logging.info("reload requested")
+				reloadRequested = False
+			for reload in reloads:
+				try:
+					reload()
+				except:
+					logging.error("reload failed")
+					logging.debug("reload failed", exc_info=True)
+			if reloads:
+				logging.info("reload finished")
+	finally:
+		if fd is not None:
+			os.close(fd)
@@ -15,6 +15,7 @@ buildDate = "28.04.2020"
 
 # Global variables
 config = 0
+settings = None # typed snapshot of config, see configSnapshot.py
 script_path = ""
 log_path = ""
 
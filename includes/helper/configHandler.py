@@ -37,3 +37,15 @@ def checkConfig(section=""):
 		logging.warning("error in config read/debug")
 		logging.debug("error in config read/debug", exc_info=True)
 		return False
+
+
+def toList(value):
+	"""
+	Split a comma separated string into a tuple of stripped, non-empty entries
+
+	@type    value: string
+	@param   value: comma separated string from the config.ini
+
+	@return:    tuple of strings
+	"""
+	return tuple(entry.strip() for entry in value.split(",") if entry.strip())
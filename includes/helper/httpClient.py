@@ -0,0 +1,250 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+#
+
+"""
+HTTP client with keep-alive connections for the plugins
+Idle connections are kept in a pool per host, so an alarm doesn't pay
+the TCP connect and TLS handshake again. The SSL contexts (CA store, client
+certificates) are created once and shared. One timeout policy for all plugins,
+set with httpTimeout in section [BOSWatch].
+
+f.e.: response = httpClient.request("POST", "https://api.example.com/alarm", body, headers)
+      if response.status == 200: ...
+
+@author: BOSWatch Team
+"""
+
+import logging
+import threading
+import time
+import socket
+import select
+import ssl
+import httplib
+import urlparse
+
+from includes import globalVars  # Global variables
+
+# local variables
+pools = {} # (scheme, host, port, id(context)) -> list of (connection, idle since)
+contexts = {} # (cafile, certfile, keyfile, verify) -> SSLContext
+lock = threading.Lock()
+
+maxIdle = 4 # max. idle connections per host
+maxIdleTime = 3 # seconds an idle connection is reused - below the keep-alive timeout of most servers (f.e. Apache 5s)
+
+
+class Response(object):
+	"""Status, reason, headers and the complete body of a response"""
+	def __init__(self, status, reason, headers, body):
+		self.status = status
+		self.reason = reason
+		self.headers = headers
+		self.body = body
+
+
+def getTimeout(timeout=None):
+	"""
+	Local helper for the timeout policy
+
+	@return:    (connect, read) timeout - given timeout or httpTimeout of the config
+	"""
+	if timeout is None:
+		if globalVars.settings:
+			timeout = globalVars.settings.BOSWatch.httpTimeout
+		else:
+			timeout = 10
+	if not isinstance(timeout, tuple):
+		timeout = (timeout, timeout)
+	return timeout
+
+
+def getContext(cafile=None, certfile=None, keyfile=None, password=None, verify=True):
+	"""
+	Shared SSLContext for the given certificates
+
+	@type    cafile:   string
+	@param   cafile:   CA file to verify the server (None: system CA store)
+	@type    certfile: string
+	@param   certfile: client certificate
+	@type    keyfile:  string
+	@param   keyfile:  key of the client certificate
+	@type    verify:   boolean
+	@param   verify:   verify the certificate of the server
+
+	@return:    SSLContext
+	@exception: Exception if a certificate couldn't be loaded
+	"""
+	key = (cafile, certfile, keyfile, verify)
+	with lock:
+		if key not in contexts:
+			if verify:
+				context = ssl.create_default_context(cafile=cafile or None)
+			else:
+				context = ssl._create_unverified_context()
+			if certfile:
+				context.load_cert_chain(certfile, keyfile or None, password)
+			contexts[key] = context
+		return contexts[key]
+
+
+def isClosed(connection):
+	"""
+	Local helper to check an idle connection before it is reused
+	An idle connection has nothing to read - a readable socket is at EOF
+	(closed by the server) or has unexpected data, both can't be reused.
+
+	@return:    True if the connection can't be reused
+	"""
+	if not connection.sock:
+		return True
+	try:
+		(readable, writable, errors) = select.select([connection.sock], [], [], 0)
+	except (select.error, socket.error, ValueError):
+		return True
+	return bool(readable)
+
+
+def getConnection(scheme, host, port, timeout, context):
+	"""
+	Local helper to get an idle connection from the pool or a new one
+
+	@return:    (connection, reused)
+	@exception: Exception if a new connection couldn't be opened
+	"""
+	(connectTimeout, readTimeout) = timeout
+	poolKey = (scheme, host, port, id(context))
+	now = time.time()
+	with lock:
+		pool = pools.setdefault(poolKey, [])
+		while pool:
+			(connection, idleSince) = pool.pop()
+			if now - idleSince < maxIdleTime and not isClosed(connection):
+				connection.timeout = readTimeout
+				connection.sock.settimeout(readTimeout)
+				return (connection, True)
+			logging.debug("idle connection to %s closed", host)
+			connection.close()
+	if scheme == "https":
+		connection = httplib.HTTPSConnection(host, port, timeout=connectTimeout, context=context)
+	else:
+		connection = httplib.HTTPConnection(host, port, timeout=connectTimeout)
+	# connect with the connect timeout, then wait for the response with the read timeout
+	try:
+		connection.connect()
+	except:
+		connection.close()
+		raise
+	connection.sock.settimeout(readTimeout)
+	connection.timeout = readTimeout
+	return (connection, False)
+
+
+def releaseConnection(scheme, host, port, context, connection):
+	"""
+	Local helper to put a connection back into the pool
+
+	@return:    nothing
+	"""
+	poolKey = (scheme, host, port, id(context))
+	with lock:
+		pool = pools.setdefault(poolKey, [])
+		if len(pool) < maxIdle:
+			pool.append((connection, time.time()))
+			return
+	connection.close()
+
+
+def request(method, url, body=None, headers=None, timeout=None, cafile=None, certfile=None, keyfile=None, password=None, verify=True, followRedirects=False):
+	"""
+	Send a HTTP request over a pooled keep-alive connection
+
+	@type    method:  string
+	@param   method:  GET, POST, PUT, ...
+	@type    url:     string
+	@param   url:     complete URL (http or https)
+	@type    body:    string
+	@param   body:    body of the request
+	@type    headers: map
+	@param   headers: extra HTTP headers (order is kept for an OrderedDict)
+	@type    timeout: integer or tuple
+	@param   timeout: seconds for connect and every read, or (connect, read) (None: httpTimeout of the config)
+	@type    followRedirects: boolean
+	@param   followRedirects: follow redirects of a GET request (max. 5)
+
+	@return:    Response
+	@exception: Exception if the request failed
+	"""
+	for redirect in range(6):
+		response = _request(method, url, body, headers, getTimeout(timeout), cafile, certfile, keyfile, password, verify)
+		location = response.headers.get("location")
+		if not (followRedirects and method == "GET" and location and response.status in (301, 302, 303, 307, 308)):
+			return response
+		url = urlparse.urljoin(url, location)
+		logging.debug("redirect to %s", url)
+	return response
+
+
+def _request(method, url, body, headers, timeout, cafile, certfile, keyfile, password, verify):
+	"""
+	Local helper for a single request
+	A reused connection may have been closed by the server in the meantime,
+	then the request is sent again over a new connection - if it couldn't be sent
+	or if it is a GET/HEAD, a POST which was sent may have reached the server.
+
+	@return:    Response
+	@exception: Exception if the request failed
+	"""
+	parts = urlparse.urlsplit(url)
+	scheme = parts.scheme.lower()
+	if scheme not in ("http", "https"):
+		raise ValueError("unsupported URL: "+url)
+	host = parts.hostname
+	port = parts.port or (443 if scheme == "https" else 80)
+	path = parts.path or "/"
+	if parts.query:
+		path += "?" + parts.query
+	context = getContext(cafile, certfile, keyfile, password, verify) if scheme == "https" else None
+
+	while True:
+		(connection, reused) = getConnection(scheme, host, port, timeout, context)
+		sent = False
+		try:
+			connection.request(method, path, body, headers or {})
+			sent = True
+			httpResponse = connection.getresponse()
+			responseBody = httpResponse.read()
+		except socket.timeout:
+			# the server may have received the request - don't send it again
+			connection.close()
+			raise
+		except (httplib.BadStatusLine, httplib.CannotSendRequest, httplib.ResponseNotReady, socket.error):
+			connection.close()
+			if reused and (not sent or method in ("GET", "HEAD")):
+				logging.debug("keep-alive connection to %s closed - reconnect", host)
+				continue
+			raise
+		except:
+			connection.close()
+			raise
+
+		response = Response(httpResponse.status, httpResponse.reason, dict(httpResponse.getheaders()), responseBody)
+		if httpResponse.will_close:
+			connection.close()
+		else:
+			releaseConnection(scheme, host, port, context, connection)
+		return response
+
+
+def closeAll():
+	"""
+	Close all idle connections
+
+	@return:    nothing
+	"""
+	with lock:
+		for pool in pools.values():
+			for (connection, idleSince) in pool:
+				connection.close()
+		pools.clear()
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+#
+
+"""
+List of RICs for the POC filters
+Single RICs are stored in a set, ranges in a sorted and merged interval index,
+which is searched by bisection. So a lookup costs the same for a few or thousands of entries.
+
+f.e.: RicList("1234567, 1000000-1000099, 2000000-2000999")
+
+@author: BOSWatch Team
+"""
+
+import logging
+from bisect import bisect_right
+
+
+class RicList(object):
+	"""Immutable set of single RICs and RIC ranges (both inclusive)"""
+
+	def __init__(self, entries=(), ranges=()):
+		"""
+		@type    entries: list of strings
+		@param   entries: single RICs ("1234567") or ranges ("1000000-1000099")
+		@type    ranges:  list of tuples
+		@param   ranges:  additional ranges as (start, end) integers
+
+		@exception: ValueError if an entry isn't a RIC or a range
+		"""
+		rics = set()
+		intervals = list(ranges)
+		for entry in entries:
+			if "-" in entry:
+				(start, end) = entry.split("-", 1)
+				intervals.append((int(start), int(end)))
+			else:
+				rics.add(str(int(entry)).zfill(7))
+
+		# sort and merge overlapping or adjacent ranges
+		merged = []
+		for (start, end) in sorted(intervals):
+			if start > end:
+				logging.warning("ignore empty RIC range %s-%s", start, end)
+				continue
+			if merged and start <= merged[-1][1] + 1:
+				merged[-1][1] = max(merged[-1][1], end)
+			else:
+				merged.append([start, end])
+
+		self.rics = frozenset(rics)
+		self.starts = tuple(interval[0] for interval in merged)
+		self.ends = tuple(interval[1] for interval in merged)
+
+
+	def inRange(self, ric):
+		"""
+		Check if the RIC is inside one of the ranges
+
+		@type    ric: string or integer
+		@param   ric: the RIC to check
+
+		@return:    True or False
+		"""
+		ric = int(ric)
+		index = bisect_right(self.starts, ric) - 1
+		return index >= 0 and ric <= self.ends[index]
+
+
+	def __contains__(self, ric):
+		return ric in self.rics or (bool(self.starts) and self.inRange(ric))
+
+
+	def __nonzero__(self):
+		return bool(self.rics or self.starts)
+
+
+	def __len__(self):
+		return len(self.rics) + len(self.starts)
+
+
+	def __repr__(self):
+		return "RicList(%s rics, %s ranges)" % (len(self.rics), len(self.starts))
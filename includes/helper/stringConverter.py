@@ -167,3 +167,22 @@ def convertToUTF8(inputString = ""):
 			raise
 
 	return uft8String
+
+
+def convertJsonToUTF8(data):
+	"""
+	Returns the loaded JSON data with all unicode strings as UTF-8 strings
+	json.loads() returns unicode, but the plugins expect UTF-8 strings
+
+	@type    data: dict, list or string
+	@param   data: data returned by json.loads()
+
+	@return:    data with UTF-8 strings
+	"""
+	if isinstance(data, dict):
+		return dict((convertJsonToUTF8(key), convertJsonToUTF8(value)) for (key, value) in data.iteritems())
+	elif isinstance(data, list):
+		return [convertJsonToUTF8(entry) for entry in data]
+	elif isinstance(data, unicode):
+		return data.encode('UTF-8')
+	return data
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Small thread-safe cache with a max. number of entries (least recently used are dropped)
+and a max. age per entry - f.e. for the results of web APIs, which repeat often.
+
+f.e.: cache = ttlCache.TTLCache(64, 3600)
+      value = cache.get(key)
+      if value is None: cache.put(key, loadValue(key))
+
+@author: BOSWatch Team
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+	"""LRU cache with time to live"""
+
+	def __init__(self, maxEntries, ttl):
+		"""
+		@type    maxEntries: integer
+		@param   maxEntries: max. number of entries
+		@type    ttl: integer
+		@param   ttl: seconds an entry is valid
+		"""
+		self.maxEntries = maxEntries
+		self.ttl = ttl
+		self.entries = OrderedDict() # key -> (time, value), oldest used first
+		self.lock = threading.Lock()
+
+
+	def get(self, key):
+		"""
+		Get the value of the key
+
+		@return:    value or None if not cached or expired
+		"""
+		with self.lock:
+			entry = self.entries.pop(key, None)
+			if entry is None:
+				return None
+			if time.time() - entry[0] > self.ttl:
+				return None
+			# mark as recently used
+			self.entries[key] = entry
+			return entry[1]
+
+
+	def put(self, key, value):
+		"""
+		Store the value of the key, the least recently used entry is dropped if the cache is full
+
+		@return:    nothing
+		"""
+		with self.lock:
+			self.entries.pop(key, None)
+			self.entries[key] = (time.time(), value)
+			while len(self.entries) > self.maxEntries:
+				self.entries.popitem(last=False)
+
+
+	def __len__(self):
+		return len(self.entries)
@@ -11,15 +11,155 @@ for direct use in plugins to save code
 """
 
 import logging
+import re
 
 from includes import globalVars
 
 from includes.helper import timeHandler
 
+#
+# wildcard -> function to get its value from the data
+# a function returns None if the wildcard is kept in the text
+#
+wildcards = {
+	"%TIME%": lambda data: getDateAndTime(data["timestamp"])[2],
+	"%DATE%": lambda data: getDateAndTime(data["timestamp"])[1],
+	"%BR%": lambda data: "\r\n",
+	"%LPAR%": lambda data: "(",
+	"%RPAR%": lambda data: ")",
+	"%FMS%": lambda data: data.get("fms"),
+	"%STATUS%": lambda data: data.get("status"),
+	"%DIR%": lambda data: data.get("direction"),
+	"%DIRT%": lambda data: data.get("directionText"),
+	"%TSI%": lambda data: data.get("tsi"),
+	"%ZVEI%": lambda data: data.get("zvei"),
+	"%RIC%": lambda data: data.get("ric"),
+	"%FUNC%": lambda data: data.get("function"),
+	"%FUNCTEXT%": lambda data: getFunctionText(data),
+	"%FUNCCHAR%": lambda data: data.get("functionChar"),
+	"%MSG%": lambda data: data.get("msg"),
+	"%BITRATE%": lambda data: str(data["bitrate"]) if "bitrate" in data else None,
+	"%DESCR%": lambda data: data.get("description"),
+}
+wildcardPattern = re.compile("|".join(re.escape(wildcard) for wildcard in wildcards))
+
+# (type, template) -> compiled template (None: replace sequential)
+templates = {}
+maxTemplates = 256
+
+# (timestamp, date, time) of the last alarm - all plugins get the same timestamp
+lastTime = (None, None, None)
+
+
+def getDateAndTime(timestamp):
+	"""
+	Local helper to format the timestamp only once per alarm
+
+	@return:    (timestamp, date, time)
+	"""
+	global lastTime
+	current = lastTime
+	if current[0] != timestamp:
+		current = lastTime = (timestamp, timeHandler.getDate(timestamp), timeHandler.getTime(timestamp))
+	return current
+
+
+def getFunctionText(data):
+	"""
+	Local helper for %FUNCTEXT% - the text of the function (rica..ricd)
+
+	@return:    text or None for an unknown function
+	"""
+	function = data.get("function")
+	if function == "1": return globalVars.settings.POC.rica
+	if function == "2": return globalVars.settings.POC.ricb
+	if function == "3": return globalVars.settings.POC.ricc
+	if function == "4": return globalVars.settings.POC.ricd
+	return None
+
+
+def compileTemplate(text):
+	"""
+	Split the text into literal parts and wildcards
+
+	If a literal part contains a % or wildcards overlap (f.e. %DATE%TIME%),
+	the result could depend on the order of replacement - then the text is replaced sequential.
+
+	@type    text: string
+	@param   text: Input text with wildcards
+
+	@return:    list of (isWildcard, string) or None
+	"""
+	parts = []
+	position = 0
+	for match in wildcardPattern.finditer(text):
+		if match.start() > position:
+			parts.append((False, text[position:match.start()]))
+		parts.append((True, match.group()))
+		position = match.end()
+	if position < len(text):
+		parts.append((False, text[position:]))
+	for (isWildcard, part) in parts:
+		if not isWildcard and "%" in part:
+			return None
+	# every occurrence of a wildcard (also overlapping ones) must be a part
+	occurrences = 0
+	for wildcard in wildcards:
+		position = text.find(wildcard)
+		while position >= 0:
+			occurrences += 1
+			position = text.find(wildcard, position + 1)
+	if occurrences != len([part for part in parts if part[0]]):
+		return None
+	return parts
+
+
+def replaceSequential(text, data):
+	"""
+	Local helper to replace the wildcards one after another
+	A replaced value can contain a wildcard, which is replaced by a later one.
+
+	@return:    text with replaced wildcards
+	"""
+	# replace date and time wildcards
+	(timestamp, date, time) = getDateAndTime(data["timestamp"])
+	text = text.replace("%TIME%", time).replace("%DATE%", date)
+
+	# replace some special chars
+	text = text.replace("%BR%", "\r\n")
+	text = text.replace("%LPAR%", "(")
+	text = text.replace("%RPAR%", ")")
+
+	# replace FMS data
+	if "fms" in data: text = text.replace("%FMS%", data["fms"])
+	if "status" in data: text = text.replace("%STATUS%", data["status"])
+	if "direction" in data: text = text.replace("%DIR%", data["direction"])
+	if "directionText" in data: text = text.replace("%DIRT%", data["directionText"])
+	if "tsi" in data: text = text.replace("%TSI%", data["tsi"])
+
+	# replace ZVEI data
+	if "zvei" in data: text = text.replace("%ZVEI%", data["zvei"])
+
+	# replace POC data
+	if "ric" in data: text = text.replace("%RIC%", data["ric"])
+	if "function" in data:
+		text = text.replace("%FUNC%", data["function"])
+		functionText = getFunctionText(data)
+		if functionText is not None: text = text.replace("%FUNCTEXT%", functionText)
+	if "functionChar" in data: text = text.replace("%FUNCCHAR%", data["functionChar"])
+	if "msg" in data: text = text.replace("%MSG%", data["msg"])
+	if "bitrate" in data: text = text.replace("%BITRATE%", str(data["bitrate"]))
+
+	# replace description (exists by all)
+	if "description" in data: text = text.replace("%DESCR%", data["description"])
+	return text
+
 
 def replaceWildcards(text, data):
 	"""
 	Replace all official Wildcards with the Information from the data[] var
+	The text is compiled once and then replaced in one pass,
+	only the values of the contained wildcards are determined.
 
 	@type    text: string
 	@param   text: Input text with wildcards
@@ -30,38 +170,35 @@ def replaceWildcards(text, data):
 	@exception: Exception if Error at replace
 	"""
 	try:
-		# replace date and time wildcards
-		text = text.replace("%TIME%", timeHandler.getTime(data["timestamp"])).replace("%DATE%", timeHandler.getDate(data["timestamp"]))
-
-		# replace some special chars
-		text = text.replace("%BR%", "\r\n")
-		text = text.replace("%LPAR%", "(")
-		text = text.replace("%RPAR%", ")")
-
-		# replace FMS data
-		if "fms" in data: text = text.replace("%FMS%", data["fms"])
-		if "status" in data: text = text.replace("%STATUS%", data["status"])
-		if "direction" in data: text = text.replace("%DIR%", data["direction"])
-		if "directionText" in data: text = text.replace("%DIRT%", data["directionText"])
-		if "tsi" in data: text = text.replace("%TSI%", data["tsi"])
-
-		# replace ZVEI data
-		if "zvei" in data: text = text.replace("%ZVEI%", data["zvei"])
-
-		# replace POC data
-		if "ric" in data: text = text.replace("%RIC%", data["ric"])
-		if "function" in data:
-			text = text.replace("%FUNC%", data["function"])
-			if data["function"] == "1": text = text.replace("%FUNCTEXT%", globalVars.config.get("POC","rica"))
-			if data["function"] == "2": text = text.replace("%FUNCTEXT%", globalVars.config.get("POC","ricb"))
-			if data["function"] == "3": text = text.replace("%FUNCTEXT%", globalVars.config.get("POC","ricc"))
-			if data["function"] == "4": text = text.replace("%FUNCTEXT%", globalVars.config.get("POC","ricd"))
-		if "functionChar" in data: text = text.replace("%FUNCCHAR%", data["functionChar"])
-		if "msg" in data: text = text.replace("%MSG%", data["msg"])
-		if "bitrate" in data: text = text.replace("%BITRATE%", str(data["bitrate"]))
-
-		# replace description (exists by all)
-		if "description" in data: text = text.replace("%DESCR%", data["description"])
+		# str and unicode of the same text are equal keys, but their parts are not
+		key = (type(text), text)
+		try:
+			parts = templates[key]
+		except KeyError:
+			if len(templates) >= maxTemplates:
+				templates.clear()
+			parts = templates[key] = compileTemplate(text)
+
+		result = None
+		if parts is not None:
+			result = []
+			for (isWildcard, part) in parts:
+				if isWildcard:
+					value = wildcards[part](data)
+					if value is None:
+						value = part
+					elif "%" in value:
+						# the value could contain a wildcard
+						result = None
+						break
+					result.append(value)
+				else:
+					result.append(part)
+
+		if result is None:
+			text = replaceSequential(text, data)
+		else:
+			text = "".join(result)
 
 		logging.debug("wildcards been replaced")
 
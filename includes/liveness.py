@@ -0,0 +1,235 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Liveness of the receivers
+A quiet channel and a deaf receiver (rtl_fm hangs, USB stick dropped) look the same
+in the decoding loop. The watchdog tracks the time since the last output of multimon-ng
+of every receiver and since the last netIdent_ric (section [POC]) of every frequency.
+If livenessOutputTimeout or livenessNetIdentTimeout is exceeded, the receiver is
+deaf: an error is logged and with livenessAction = restart its pipeline is restarted.
+The state is served as JSON by a local HTTP status endpoint (statusPort).
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be set in the config.ini
+"""
+
+import logging # Global logger
+import threading
+import time
+import json
+import SocketServer
+import BaseHTTPServer
+
+from includes import globalVars  # Global variables
+
+# local variables
+lastNetIdent = {} # freq -> time of the last netIdent_ric
+deaf = {} # receiver name -> (kind, reason, since) - kind: output or netIdent
+watchdogThread = None
+statusServer = None
+stopEvent = threading.Event()
+startTime = time.time()
+
+checkInterval = 1 # seconds between two checks of the watchdog
+
+
+def netIdentReceived(freq):
+	"""
+	Note a netIdent_ric received on the frequency
+
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+
+	@return:    nothing
+	"""
+	lastNetIdent[freq] = time.time()
+
+
+def start():
+	"""
+	Start the watchdog and the status endpoint
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: Exception if the status endpoint couldn't be started
+	"""
+	global watchdogThread
+	global statusServer
+	settings = globalVars.settings.BOSWatch
+	stopEvent.clear()
+	if settings.livenessOutputTimeout or settings.livenessNetIdentTimeout:
+		watchdogThread = threading.Thread(target=_watchdog, name="liveness")
+		watchdogThread.daemon = True
+		watchdogThread.start()
+	else:
+		logging.debug("liveness watchdog disabled")
+
+	if settings.statusPort:
+		logging.debug("starting status endpoint on %s:%s", settings.statusAddress, settings.statusPort)
+		statusServer = StatusServer((settings.statusAddress, settings.statusPort), StatusHandler)
+		serverThread = threading.Thread(target=statusServer.serve_forever, name="statusServer")
+		serverThread.daemon = True
+		serverThread.start()
+
+
+def stop(timeout=3):
+	"""
+	Stop the watchdog and the status endpoint
+
+	@type    timeout: integer
+	@param   timeout: max. seconds to wait for the watchdog
+
+	@return:    nothing
+	"""
+	stopEvent.set()
+	if watchdogThread:
+		watchdogThread.join(timeout)
+	if statusServer:
+		statusServer.shutdown()
+		statusServer.server_close()
+
+
+def getDeafReason(receiver, now):
+	"""
+	Local helper to check the thresholds for a receiver
+	The start of the pipeline counts as output and netIdent, so a restart resets both.
+
+	@return:    (kind, reason) or (None, None) if the receiver is alive
+	"""
+	settings = globalVars.settings.BOSWatch
+	outputAge = now - max(receiver.lastOutput, receiver.startTime)
+	if settings.livenessOutputTimeout and outputAge > settings.livenessOutputTimeout:
+		return ("output", "no output of multimon-ng for "+str(int(outputAge))+"s")
+	netIdentAge = now - max(lastNetIdent.get(receiver.freq, 0), receiver.startTime)
+	if settings.livenessNetIdentTimeout and netIdentAge > settings.livenessNetIdentTimeout:
+		return ("netIdent", "no netIdent_ric for "+str(int(netIdentAge))+"s")
+	return (None, None)
+
+
+def check():
+	"""
+	Check all running receivers, log the changes of their state and restart the deaf ones
+
+	@return:    nothing
+	"""
+	from includes import receiver as receiverModule
+	now = time.time()
+	for receiver in receiverModule.receivers:
+		name = str(receiver)
+		if name in deaf:
+			# only received data ends the deaf state, not the restart
+			(kind, reason, since) = deaf[name]
+			last = receiver.lastOutput if kind == "output" else lastNetIdent.get(receiver.freq, 0)
+			if last > since:
+				logging.info("receiver %s receives again", name)
+				del deaf[name]
+		if not receiver.running:
+			continue
+		(kind, reason) = getDeafReason(receiver, now)
+		if not reason:
+			continue
+		if name not in deaf:
+			logging.error("receiver %s is deaf: %s", name, reason)
+			deaf[name] = (kind, reason, now)
+		if globalVars.settings.BOSWatch.livenessAction == "restart":
+			receiver.restart(reason)
+
+
+def _watchdog():
+	"""
+	Watchdog thread - checks the receivers every checkInterval seconds
+
+	@return:    nothing
+	"""
+	while not stopEvent.wait(checkInterval):
+		try:
+			check()
+		except:
+			logging.error("error in liveness watchdog")
+			logging.debug("error in liveness watchdog", exc_info=True)
+
+
+def getAge(timestamp, now):
+	"""
+	Local helper for the age of a timestamp
+
+	@return:    seconds as integer or None if never
+	"""
+	if not timestamp:
+		return None
+	return int(now - timestamp)
+
+
+def getStatus():
+	"""
+	State of the receivers and the alarm queues
+
+	@return:    map for the status endpoint
+	"""
+	from includes import receiver as receiverModule
+	from includes import alarmDispatcher
+	from includes import retryQueue
+	now = time.time()
+	ok = True
+	receivers = []
+	for receiver in receiverModule.receivers:
+		name = str(receiver)
+		deafReason = deaf[name][1] if name in deaf else None
+		ok = ok and receiver.running and not deafReason
+		receivers.append({
+			"name": name,
+			"freq": receiver.freq,
+			"running": receiver.running,
+			"restarts": receiver.restarts,
+			"lastOutput": getAge(receiver.lastOutput, now),
+			"lastNetIdent": getAge(lastNetIdent.get(receiver.freq), now),
+			"deaf": deafReason,
+		})
+	return {
+		"status": "ok" if ok else "error",
+		"uptime": int(now - startTime),
+		"receivers": receivers,
+		# also the frequencies of the clients in server mode
+		"netIdent": dict((str(freq), getAge(last, now)) for (freq, last) in lastNetIdent.items()),
+		"alarmQueue": alarmDispatcher.getQueueDepth(),
+		"retryQueue": {"depth": retryQueue.getQueueDepth(), "oldestAge": retryQueue.getOldestAge()},
+	}
+
+
+##
+#
+# Status endpoint
+#
+class StatusHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+	"""Serves getStatus() as JSON - status 503 if a receiver is deaf or not running"""
+
+	def do_GET(self):
+		if self.path.split("?")[0] not in ("/", "/status"):
+			self.send_error(404)
+			return
+		try:
+			status = getStatus()
+			body = json.dumps(status, indent=2, sort_keys=True)
+		except:
+			logging.error("cannot create status")
+			logging.debug("cannot create status", exc_info=True)
+			self.send_error(500)
+			return
+		self.send_response(200 if status["status"] == "ok" else 503)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+
+	def log_message(self, format, *args):
+		logging.debug("status request from %s: %s", self.client_address[0], format % args)
+
+
+class StatusServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+	"""HTTP server with one thread per request"""
+	daemon_threads = True
+	allow_reuse_address = True
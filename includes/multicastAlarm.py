@@ -28,7 +28,7 @@ def newEntrymultiList(data):
 	global multiList
 	timestamp = int(time.time())
 	# multicastAlarm processing if enabled and delimiter RIC has been received
-	if data['ric'] == globalVars.config.get("multicastAlarm", "multicastAlarm_delimiter_ric"):
+	if data['ric'] in globalVars.settings.multicastAlarm.multicastAlarm_delimiter_ric:
 		del multiList[:]
 		logging.debug("delimiter RIC received - buffer cleared")
 	else:
@@ -36,7 +36,7 @@ def newEntrymultiList(data):
 		logging.debug("Added %s to multiList", data['ric'])
 		# check for old entries in multiList
 		for (xData, xTimestamp) in multiList[:]:
-			if xTimestamp < timestamp-globalVars.config.getint("multicastAlarm", "multicastAlarm_ignore_time"):
+			if xTimestamp < timestamp-globalVars.settings.multicastAlarm.multicastAlarm_ignore_time:
 				multiList.remove([xData, xTimestamp])
 				logging.debug("RIC %s removed - %s sec. older than current timestamp", xData['ric'], xTimestamp-timestamp)
 
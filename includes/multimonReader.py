@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Reader stage for the output of multimon-ng
+The output is read in large chunks and split into lines in memory,
+so a busy channel doesn't cost one syscall per line.
+The raw data is written through one long-lived buffered file, which is flushed on a timer.
+
+@author: BOSWatch Team
+
+@requires: none
+"""
+
+import logging # Global logger
+import os
+import threading
+
+
+def readBatches(stream, chunkSize=65536):
+	"""
+	Read the stream in chunks and yield the complete lines as batches
+	A line is only yielded if its line break was received.
+
+	@type    stream: file object
+	@param   stream: stdout of multimon-ng
+	@type    chunkSize: integer
+	@param   chunkSize: max. bytes per read
+
+	@return:    generator of lists of lines (with line break)
+	"""
+	fd = stream.fileno()
+	rest = ""
+	while True:
+		chunk = os.read(fd, chunkSize)
+		if not chunk:
+			# end of stream - multimon-ng has been terminated
+			if rest:
+				yield [rest]
+			return
+		# only "\n" ends a line, splitlines() would also split at \r, \x0c, ... in a message
+		lines = (rest + chunk).split("\n")
+		rest = lines.pop()
+		if lines:
+			yield [line + "\n" for line in lines]
+
+
+class RawDataWriter(object):
+	"""Buffered writer for the raw data of multimon-ng"""
+
+	def __init__(self, fileName, flushInterval=5):
+		"""
+		@type    fileName: string
+		@param   fileName: path of the file to append to
+		@type    flushInterval: integer
+		@param   flushInterval: seconds between two flushes
+
+		@exception: IOError if the file couldn't be opened
+		"""
+		self.rawFile = open(fileName, "a", 65536)
+		self.lock = threading.Lock()
+		self.stopEvent = threading.Event()
+		self.flushThread = threading.Thread(target=self._flushLoop, args=(flushInterval,), name="rawDataFlush")
+		self.flushThread.daemon = True
+		self.flushThread.start()
+
+
+	def write(self, lines):
+		"""
+		Write a batch of lines into the buffer
+
+		@type    lines: list of strings
+		@param   lines: lines from readBatches()
+
+		@return:    nothing
+		"""
+		try:
+			with self.lock:
+				self.rawFile.writelines(lines)
+		except:
+			logging.warning("cannot write raw multimon data")
+			logging.debug("cannot write raw multimon data", exc_info=True)
+
+
+	def _flushLoop(self, flushInterval):
+		"""
+		Thread - flushes the buffer every flushInterval seconds
+
+		@return:    nothing
+		"""
+		while not self.stopEvent.wait(flushInterval):
+			try:
+				with self.lock:
+					self.rawFile.flush()
+			except:
+				logging.warning("cannot flush raw multimon data")
+				logging.debug("cannot flush raw multimon data", exc_info=True)
+
+
+	def close(self):
+		"""
+		Stop the flush thread and close the file
+
+		@return:    nothing
+		"""
+		self.stopEvent.set()
+		with self.lock:
+			self.rawFile.close()
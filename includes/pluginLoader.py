@@ -12,46 +12,196 @@ Functions to Load and import the Plugins
 import logging # Global logger
 import imp
 import os
+import threading
+import time
 
 from ConfigParser import NoOptionError # we need this exception
 from includes import globalVars  # Global variables
 
+# local variables
+pluginInfo = {} # pluginName -> plugin data of getPlugins()
+pluginNames = [] # enabled plugins in the order of the plugin folder (without failed ones), never changed in place
+readyEvents = {} # pluginName -> Event, set if the plugin is loaded or failed
+loadLocks = {} # pluginName -> Lock, only one thread loads a plugin
+importedPlugins = {} # pluginName -> (module, seconds for the import)
+mode = "start" # pluginLoading: start, background or lazy
+
+
 def loadPlugins():
 	"""
-	Load all plugins into globalVars.pluginList
+	Search all enabled plugins - depending on pluginLoading they are loaded now (start),
+	by startLoading() in the background (background) or at the first alarm (lazy)
+	Loaded plugins are inserted into globalVars.pluginList
 
 	@return:    nothing
 	@exception: Exception if insert into globalVars.pluginList failed
 	"""
+	global mode
 	try:
-		logging.debug("loading plugins")
-		# go to all Plugins from getPlugins()
+		mode = globalVars.settings.BOSWatch.pluginLoading
+		if mode not in ("start", "background", "lazy"):
+			logging.warning("unknown pluginLoading: %s - plugins are loaded at start", mode)
+			mode = "start"
+		logging.debug("loading plugins (%s)", mode)
 		for i in getPlugins():
-			try:
-				# call for each Plugin the loadPlugin() Methode
-				plugin = loadPlugin(i)
-			except:
-				# call next plugin, if one has thrown an exception
-				logging.error("error loading plugin: %s", i["name"])
-				logging.debug("error loading plugin: %s", i["name"], exc_info=True)
-			else: # only call onLoad() and insert into pluginList[] if import is succesfull
-
-				try:
-					# Try to call the .onLoad() routine for all active plugins
-					logging.debug("call %s.onLoad()", i["name"])
-					plugin.onLoad()
-					# Add it to globalVars.pluginList
-					globalVars.pluginList[i["name"]] = plugin
-				except:
-					# call next plugin, if one has thrown an exception
-					logging.error("error calling %s.onLoad()", i["name"])
-					logging.debug("error calling %s.onLoad()", exc_info=True)
+			pluginInfo[i["name"]] = i
+			pluginNames.append(i["name"])
+			readyEvents[i["name"]] = threading.Event()
+			loadLocks[i["name"]] = threading.Lock()
+
+		if mode == "start":
+			# go to all Plugins from getPlugins()
+			start = time.time()
+			for pluginName in pluginNames:
+				initPlugin(pluginName)
+			logging.info("%s plugins loaded in %.2fs", len(globalVars.pluginList), time.time() - start)
 	except:
 		logging.error("cannot load plugins")
 		logging.debug("cannot load plugins", exc_info=True)
 		raise
 
 
+def startLoading():
+	"""
+	Start the loading of the plugins, which are not loaded by loadPlugins()
+	background: one thread imports the plugins, the .onLoad() routines run in parallel
+	lazy: the plugins are loaded at their first alarm or after pluginWarmup seconds
+
+	@return:    nothing
+	"""
+	if mode == "background":
+		loader = threading.Thread(target=backgroundLoader, name="pluginLoader")
+		loader.daemon = True
+		loader.start()
+	elif mode == "lazy" and globalVars.settings.BOSWatch.pluginWarmup > 0:
+		warmup = threading.Timer(globalVars.settings.BOSWatch.pluginWarmup, backgroundLoader)
+		warmup.name = "pluginWarmup"
+		warmup.daemon = True
+		warmup.start()
+
+
+def backgroundLoader():
+	"""
+	Thread - imports all plugins one after another and calls their .onLoad() in parallel
+	(Python imports one module at a time anyway, so the import times are exact)
+
+	@return:    nothing
+	"""
+	start = time.time()
+	threads = []
+	for pluginName in pluginNames:
+		with loadLocks[pluginName]:
+			if readyEvents[pluginName].is_set():
+				continue
+			plugin = importPlugin(pluginName)
+		if plugin:
+			thread = threading.Thread(target=initPlugin, args=(pluginName,), name="onLoad-"+pluginName)
+			thread.daemon = True
+			thread.start()
+			threads.append(thread)
+	for thread in threads:
+		thread.join()
+	logging.info("%s plugins loaded in %.2fs", len(globalVars.pluginList), time.time() - start)
+
+
+def importPlugin(pluginName):
+	"""
+	Local helper to import a plugin (only once) and to measure the time
+	Must be called with the loadLock of the plugin held
+
+	@return:    module of the plugin or None if the import failed
+	"""
+	if pluginName in importedPlugins:
+		return importedPlugins[pluginName][0]
+	start = time.time()
+	try:
+		plugin = loadPlugin(pluginInfo[pluginName])
+	except:
+		# call next plugin, if one has thrown an exception
+		logging.error("error loading plugin: %s", pluginName)
+		logging.debug("error loading plugin: %s", pluginName, exc_info=True)
+		pluginFailed(pluginName)
+		return None
+	importedPlugins[pluginName] = (plugin, time.time() - start)
+	return plugin
+
+
+def initPlugin(pluginName):
+	"""
+	Local helper to import (if not done) a plugin and call its .onLoad() routine
+	Nothing happens if the plugin is already loaded or failed.
+
+	@type    pluginName: string
+	@param   pluginName: Name of the plugin
+
+	@return:    nothing
+	"""
+	with loadLocks[pluginName]:
+		if readyEvents[pluginName].is_set():
+			return
+		plugin = importPlugin(pluginName)
+		if not plugin:
+			return
+		start = time.time()
+		try:
+			# Try to call the .onLoad() routine for all active plugins
+			logging.debug("call %s.onLoad()", pluginName)
+			plugin.onLoad()
+		except:
+			# call next plugin, if one has thrown an exception
+			logging.error("error calling %s.onLoad()", pluginName)
+			logging.debug("error calling %s.onLoad()", pluginName, exc_info=True)
+			pluginFailed(pluginName)
+			return
+		logging.info("plugin %s loaded (import: %.3fs, onLoad: %.3fs)", pluginName, importedPlugins[pluginName][1], time.time() - start)
+		# Add it to globalVars.pluginList
+		globalVars.pluginList[pluginName] = plugin
+		readyEvents[pluginName].set()
+
+
+def pluginFailed(pluginName):
+	"""
+	Local helper to remove a plugin, which couldn't be loaded
+	Waiting alarms for this plugin are dropped.
+
+	@return:    nothing
+	"""
+	global pluginNames
+	# new list - other threads may iterate over the old one
+	pluginNames = [name for name in pluginNames if name != pluginName]
+	readyEvents[pluginName].set()
+
+
+def getPluginNames():
+	"""
+	Names of all enabled plugins - also of the plugins, which are not loaded yet
+
+	@return:    list of pluginNames
+	"""
+	return pluginNames
+
+
+def getPlugin(pluginName):
+	"""
+	Get a loaded plugin - waits until the plugin is loaded,
+	in lazy mode the first caller loads the plugin
+
+	@type    pluginName: string
+	@param   pluginName: Name of the plugin
+
+	@return:    module of the plugin or None if it couldn't be loaded
+	"""
+	plugin = globalVars.pluginList.get(pluginName)
+	if plugin or pluginName not in readyEvents:
+		return plugin
+	if mode == "lazy":
+		initPlugin(pluginName)
+	elif not readyEvents[pluginName].is_set():
+		logging.debug("waiting for plugin %s", pluginName)
+		readyEvents[pluginName].wait()
+	return globalVars.pluginList.get(pluginName)
+
+
 def getPlugins():
 	"""
 	get a Python Dict of all activeated plugins
@@ -108,3 +258,20 @@ def loadPlugin(plugin):
 		logging.error("cannot load plugin: %s", plugin["name"])
 		logging.debug("cannot load plugin: %s", plugin["name"], exc_info=True)
 		raise
+
+
+def unloadPlugins():
+	"""
+	Call the optional .onUnload() routine of all loaded plugins
+	so they can flush buffered data and close their connections
+
+	@return:    nothing
+	"""
+	for (name, plugin) in globalVars.pluginList.items():
+		if hasattr(plugin, "onUnload"):
+			try:
+				logging.debug("call %s.onUnload()", name)
+				plugin.onUnload()
+			except:
+				logging.error("error calling %s.onUnload()", name)
+				logging.debug("error calling %s.onUnload()", name, exc_info=True)
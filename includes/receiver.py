@@ -0,0 +1,672 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Receiver pipelines (rtl_fm | multimon-ng) of BOSWatch
+One BOSWatch process can watch several devices and frequencies.
+Every receiver has its own reader thread; all of them feed one queue,
+which is decoded in the main thread - so the plugins, description lists
+and the doubleFilter are loaded and shared only once.
+In server mode the datasets of the clients are put into the same queue.
+
+The stderr of rtl_fm and multimon-ng is read by a thread per subprocess,
+written to their logfiles and checked line by line: the startup waits for
+the ready message or an error instead of a fixed time. A supervisor thread
+per receiver restarts the pipeline with increasing delay, if a subprocess exits,
+multimon-ng closes its output or rtl_fm stops delivering audio.
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be set in the config.ini
+"""
+
+import logging # Global logger
+import threading
+import time
+import Queue
+import subprocess
+import os
+import select
+import errno
+import fcntl
+
+from includes import globalVars  # Global variables
+from includes import checkSubprocesses  # check the output of the subprocesses
+from includes import multimonReader
+from includes.helper import freqConverter
+
+# local variables
+receivers = []
+inputQueue = Queue.Queue() # (kind, source, payload) - kind: lines, closed or record
+
+maxRestartDelay = 300 # max. seconds between two restarts, the delay is doubled every restart
+stableTime = 60 # seconds a pipeline has to run until the delay is reset
+
+#
+# demodulation name -> multimon-ng argument
+#
+demodulations = (
+	("FMS", "FMSFSK"),
+	("ZVEI", "ZVEI1"),
+	("POC512", "POCSAG512"),
+	("POC1200", "POCSAG1200"),
+	("POC2400", "POCSAG2400"),
+)
+
+
+def getWrittenBytes(pid):
+	"""
+	Local helper for the number of bytes a process has written (Linux only)
+
+	@return:    bytes as integer or None if unknown
+	"""
+	try:
+		with open("/proc/%d/io" % pid, "r") as io:
+			for line in io:
+				if line.startswith("wchar:"):
+					return int(line.split()[1])
+	except (IOError, ValueError):
+		pass
+	return None
+
+
+class Subprocess(object):
+	"""rtl_fm or multimon-ng of a receiver, its stderr is read by a thread"""
+
+	def __init__(self, name, receiver, logFile, errors, readyMessage):
+		"""
+		@type    name: string
+		@param   name: rtl_fm or multimon-ng
+		@type    receiver: Receiver
+		@param   receiver: receiver of the subprocess (woken up on exit)
+		@type    logFile: string
+		@param   logFile: name of the logfile in the log_path
+		@type    errors: tuple of strings
+		@param   errors: error messages (see checkSubprocesses)
+		@type    readyMessage: string
+		@param   readyMessage: message of a successful startup
+		"""
+		self.name = name
+		self.receiver = receiver
+		self.logFile = logFile
+		self.errors = errors
+		self.readyMessage = readyMessage
+		self.process = None
+		self.ready = threading.Event() # set on ready message, error or exit
+		self.closed = False # stderr closed - the subprocess has exited
+		self.outputClosed = False # end of stdout reached by the reader
+		self.error = None # first error message
+		self.startTime = 0
+
+
+	def start(self, command, stdin=None):
+		"""
+		Start the subprocess and the thread reading its stderr
+
+		@type    command: string
+		@param   command: command line
+		@type    stdin: file object
+		@param   stdin: input of the subprocess (None: inherited)
+
+		@return:    nothing
+		@exception: Exception if the subprocess couldn't be started
+		"""
+		self.startTime = time.time()
+		self.process = subprocess.Popen(command.split(),
+			stdin=stdin,
+			stdout=subprocess.PIPE,
+			stderr=subprocess.PIPE,
+			close_fds=True,
+			shell=False)
+		stderrThread = threading.Thread(target=self._stderrReader, name=self.name+"-"+str(self.receiver))
+		stderrThread.daemon = True
+		stderrThread.start()
+
+
+	def _stderrReader(self):
+		"""
+		Thread - writes the stderr of the subprocess to its logfile and checks every line
+
+		@return:    nothing
+		"""
+		logFile = None
+		try:
+			logFile = open(globalVars.log_path+self.logFile, "a")
+		except:
+			logging.warning("cannot open %s", self.logFile)
+			logging.debug("cannot open %s", self.logFile, exc_info=True)
+		try:
+			for line in iter(self.process.stderr.readline, ""):
+				if logFile:
+					logFile.write(line)
+					logFile.flush()
+				if self.error is None and checkSubprocesses.checkLine(line, self.errors):
+					self.error = line.strip()
+					self.ready.set()
+				elif self.readyMessage in line and not self.ready.is_set():
+					logging.debug("%s of receiver %s ready after %.1fs", self.name, self.receiver, time.time() - self.startTime)
+					self.ready.set()
+		except:
+			logging.debug("cannot read stderr of %s", self.name, exc_info=True)
+		finally:
+			if logFile:
+				logFile.close()
+			self.process.stderr.close()
+		self.closed = True
+		self.ready.set()
+		self.receiver.wake()
+
+
+	def waitReady(self, timeout):
+		"""
+		Wait until the subprocess is ready
+		Without ready message the subprocess is expected to run after timeout seconds.
+
+		@type    timeout: float
+		@param   timeout: max. seconds to wait
+
+		@return:    nothing
+		@exception: OSError if the subprocess returns an error or exits
+		"""
+		if not self.ready.wait(timeout):
+			logging.debug("no ready message of %s of receiver %s - expect it's running", self.name, self.receiver)
+		if self.error:
+			logging.debug("%s: %s", self.logFile, self.error)
+			raise OSError("starting "+self.name+" returns an error")
+		if self.closed:
+			raise OSError(self.name+" exited at startup ("+str(self.process.wait())+")")
+
+
+	def getExitReason(self):
+		"""
+		Check if the subprocess has exited
+
+		@return:    reason as string or None if it's running
+		"""
+		returnCode = self.process.poll()
+		if returnCode is None:
+			return None
+		reason = self.name+" exited ("+str(returnCode)+")"
+		if self.error:
+			reason += ": "+self.error
+		return reason
+
+
+	def stop(self):
+		"""
+		Terminate the subprocess - killed if it doesn't terminate within 3 seconds
+
+		@return:    nothing
+		"""
+		if self.process.poll() is not None:
+			return
+		logging.debug("terminate %s of receiver %s (%s)", self.name, self.receiver, self.process.pid)
+		self.process.terminate()
+		deadline = time.time() + 3
+		while self.process.poll() is None and time.time() < deadline:
+			time.sleep(0.1)
+		if self.process.poll() is None:
+			logging.warning("%s of receiver %s doesn't terminate - kill it", self.name, self.receiver)
+			self.process.kill()
+		self.process.wait()
+		logging.debug("%s terminated", self.name)
+
+
+class Receiver(object):
+	"""One rtl_fm | multimon-ng pipeline"""
+
+	def __init__(self, name, device, freq, error=0, squelch=0, gain=100, demod=()):
+		"""
+		@type    name: string
+		@param   name: name of the receiver (used for the logfiles)
+		@type    device: integer
+		@param   device: device-ID of the SDR stick
+		@type    freq: string
+		@param   freq: frequency to listen to (f.e. 85.235M)
+		@type    demod: list of strings
+		@param   demod: demodulations (FMS, ZVEI, POC512, POC1200, POC2400)
+
+		@exception: ValueError if a demodulation is unknown
+		"""
+		for entry in demod:
+			if entry not in dict(demodulations):
+				raise ValueError("unknown demodulation: "+entry)
+		self.name = name
+		self.device = int(device)
+		self.freq = freqConverter.freqToHz(str(freq))
+		self.error = error
+		self.squelch = int(squelch)
+		self.gain = int(gain)
+		self.demod = list(demod)
+		self.rtl_fm = None
+		self.multimon_ng = None
+		self.readerThread = None
+		self.supervisorThread = None
+		self.wakeupPipe = None # (read, write) - wakes the supervisor
+		self.lock = threading.Lock() # no new subprocess after stop
+		self.stopped = False
+		self.running = False # pipeline started and no failure detected
+		self.restartReason = None # restart requested by restart()
+		self.restarts = 0
+		self.startTime = 0 # start of the running pipeline
+		self.lastOutput = 0 # time of the last output of multimon-ng
+		# the receiver given by the arguments keeps the old names of the logfiles
+		suffix = "_"+name if name else ""
+		self.rtlLog = "rtl_fm"+suffix+".log"
+		self.multimonLog = "multimon"+suffix+".log"
+
+
+	def __str__(self):
+		return self.name or str(self.freq)
+
+
+	def getDemodulation(self):
+		"""
+		Arguments for the demodulations of multimon-ng
+
+		@return:    string with the -a arguments
+		"""
+		demodulation = ""
+		for (name, argument) in demodulations:
+			if name in self.demod:
+				demodulation += "-a "+argument+" "
+		return demodulation
+
+
+	def startRTL(self):
+		"""
+		Start rtl_fm of this receiver
+
+		@return:    nothing
+		@exception: Exception if rtl_fm couldn't be started
+		"""
+		logging.debug("starting rtl_fm for receiver %s", self)
+		command = globalVars.settings.BOSWatch.rtl_path
+		command = command+"rtl_fm -d "+str(self.device)+" -f "+str(self.freq)+" -M fm -p "+str(self.error)+" -E DC -F 0 -l "+str(self.squelch)+" -g "+str(self.gain)+" -s 22050"
+		with self.lock:
+			if self.stopped:
+				raise OSError("receiver "+str(self)+" stopped")
+			self.rtl_fm = Subprocess("rtl_fm", self, self.rtlLog, checkSubprocesses.rtlErrors, checkSubprocesses.rtlReady)
+			self.rtl_fm.start(command)
+
+
+	def startMultimon(self):
+		"""
+		Start multimon-ng of this receiver, reading the output of rtl_fm
+
+		@return:    nothing
+		@exception: Exception if multimon-ng couldn't be started
+		"""
+		logging.debug("starting multimon-ng for receiver %s", self)
+		command = globalVars.settings.BOSWatch.multimon_path
+		command = command+"multimon-ng "+self.getDemodulation()+" -f alpha -t raw /dev/stdin - "
+		with self.lock:
+			if self.stopped:
+				raise OSError("receiver "+str(self)+" stopped")
+			self.multimon_ng = Subprocess("multimon-ng", self, self.multimonLog, checkSubprocesses.multimonErrors, checkSubprocesses.multimonReady)
+			try:
+				self.multimon_ng.start(command, self.rtl_fm.process.stdout)
+			finally:
+				# only multimon-ng reads the output - rtl_fm gets SIGPIPE if multimon-ng exits
+				self.rtl_fm.process.stdout.close()
+
+
+	def startReader(self):
+		"""
+		Start the reader thread of this receiver
+
+		@return:    nothing
+		"""
+		self.readerThread = threading.Thread(target=self._reader, args=(self.multimon_ng,), name="reader-"+str(self))
+		self.readerThread.daemon = True
+		self.readerThread.start()
+		self.startTime = time.time()
+		self.running = True
+
+
+	def _reader(self, multimon):
+		"""
+		Reader thread - puts the batches of multimon-ng into the inputQueue
+
+		@type    multimon: Subprocess
+		@param   multimon: multimon-ng of this receiver
+
+		@return:    nothing
+		"""
+		stream = multimon.process.stdout
+		try:
+			for lines in multimonReader.readBatches(stream):
+				self.lastOutput = time.time()
+				inputQueue.put(("lines", self, lines))
+		except:
+			logging.error("cannot read output of receiver %s", self)
+			logging.debug("cannot read output of receiver %s", self, exc_info=True)
+		finally:
+			stream.close()
+		multimon.outputClosed = True
+		self.wake()
+
+
+	def startPipeline(self):
+		"""
+		Start rtl_fm, multimon-ng and the reader thread of this receiver
+		Every subprocess is started as soon as the previous one is ready.
+
+		@return:    nothing
+		@exception: OSError if a subprocess returns an error at startup
+		"""
+		timeout = globalVars.settings.BOSWatch.startupTimeout
+		self.restartReason = None
+		self.startRTL()
+		self.rtl_fm.waitReady(timeout)
+		self.startMultimon()
+		self.multimon_ng.waitReady(timeout)
+		self.startReader()
+
+
+	def stopPipeline(self):
+		"""
+		Terminate multimon-ng and rtl_fm of this receiver
+
+		@return:    nothing
+		"""
+		with self.lock:
+			subprocesses = (self.multimon_ng, self.rtl_fm)
+		for process in subprocesses:
+			if process and process.process:
+				process.stop()
+
+
+	def startSupervisor(self):
+		"""
+		Start the supervisor thread of this receiver
+
+		@return:    nothing
+		"""
+		self.wakeupPipe = os.pipe()
+		# a wakeup must never block - one pending byte is enough
+		fcntl.fcntl(self.wakeupPipe[1], fcntl.F_SETFL, fcntl.fcntl(self.wakeupPipe[1], fcntl.F_GETFL) | os.O_NONBLOCK)
+		self.supervisorThread = threading.Thread(target=self._supervisor, name="supervisor-"+str(self))
+		self.supervisorThread.daemon = True
+		self.supervisorThread.start()
+
+
+	def wake(self):
+		"""
+		Wake up the supervisor to check the pipeline
+
+		@return:    nothing
+		"""
+		if not self.wakeupPipe:
+			return
+		try:
+			os.write(self.wakeupPipe[1], "w")
+		except OSError as e:
+			if e.errno != errno.EAGAIN:
+				raise
+
+
+	def sleep(self, timeout):
+		"""
+		Local helper to wait for a wakeup or the timeout
+
+		@type    timeout: float
+		@param   timeout: max. seconds to wait (None: only a wakeup)
+
+		@return:    True if the receiver was stopped
+		"""
+		try:
+			(ready, _, _) = select.select([self.wakeupPipe[0]], [], [], timeout)
+			if ready:
+				os.read(self.wakeupPipe[0], 512)
+		except select.error as e:
+			if e.args[0] != errno.EINTR:
+				raise
+		return self.stopped
+
+
+	def restart(self, reason):
+		"""
+		Request a restart of the pipeline by the supervisor (f.e. by the liveness watchdog)
+
+		@type    reason: string
+		@param   reason: reason for the log
+
+		@return:    nothing
+		"""
+		self.running = False
+		self.restartReason = reason
+		self.wake()
+
+
+	def waitStop(self, timeout):
+		"""
+		Local helper to wait timeout seconds, unless the receiver is stopped
+
+		@type    timeout: float
+		@param   timeout: seconds to wait
+
+		@return:    True if the receiver was stopped
+		"""
+		deadline = time.time() + timeout
+		while time.time() < deadline and not self.sleep(deadline - time.time()):
+			pass
+		return self.stopped
+
+
+	def getFailure(self):
+		"""
+		Local helper to check the subprocesses and the reader thread
+
+		@return:    reason as string or None if the pipeline is running
+		"""
+		for process in (self.rtl_fm, self.multimon_ng):
+			reason = process.getExitReason()
+			if reason:
+				return reason
+		if self.multimon_ng.outputClosed:
+			return "multimon-ng closed its output"
+		return self.restartReason
+
+
+	def watch(self):
+		"""
+		Wait until the pipeline fails
+		If the receiver has no squelch, rtl_fm delivers audio all the time,
+		so the written bytes of rtl_fm are checked against stallTimeout.
+
+		@return:    reason as string or None if the receiver was stopped
+		"""
+		stallTimeout = globalVars.settings.BOSWatch.stallTimeout if not self.squelch else 0
+		written = getWrittenBytes(self.rtl_fm.process.pid) if stallTimeout else None
+		if stallTimeout and written is None:
+			logging.debug("cannot read the output counter of rtl_fm - no stall detection for receiver %s", self)
+			stallTimeout = 0
+		lastWrite = time.time()
+		while not self.stopped:
+			reason = self.getFailure()
+			if reason:
+				# a signal to the process group terminates the subprocesses before stop() is called
+				return None if self.waitStop(1) else reason
+			if stallTimeout:
+				now = time.time()
+				current = getWrittenBytes(self.rtl_fm.process.pid)
+				if current != written:
+					(written, lastWrite) = (current, now)
+				elif now - lastWrite > stallTimeout:
+					return "rtl_fm delivers no audio for "+str(int(now - lastWrite))+"s"
+				self.sleep(stallTimeout / 2.0)
+			else:
+				# woken up by the exit of a subprocess or the end of the output
+				self.sleep(None)
+		return None
+
+
+	def _supervisor(self):
+		"""
+		Supervisor thread - restarts the pipeline if it fails
+		The delay until the restart is doubled after every failure (max. maxRestartDelay),
+		it is reset if the pipeline was running for stableTime seconds.
+
+		@return:    nothing
+		"""
+		delay = globalVars.settings.BOSWatch.restartDelay
+		try:
+			while True:
+				reason = self.watch()
+				if not reason:
+					break
+				self.running = False
+				if time.time() - self.multimon_ng.startTime > stableTime:
+					delay = globalVars.settings.BOSWatch.restartDelay
+				logging.error("receiver %s: %s - restart in %ss", self, reason, delay)
+				self.stopPipeline()
+				while True:
+					if self.waitStop(delay):
+						return
+					delay = min(delay * 2, maxRestartDelay)
+					try:
+						self.startPipeline()
+						self.restarts += 1
+						logging.info("receiver %s restarted", self)
+						break
+					except:
+						if self.stopped:
+							return
+						logging.error("cannot restart receiver %s - next try in %ss", self, delay)
+						logging.debug("cannot restart receiver %s", self, exc_info=True)
+						self.stopPipeline()
+		except:
+			logging.error("supervisor of receiver %s failed", self)
+			logging.debug("supervisor of receiver %s failed", self, exc_info=True)
+		finally:
+			inputQueue.put(("closed", self, None))
+
+
+	def stop(self):
+		"""
+		Stop the supervisor and terminate multimon-ng and rtl_fm of this receiver
+
+		@return:    nothing
+		"""
+		with self.lock:
+			self.stopped = True
+			self.running = False
+		self.wake()
+		self.stopPipeline()
+
+
+def loadReceivers(args):
+	"""
+	Create the receivers from the section [Receivers] in the config.ini
+	If the section is empty, one receiver with the given arguments is created.
+
+	@type    args: Array
+	@param   args: All given arguments from argsparser
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	@exception: Exception if a receiver couldn't be created
+	"""
+	del receivers[:]
+	if globalVars.config.has_section("Receivers"):
+		for (name, value) in globalVars.config.items("Receivers"):
+			if not value.strip():
+				continue
+			try:
+				# device;freq;ppm;squelch;gain;demods
+				(device, freq, error, squelch, gain, demod) = [entry.strip() for entry in value.split(";")]
+				receivers.append(Receiver(name, device, freq, error, squelch, gain, demod.replace(",", " ").split()))
+			except:
+				logging.error("invalid receiver %s: %s", name, value)
+				raise
+
+	if not receivers and args.freq and args.demod:
+		receivers.append(Receiver("", args.device, args.freq, args.error, args.squelch, args.gain, args.demod))
+	elif not receivers and globalVars.settings.ClientServer.mode != "server":
+		# only the server could work without own receivers
+		raise ValueError("no receiver in section [Receivers] and no -f/-a arguments given")
+
+	for receiver in receivers:
+		logging.debug("Receiver %s", receiver)
+		logging.debug(" - Frequency: %s", receiver.freq)
+		logging.debug(" - Device: %s", receiver.device)
+		logging.debug(" - PPM Error: %s", receiver.error)
+		logging.debug(" - Squelch: %s", receiver.squelch)
+		logging.debug(" - Gain: %s", receiver.gain)
+		logging.debug(" - Demod: %s", " ".join(receiver.demod))
+
+
+def startReceivers():
+	"""
+	Start rtl_fm and multimon-ng of all receivers, their reader and supervisor threads
+	The subprocesses of all receivers start at the same time, every step
+	waits until the subprocesses are ready (max. startupTimeout seconds).
+
+	@return:    nothing
+	@exception: OSError if a subprocess returns an error at startup
+	"""
+	timeout = globalVars.settings.BOSWatch.startupTimeout
+	for receiver in receivers:
+		receiver.startRTL()
+	# rtl_fm doesn't self-destruct, when an error occurs - wait for its ready message or an error
+	deadline = time.time() + timeout
+	for receiver in receivers:
+		receiver.rtl_fm.waitReady(max(deadline - time.time(), 0))
+
+	for receiver in receivers:
+		receiver.startMultimon()
+	deadline = time.time() + timeout
+	for receiver in receivers:
+		receiver.multimon_ng.waitReady(max(deadline - time.time(), 0))
+
+	for receiver in receivers:
+		receiver.startReader()
+		receiver.startSupervisor()
+
+
+def stopReceivers():
+	"""
+	Terminate the subprocesses of all receivers
+
+	@return:    nothing
+	"""
+	for receiver in receivers:
+		try:
+			receiver.stop()
+		except:
+			logging.warning("cannot stop receiver %s", receiver)
+			logging.debug("cannot stop receiver %s", receiver, exc_info=True)
+
+
+def decodeLoop(rawWriter=None):
+	"""
+	Decode the batches of all receivers and the datasets of the clients in the order they were received
+	Returns when the supervisors of all receivers have stopped - in server mode only by a signal.
+
+	@type    rawWriter: multimonReader.RawDataWriter
+	@param   rawWriter: writer for mm_raw.txt or None
+
+	@return:    nothing
+	"""
+	from includes import decoder
+	serverMode = globalVars.settings.ClientServer.mode == "server"
+	running = len(receivers)
+	while running or serverMode:
+		try:
+			# with a timeout the main thread can still be interrupted by signals
+			(kind, source, payload) = inputQueue.get(True, 60)
+		except Queue.Empty:
+			continue
+		if kind == "record":
+			(typ, freq, data) = payload
+			decoder.processRecord(typ, freq, data)
+		elif kind == "closed":
+			logging.error("receiver %s stopped", source)
+			running -= 1
+		else:
+			if rawWriter:
+				rawWriter.write(payload)
+			for decoded in payload:
+				decoder.decode(source.freq, decoded)
@@ -17,21 +17,37 @@ from includes.helper import freqConverter  # converter functions
 
 
 # local variables
+# ListStructure filterList [0..n] = {name, typ, dataField, plugin, freq, regex, pattern, order}
 filterList = []
+# filterIndex[(typ, plugin, freq)] = [filter, ...] - plugin and freq can be "*"
+filterIndex = {}
+# ruleCache[(typ, plugin, freq)] = all filters for this combination (wildcards resolved)
+ruleCache = {}
 
 
-def loadFilters():
+def loadFilters(config=None):
 	"""
 	load all filters from the config.ini into filterList
+	The RegEx are compiled once and the filters are indexed by typ, plugin and freq.
+	The new filters replace the old ones at once (also while alarms are checked),
+	if the filters couldn't be read, the old ones are kept.
+
+	@type    config: ConfigParser
+	@param   config: config to read the filters from (None: globalVars.config)
 
 	@requires:  Configuration has to be set in the config.ini
 
 	@return:    nothing
 	"""
+	global filterList
+	global filterIndex
+	global ruleCache
 	try:
 		logging.debug("loading filters")
+		newList = []
+		newIndex = {}
 		# For each entry in config.ini [Filters] section
-		for key,val in globalVars.config.items("Filters"):
+		for key,val in (config or globalVars.config).items("Filters"):
 			logging.debug(" - %s = %s", key, val)
 			filterData = val.split(";")
 
@@ -39,18 +55,52 @@ def loadFilters():
 			if not filterData[3] == "*":
 				filterData[3] = freqConverter.freqToHz(filterData[3])
 
+			try:
+				pattern = re.compile(filterData[4])
+			except re.error:
+				logging.error("invalid RegEx in filter %s: %s", key, filterData[4])
+				continue
+
 			# insert splitet data into filterList
-			filterList.append({"name": key, "typ": filterData[0], "dataField": filterData[1], "plugin": filterData[2], "freq": filterData[3], "regex": filterData[4]})
+			i = {"name": key, "typ": filterData[0], "dataField": filterData[1], "plugin": filterData[2], "freq": filterData[3], "regex": filterData[4], "pattern": pattern, "order": len(newList)}
+			newList.append(i)
+			newIndex.setdefault((i["typ"], i["plugin"], i["freq"]), []).append(i)
 	except:
 		logging.error("cannot read config file")
 		logging.debug("cannot read config file", exc_info=True)
 		return
 
+	# the cache is replaced last, getRules() reads it first
+	filterList = newList
+	filterIndex = newIndex
+	ruleCache = {}
+
+
+def getRules(typ, plugin, freq):
+	"""
+	Get all filters for the Typ/Plugin/Freq combination
+	in the order of the config.ini, the result is cached
 
-def checkFilters(typ, data, plugin, freq):
+	@return:    list of filters
+	"""
+	key = (typ, plugin, freq)
+	cache = ruleCache
+	try:
+		return cache[key]
+	except KeyError:
+		index = filterIndex
+		rules = []
+		for indexKey in set([(typ, plugin, freq), (typ, "*", freq), (typ, plugin, "*"), (typ, "*", "*")]):
+			rules.extend(index.get(indexKey, []))
+		rules.sort(key=lambda i: i["order"])
+		cache[key] = rules
+		return rules
+
+
+def checkFilters(typ, data, plugin, freq, results=None):
 	"""
 	Check the Typ/Plugin combination with the RegEX filter
-	If no filter for the combination is found, function returns True.
+	If no filter for the combination is found, function returns False.
 
 	@type    typ:  string (FMS|ZVEI|POC)
 	@param   typ:  Typ of the dataset
@@ -60,38 +110,60 @@ def checkFilters(typ, data, plugin, freq):
 	@param   plugin: Name of the plugin to checked
 	@type    freq: string
 	@param   freq: frequency of the SDR Stick
+	@type    results: map
+	@param   results: optional cache of the RegEx results for this dataset
 
 	@requires:  all filters in the filterList
 
-	@return:    nothing
+	@return:    True if a filter passed
 	"""
-	global filterList
 	try:
 		logging.debug("search Filter for %s to %s at %s Hz", typ, plugin, freq)
 
-		foundFilter = False
-		# go to all filter in filterList
-		for i in filterList:
-			# if typ/plugin/freq combination is found
-			if i["typ"] == typ and (i["plugin"] == plugin or i['plugin'] == "*") and (i["freq"] == freq or i['freq'] == "*"):
-				foundFilter = True
-				logging.debug("found Filter: %s = %s", i["name"], i["regex"])
-				# Check the RegEX
-				if re.search(i["regex"], data[i["dataField"]]):
-					logging.debug("Filter passed: %s", i["name"])
-					return True
-				else:
-					logging.debug("Filter not passed: %s", i["name"])
-
-		if foundFilter:
-			logging.debug("no Filter passed")
-			return False
-		else:
+		rules = getRules(typ, plugin, freq)
+		if not rules:
 			logging.debug("no Filter found")
 			return False
 
+		if results is None:
+			results = {}
+		# go to all filters for this typ/plugin/freq combination
+		for i in rules:
+			logging.debug("found Filter: %s = %s", i["name"], i["regex"])
+			# Check the RegEX - every filter is checked only once per dataset
+			if i["name"] not in results:
+				results[i["name"]] = i["pattern"].search(data[i["dataField"]]) is not None
+			if results[i["name"]]:
+				logging.debug("Filter passed: %s", i["name"])
+				return True
+			else:
+				logging.debug("Filter not passed: %s", i["name"])
+
+		logging.debug("no Filter passed")
+		return False
+
 	except:
 		logging.error("Error in filter checking")
 		logging.debug("Error in filter checking", exc_info=True)
 		# something goes wrong, data will path
 		return True
+
+
+def getPassingPlugins(typ, data, plugins, freq):
+	"""
+	Check all plugins for a dataset in one pass
+	Every RegEx is evaluated only once, even if it is used for more plugins
+
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    data: map of data (structure see readme.md in plugin folder)
+	@param   data: Contains the parameter
+	@type    plugins: list
+	@param   plugins: Names of the plugins to check
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+
+	@return:    set of the pluginNames which passed the filter
+	"""
+	results = {}
+	return set(plugin for plugin in plugins if checkFilters(typ, data, plugin, freq, results))
@@ -0,0 +1,257 @@
+#!/usr/bin/python
+# -*- coding: UTF-8 -*-
+
+"""
+Durable retry queue (store-and-forward) for failed plugin calls
+A plugin signals a temporary failure (network, server) by returning False from run().
+The call is handed over to a background thread, stored in a SQLite file
+in the log directory and replayed with exponential backoff - also after a restart.
+The queue is limited by retryQueueSize entries and retryQueueMaxAge seconds.
+
+@author: BOSWatch Team
+
+@requires: Configuration has to be set in the config.ini
+"""
+
+import logging # Global logger
+import threading
+import time
+import json
+import sqlite3
+import Queue
+
+from includes import globalVars  # Global variables
+from includes import pluginLoader
+from includes import alarmDispatcher
+from includes.helper import stringConverter
+
+# local variables
+handoverQueue = Queue.Queue(1000) # failed calls, not yet stored
+workerThread = None
+stopEvent = threading.Event()
+
+depth = 0 # stored calls
+oldest = 0 # time of the oldest stored call
+
+baseDelay = 10 # seconds until the first retry, doubled every attempt
+maxDelay = 600 # max. seconds between two retries
+replayBatch = 20 # max. calls replayed per pass
+
+
+def start():
+	"""
+	Start the worker thread of the retry queue
+
+	@requires:  Configuration has to be set in the config.ini
+
+	@return:    nothing
+	"""
+	global workerThread
+	if not globalVars.settings.BOSWatch.retryQueue:
+		logging.debug("retry queue disabled")
+		return
+	stopEvent.clear()
+	workerThread = threading.Thread(target=_worker, name="retryQueue")
+	workerThread.daemon = True
+	workerThread.start()
+
+
+def stop(timeout=3):
+	"""
+	Store the handed over calls and stop the worker thread
+
+	@type    timeout: integer
+	@param   timeout: max. seconds to wait for the worker
+
+	@return:    nothing
+	"""
+	if not workerThread:
+		return
+	stopEvent.set()
+	workerThread.join(timeout)
+	if workerThread.is_alive():
+		logging.warning("retry queue still busy - stop waiting")
+
+
+def put(pluginName, typ, freq, data):
+	"""
+	Hand over a failed plugin call - never blocks
+
+	@type    pluginName: string
+	@param   pluginName: Name of the failed plugin
+	@type    typ:  string (FMS|ZVEI|POC)
+	@param   typ:  Typ of the dataset
+	@type    freq: string
+	@param   freq: frequency of the SDR Stick
+	@type    data: map of data (structure see readme.md in plugin folder)
+	@param   data: Contains the parameter
+
+	@return:    nothing
+	"""
+	if not workerThread:
+		return
+	try:
+		handoverQueue.put_nowait((pluginName, typ, freq, data, time.time()))
+		logging.info("%s failed - %s queued for retry", pluginName, typ)
+	except Queue.Full:
+		logging.error("retry queue is busy - %s for %s dropped", typ, pluginName)
+
+
+def getQueueDepth():
+	"""
+	Number of stored plugin calls, which are waiting for a retry
+
+	@return:    queue depth as integer
+	"""
+	return depth + handoverQueue.qsize()
+
+
+def getOldestAge():
+	"""
+	Age of the oldest stored plugin call
+
+	@return:    seconds as integer (0 if the queue is empty)
+	"""
+	if not depth:
+		return 0
+	return int(time.time() - oldest)
+
+
+def _open():
+	"""
+	Local helper to open (and create) the database in the log directory
+
+	@return:    sqlite3 connection
+	"""
+	connection = sqlite3.connect(globalVars.log_path+"retryQueue.db")
+	connection.text_factory = str
+	connection.execute("PRAGMA synchronous = NORMAL")
+	connection.execute("CREATE TABLE IF NOT EXISTS retry (id INTEGER PRIMARY KEY AUTOINCREMENT, plugin TEXT, typ TEXT, freq TEXT, data TEXT, created REAL, attempts INTEGER, nextTry REAL)")
+	connection.execute("CREATE INDEX IF NOT EXISTS retry_nextTry ON retry (nextTry)")
+	connection.commit()
+	return connection
+
+
+def _updateMetrics(connection):
+	"""
+	Local helper to update depth and age of the queue
+
+	@return:    nothing
+	"""
+	global depth
+	global oldest
+	(count, created) = connection.execute("SELECT COUNT(*), MIN(created) FROM retry").fetchone()
+	if count != depth:
+		logging.debug("retry queue: %s calls, oldest %ss", count, int(time.time() - created) if count else 0)
+	(depth, oldest) = (count, created or 0)
+
+
+def _store(connection):
+	"""
+	Local helper to store the handed over calls
+	If the queue exceeds retryQueueSize, the oldest calls are dropped.
+
+	@return:    nothing
+	"""
+	rows = []
+	while True:
+		try:
+			(pluginName, typ, freq, data, created) = handoverQueue.get_nowait()
+		except Queue.Empty:
+			break
+		try:
+			payload = json.dumps(data)
+		except UnicodeDecodeError:
+			# no valid UTF-8 from multimon-ng
+			payload = json.dumps(data, encoding="latin-1")
+		rows.append((pluginName, typ, freq, payload, created, 0, created + baseDelay))
+	if not rows:
+		return
+	connection.executemany("INSERT INTO retry (plugin, typ, freq, data, created, attempts, nextTry) VALUES (?,?,?,?,?,?,?)", rows)
+	(count,) = connection.execute("SELECT COUNT(*) FROM retry").fetchone()
+	overflow = count - globalVars.settings.BOSWatch.retryQueueSize
+	if overflow > 0:
+		logging.error("retry queue is full - %s oldest calls dropped", overflow)
+		connection.execute("DELETE FROM retry WHERE id IN (SELECT id FROM retry ORDER BY id LIMIT ?)", (overflow,))
+	connection.commit()
+
+
+def _replay(connection):
+	"""
+	Local helper to call the plugins of the due entries again
+	The calls are passed to the alarmDispatcher, so the concurrency limit and
+	timeout of the plugin apply. Expired calls and calls of no longer loaded plugins are dropped.
+
+	@return:    nothing
+	"""
+	now = time.time()
+	expired = connection.execute("DELETE FROM retry WHERE created < ?", (now - globalVars.settings.BOSWatch.retryQueueMaxAge,)).rowcount
+	if expired:
+		logging.warning("%s calls in retry queue expired", expired)
+	connection.commit()
+
+	due = connection.execute("SELECT id, plugin, typ, freq, data, created, attempts FROM retry WHERE nextTry <= ? ORDER BY id LIMIT ?", (now, replayBatch)).fetchall()
+	for (rowId, pluginName, typ, freq, payload, created, attempts) in due:
+		if stopEvent.is_set() or alarmDispatcher.stopEvent.is_set():
+			# shutdown - keep the calls for the next run
+			break
+		if pluginName not in pluginLoader.getPluginNames():
+			logging.warning("%s not loaded - retry of %s dropped", pluginName, typ)
+			connection.execute("DELETE FROM retry WHERE id = ?", (rowId,))
+			connection.commit()
+			continue
+
+		logging.debug("retry %s for %s (attempt %s)", typ, pluginName, attempts + 1)
+		data = stringConverter.convertJsonToUTF8(json.loads(payload))
+		jobs = alarmDispatcher.putAlarm(typ, freq, data, [pluginName], True)
+		if not jobs:
+			# dispatcher stopped or queue of the plugin full - try again later
+			result = False
+		else:
+			alarmDispatcher.waitForJobs(jobs)
+			# a timed out call counts as failed
+			result = jobs[0].result if jobs[0].done.is_set() and not jobs[0].timedOut else False
+
+		if result is False:
+			attempts += 1
+			delay = min(baseDelay * 2 ** attempts, maxDelay)
+			connection.execute("UPDATE retry SET attempts = ?, nextTry = ? WHERE id = ?", (attempts, time.time() + delay, rowId))
+			logging.info("retry of %s for %s failed - next try in %ss", typ, pluginName, delay)
+		else:
+			connection.execute("DELETE FROM retry WHERE id = ?", (rowId,))
+			logging.info("%s for %s delivered after %ss", typ, pluginName, int(time.time() - created))
+		connection.commit()
+
+
+def _worker():
+	"""
+	Worker thread - the only user of the database
+	Stores the handed over calls and replays the due ones.
+
+	@return:    nothing
+	"""
+	try:
+		connection = _open()
+	except:
+		logging.error("cannot open retry queue")
+		logging.debug("cannot open retry queue", exc_info=True)
+		return
+	try:
+		_updateMetrics(connection)
+		if depth:
+			logging.info("retry queue: %s calls from last run", depth)
+		while not stopEvent.wait(1):
+			try:
+				_store(connection)
+				_replay(connection)
+				_updateMetrics(connection)
+			except:
+				logging.error("error in retry queue")
+				logging.debug("error in retry queue", exc_info=True)
+		# keep the calls of the shutdown for the next run
+		_store(connection)
+	except:
+		logging.error("error in retry queue")
+		logging.debug("error in retry queue", exc_info=True)
+	finally:
+		connection.close()
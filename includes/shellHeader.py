@@ -10,14 +10,18 @@ Shows the header in shell if quiet mode is not active
 @requires: none
 """
 
+import logging
+
 from includes import globalVars
 
-def printHeader(args):
+def printHeader(args, receivers):
 	"""
 	Prints the header to the shell
 
 	@type    args: Array
 	@param   args: All given arguments from argsparser
+	@type    receivers: list of Receivers
+	@param   receivers: the receivers to show
 
 	@return:    nothing
 	"""
@@ -35,22 +39,17 @@ def printHeader(args):
 		print "Build Date:	"+globalVars.buildDate
 		print ""
 
-		print "Frequency:   "+args.freq
-		print "Device-ID:   "+str(args.device)
-		print "Error in PPM:    "+str(args.error)
-		print "Active Demods:   "+str(len(args.demod))
-		if "FMS" in args.demod:
-			print "- FMS"
-		if "ZVEI" in args.demod:
-			print "- ZVEI"
-		if "POC512" in args.demod:
-			print "- POC512"
-		if "POC1200" in args.demod:
-			print "- POC1200"
-		if "POC2400" in args.demod:
-			print "- POC2400"
-		print "Squelch: "+str(args.squelch)
-		print "Gain: "+str(args.gain)
+		for receiver in receivers:
+			if receiver.name:
+				print "Receiver:    "+receiver.name
+			print "Frequency:   "+str(receiver.freq)
+			print "Device-ID:   "+str(receiver.device)
+			print "Error in PPM:    "+str(receiver.error)
+			print "Active Demods:   "+str(len(receiver.demod))
+			for demod in receiver.demod:
+				print "- "+demod
+			print "Squelch: "+str(receiver.squelch)
+			print "Gain: "+str(receiver.gain)
 		if args.verbose:
 			print "Verbose Mode!"
 		if args.test:
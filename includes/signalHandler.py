@@ -6,6 +6,7 @@
 TERM-Handler for use script as a daemon
 In order for the Python program to exit gracefully when the TERM signal is received,
 it must have a function that exits the program when signal.SIGTERM is received.
+The HUP signal reloads the description lists and filters (see fileWatcher).
 
 @author: 		Jens Herrmann
 """
@@ -28,5 +29,21 @@ def sigterm_handler(_signo, _stack_frame):
 	logging.warning("TERM signal received")
 	sys.exit(0)
 
+def sighup_handler(_signo, _stack_frame):
+	"""
+	HUP-Handler to reload the description lists and filters
+	The reload runs in the thread of the fileWatcher or in a reload thread (see fileWatcher.requestReload).
+
+	@type    _signo: signalnum
+	@param   _signo: signal number
+	@type    _stack_frame: frame object
+	@param   _stack_frame: current stack frame
+	"""
+	logging.info("HUP signal received")
+	from includes import fileWatcher
+	fileWatcher.requestReload()
+
 # Set the handler for signal to the function handler.
 signal.signal(signal.SIGTERM, sigterm_handler)
+if hasattr(signal, "SIGHUP"):
+	signal.signal(signal.SIGHUP, sighup_handler)
@@ -13,13 +13,13 @@ BOSWatch-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages to BosMon
 
 import logging # Global logger
 
-import httplib #for the HTTP request
 import urllib #for the HTTP request with parameters
 import base64 #for the HTTP request with User/Password
 
 from includes import globalVars  # Global variables
 
 from includes.helper import configHandler
+from includes.helper import httpClient
 
 ##
 #
@@ -42,25 +42,25 @@ def onLoad():
 #
 # do BosMon-Request
 #
-def bosMonRequest(httprequest, params, headers):
+def bosMonRequest(url, params, headers):
 	"""
 	This local function dispatch the BosMon-Request
 
-	@type  httprequest: HTTPConnection
-	@param httprequest: An HTTPConnection-Object that represents an open connection to a BosMon-Instance
+	@type  url:         string
+	@param url:         URL of the BosMon-Instance
 	@type  params:      string of urlencoded data
 	@param params:      Contains the parameter for transfer to BosMon.
 	@type  headers:     map
 	@param headers:     The headers argument should be a mapping of extra HTTP headers to send with the request.
 
-	@return:    nothing
+	@return:    False if BosMon returned a server error, otherwise True
 	@exception: Exception if HTTP-Request failed
 	"""
 	try:
 		#
 		# BosMon/HTTP-Request
 		#
-		httprequest.request("POST", "/telegramin/"+globalVars.config.get("BosMon", "bosmon_channel")+"/input.xml", params, headers)
+		httpresponse = httpClient.request("POST", url+"/telegramin/"+globalVars.config.get("BosMon", "bosmon_channel")+"/input.xml", params, headers)
 	except:
 		logging.error("request to BosMon failed")
 		logging.debug("request to BosMon failed", exc_info=True)
@@ -69,11 +69,11 @@ def bosMonRequest(httprequest, params, headers):
 		#
 		# check HTTP-Response
 		#
-		httpresponse = httprequest.getresponse()
 		if str(httpresponse.status) == "200": #Check HTTP Response an print a Log or Error
 			logging.debug("BosMon response: %s - %s", str(httpresponse.status), str(httpresponse.reason))
 		else:
 			logging.warning("BosMon response: %s - %s", str(httpresponse.status), str(httpresponse.reason))
+		return httpresponse.status < 500
 
 ##
 #
@@ -97,7 +97,7 @@ def run(typ,freq,data):
 
 	@requires:  BosMon-Configuration has to be set in the config.ini
 
-	@return:    nothing
+	@return:    False if the alarm should be sent again later
 	"""
 	try:
 		if configHandler.checkConfig("BosMon"): #read and debug the config
@@ -113,11 +113,8 @@ def run(typ,freq,data):
 				if globalVars.config.get("BosMon", "bosmon_user"):
 					# generate b64encoded autorization-token for HTTP-request
 					headers['Authorization'] = "Basic {0}".format(base64.b64encode("{0}:{1}".format(globalVars.config.get("BosMon", "bosmon_user"), globalVars.config.get("BosMon", "bosmon_password"))))
-				logging.debug("connect to BosMon")
-				# open connection to BosMon-Server
-				httprequest = httplib.HTTPConnection(globalVars.config.get("BosMon", "bosmon_server"), globalVars.config.get("BosMon", "bosmon_port"), timeout=5)
-				# debug-level to shell (0=no debug|1)
-				httprequest.set_debuglevel(0)
+				# the connection to BosMon-Server is kept open by the httpClient
+				url = "http://"+globalVars.config.get("BosMon", "bosmon_server")+":"+globalVars.config.get("BosMon", "bosmon_port")
 			except:
 				logging.error("cannot connect to BosMon")
 				logging.debug("cannot connect to BosMon", exc_info=True)
@@ -152,11 +149,11 @@ def run(typ,freq,data):
 						params = urllib.urlencode({'type':'fms', 'address':data["fms"], 'status':data["status"], 'info':info, 'flags':'0'})
 						logging.debug(" - Params: %s", params)
 						# dispatch the BosMon-request
-						bosMonRequest(httprequest, params, headers)
+						return bosMonRequest(url, params, headers)
 					except:
 						logging.error("FMS to BosMon failed")
 						logging.debug("FMS to BosMon failed", exc_info=True)
-						return
+						return False
 
 				elif typ == "ZVEI":
 					logging.debug("Start ZVEI to BosMon")
@@ -164,11 +161,11 @@ def run(typ,freq,data):
 						params = urllib.urlencode({'type':'zvei', 'address':data["zvei"], 'flags':'0'})
 						logging.debug(" - Params: %s", params)
 						# dispatch the BosMon-request
-						bosMonRequest(httprequest, params, headers)
+						return bosMonRequest(url, params, headers)
 					except:
 						logging.error("ZVEI to BosMon failed")
 						logging.debug("ZVEI to BosMon failed", exc_info=True)
-						return
+						return False
 
 				elif typ == "POC":
 					logging.debug("Start POC to BosMon")
@@ -177,22 +174,15 @@ def run(typ,freq,data):
 						params = urllib.urlencode({'type':'pocsag', 'address':data["ric"], 'flags':'0', 'function':data["functionChar"], 'message':data["msg"]})
 						logging.debug(" - Params: %s", params)
 						# dispatch the BosMon-request
-						bosMonRequest(httprequest, params, headers)
+						return bosMonRequest(url, params, headers)
 					except:
 						logging.error("POC to BosMon failed")
 						logging.debug("POC to BosMon failed", exc_info=True)
-						return
+						return False
 
 				else:
 					logging.warning("Invalid Typ: %s", typ)
 
-			finally:
-				logging.debug("close BosMon-Connection")
-				try:
-					httprequest.close()
-				except:
-					pass
-
 	except:
 		# something very mysterious
 		logging.error("unknown error")
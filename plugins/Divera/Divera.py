@@ -8,12 +8,12 @@ Divera-Plugin to send FMS-, ZVEI- and POCSAG - messages to Divera
 """
 
 import logging  # Global logger
-import httplib  # for the HTTP request
 import urllib
 from includes import globalVars  # Global variables
 
 # from includes.helper import timeHandler
 from includes.helper import configHandler
+from includes.helper import httpClient
 from includes.helper import wildcardHandler
 
 
@@ -49,7 +49,7 @@ def run(typ, freq, data):
     @type    freq: string
     @keyword freq: frequency of the SDR Stick
     @requires:  Divera-Configuration has to be set in the config.ini
-    @return:    nothing
+    @return:    False if the alarm should be sent again later
     """
     try:
         if configHandler.checkConfig("Divera"):  # read and debug the config
@@ -112,9 +112,8 @@ def run(typ, freq, data):
                 logging.info("No Priority set for type '%s'! Skipping Divera-Alarm!", typ)
                 return
 
-            # start the connection
-            conn = httplib.HTTPSConnection("www.divera247.com:443")
-            conn.request("GET", "/api/alarm",
+            # send the request, the connection is kept open by the httpClient
+            response = httpClient.request("GET", "https://www.divera247.com/api/alarm",
                         urllib.urlencode({
                             "accesskey": globalVars.config.get("Divera", "accesskey"),
                             "title": title,
@@ -125,29 +124,23 @@ def run(typ, freq, data):
         except:
             logging.error("cannot send Divera request")
             logging.debug("cannot send Divera request", exc_info=True)
-            return
+            return False
 
         try:
             #
             # check Divera-Response
             #
-            response = conn.getresponse()
             if str(response.status) == "200":  # Check Divera Response and print a Log or Error
                 logging.debug("Divera response: %s - %s", str(response.status), str(response.reason))
             else:
                 logging.warning("Divera response: %s - %s", str(response.status), str(response.reason))
+                # server errors are temporary - send again later
+                return response.status < 500
         except:  # otherwise
             logging.error("cannot get Divera response")
             logging.debug("cannot get Divera response", exc_info=True)
             return
 
-        finally:
-            logging.debug("close Divera-Connection")
-            try:
-                request.close()
-            except:
-                pass
-
     except:
         logging.error("unknown error")
         logging.debug("unknown error", exc_info=True)
@@ -11,7 +11,7 @@ FFAgent-Plugin to send FMS-, ZVEI- and POCSAG - messages to FF-Agent
 
 import logging # Global logger
 import hmac, hashlib
-import json, requests
+import json
 
 from collections import OrderedDict
 
@@ -19,6 +19,7 @@ from includes import globalVars  # Global variables
 
 #from includes.helper import timeHandler
 from includes.helper import configHandler
+from includes.helper import httpClient
 
 ##
 #
@@ -60,7 +61,7 @@ def run(typ,freq,data):
 
 	@requires:  FFAgent-Configuration has to be set in the config.ini
 
-	@return:    nothing
+	@return:    False if the alarm should be sent again later
 	"""
 	try:
 		if configHandler.checkConfig("FFAgent"): #read and debug the config
@@ -138,53 +139,43 @@ def run(typ,freq,data):
 				
 				logging.debug(alarmHeaders)
 
-	            alarmHeadersOrdered=OrderedDict()
-                alarmHeadersOrdered['webApiToken']=webApiToken
-                alarmHeadersOrdered['accessToken']=accessToken
-                alarmHeadersOrdered['selectiveCallCode']=selectiveCallCode
-                alarmHeadersOrdered['hmac']=hmac.new(webApiKey, webApiToken + selectiveCallCode + accessToken + alarmData, digestmod=hashlib.sha256).hexdigest()
-				
+				alarmHeadersOrdered=OrderedDict()
+				alarmHeadersOrdered['Content-Type']='application/json'
+				alarmHeadersOrdered['webApiToken']=webApiToken
+				alarmHeadersOrdered['accessToken']=accessToken
+				alarmHeadersOrdered['selectiveCallCode']=selectiveCallCode
+				alarmHeadersOrdered['hmac']=hmac.new(webApiKey, webApiToken + selectiveCallCode + accessToken + alarmData, digestmod=hashlib.sha256).hexdigest()
+
 				logging.debug(alarmHeadersOrdered)
 
+				# the connection to FFAgent is kept open by the httpClient
+				# without serverCertFile the certificate of the server isn't verified
 				if globalVars.config.get("FFAgent", "live") == "1":
-					s = requests.Session()
-					s.headers = OrderedDict([('Content-Type', 'application/json')])
-					logging.debug(s.headers)
-					r = s.post(url, data=alarmData, headers=alarmHeadersOrdered, verify=serverCertFile, cert=(clientCertFile, clientCertPass))
-
+					r = httpClient.request("POST", url, alarmData, alarmHeadersOrdered, cafile=serverCertFile, verify=bool(serverCertFile), certfile=clientCertFile, keyfile=clientCertPass)
 				else:
-					s = requests.Session()
-					s.headers = OrderedDict([('Content-Type', 'application/json')])
-					logging.debug(s.headers)
-					r = s.post(url, data=alarmData, headers=alarmHeadersOrdered, verify=serverCertFile)
-				
-				logging.debug(r.request.headers)
+					r = httpClient.request("POST", url, alarmData, alarmHeadersOrdered, cafile=serverCertFile, verify=bool(serverCertFile))
 
 			except:
 				logging.error("cannot send FFAgent request")
 				logging.debug("cannot send FFAgent request", exc_info=True)
-				return
+				return False
 
 			else:
 				try:
 					#
 					# check FFAgent-Response
 					#
-					if r.status_code == requests.codes.ok: #Check FFAgent Response and print a Log or Error
-						logging.debug("FFAgent response: %s" , str(r.status_code))
+					if r.status == 200: #Check FFAgent Response and print a Log or Error
+						logging.debug("FFAgent response: %s" , str(r.status))
 					else:
-						logging.warning("FFAgent response: %s" , str(r.status_code))
+						logging.warning("FFAgent response: %s" , str(r.status))
+						# server errors are temporary - send again later
+						return r.status < 500
 				except: #otherwise
 					logging.error("cannot get FFAgent response")
 					logging.debug("cannot get FFAgent response", exc_info=True)
 					return
 
-			finally:
-				logging.debug("close FFAgent-Connection")
-				try:
-					r.close()
-				except:
-					pass
 
 	except:
 		logging.error("unknown error")
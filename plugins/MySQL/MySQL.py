@@ -3,6 +3,8 @@
 
 """
 MySQL-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages to a MySQL database
+The plugin keeps one connection to the database and writes the alarms in batches:
+a batch is flushed if it has batchSize entries or its oldest entry is batchAge seconds old.
 
 @author: Jens Herrmann
 @author: Bastian Schroll
@@ -12,6 +14,8 @@ MySQL-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages to a MySQL database
 """
 
 import logging # Global logger
+import threading
+import time
 
 import mysql
 import mysql.connector
@@ -20,6 +24,18 @@ from includes import globalVars  # Global variables
 
 from includes.helper import configHandler
 
+# local variables
+connection = None
+sigUnique = False # bos_signal has an unique key on ric -> upsert in one statement
+batches = {} # statement -> list of (row, alarm) - alarm: (typ, freq, data) for the retry queue
+batchCount = 0
+batchStart = 0
+batchSize = 1
+batchAge = 0
+maxPending = 1000 # max. rows kept while the database isn't reachable
+lock = threading.RLock()
+
+
 def isSignal(poc_id):
 	"""
 	@type    poc_id: string
@@ -31,13 +47,223 @@ def isSignal(poc_id):
 	@exception: none
 	"""
 	# If RIC is Signal return True, else False
-	if globalVars.config.get("POC", "netIdent_ric"):
-		if poc_id in globalVars.config.get("POC", "netIdent_ric"):
-			logging.info("RIC %s is net ident", poc_id)
-			return True
-		else:
-			logging.info("RIC %s is no net ident", poc_id)
-			return False
+	if poc_id in globalVars.settings.POC.netIdent_ric:
+		logging.info("RIC %s is net ident", poc_id)
+		return True
+	else:
+		logging.info("RIC %s is no net ident", poc_id)
+		return False
+
+
+def getConnection():
+	"""
+	Local helper to get the connection to MySQL
+	A lost connection is reopened.
+	Must be called with the lock held
+
+	@return:    MySQL connection
+	@exception: Exception if the connection couldn't be opened
+	"""
+	global connection
+	global sigUnique
+	if connection:
+		try:
+			connection.ping(reconnect=True, attempts=2, delay=1)
+			return connection
+		except:
+			logging.warning("connection to MySQL lost")
+			logging.debug("connection to MySQL lost", exc_info=True)
+			closeConnection()
+
+	logging.debug("connect to MySQL")
+	connection = mysql.connector.connect(host = globalVars.config.get("MySQL","dbserver"), port = globalVars.config.get("MySQL","dbport"), user = globalVars.config.get("MySQL","dbuser"), passwd = globalVars.config.get("MySQL","dbpassword"), db = globalVars.config.get("MySQL","database"), charset = 'utf8mb4', collation = 'utf8mb4_general_ci')
+
+	# the netIdent upsert needs an unique key on the ric (see boswatch-update.sql)
+	cursor = connection.cursor()
+	try:
+		cursor.execute("SHOW INDEX FROM "+globalVars.config.get("MySQL","tableSIG")+" WHERE Non_unique = 0 AND Column_name = 'ric'")
+		sigUnique = len(cursor.fetchall()) > 0
+		logging.debug("unique key on ric in %s: %s", globalVars.config.get("MySQL","tableSIG"), sigUnique)
+	finally:
+		cursor.close()
+	return connection
+
+
+def closeConnection():
+	"""
+	Local helper to close the connection to MySQL
+
+	@return:    nothing
+	"""
+	global connection
+	logging.debug("close MySQL")
+	try:
+		connection.close()
+	except:
+		pass
+	connection = None
+
+
+def addRow(statement, row, alarm):
+	"""
+	Local helper to add a row to the batch of the statement
+	The batch is flushed if it reaches batchSize.
+
+	@type    statement: string
+	@param   statement: SQL statement for executemany()
+	@type    row:       tuple
+	@param   row:       parameters of the statement
+	@type    alarm:     tuple
+	@param   alarm:     (typ, freq, data) of the row
+
+	@return:    nothing
+	"""
+	global batchCount
+	global batchStart
+	with lock:
+		if not batchCount:
+			batchStart = time.time()
+		batches.setdefault(statement, []).append((row, alarm))
+		batchCount += 1
+		if batchCount >= batchSize:
+			flush()
+
+
+def flush():
+	"""
+	Write all batches into the database, one executemany() per statement, each committed on its own
+	The tables may be MyISAM (no transactions), so a written statement is removed at once.
+	If the database isn't reachable, the remaining rows are kept for the next flush.
+	Rows with data or SQL errors are dropped, they would fail again.
+
+	@return:    nothing
+	"""
+	global batchCount
+	global batches
+	with lock:
+		if not batchCount:
+			return
+		pending = batches
+		batches = {}
+		batchCount = 0
+		try:
+			cursor = getConnection().cursor()
+		except:
+			logging.error("cannot connect to MySQL")
+			logging.debug("cannot connect to MySQL", exc_info=True)
+			closeConnection()
+			requeue(pending)
+			return
+		try:
+			for statement in pending.keys():
+				rows = [row for (row, alarm) in pending[statement]]
+				try:
+					if statement == "SIG":
+						updateSignals(cursor, rows)
+					else:
+						logging.debug("Insert %s rows", len(rows))
+						cursor.executemany(statement, rows)
+					connection.commit()
+				except (mysql.connector.errors.DataError, mysql.connector.errors.ProgrammingError, mysql.connector.errors.IntegrityError, mysql.connector.errors.NotSupportedError):
+					logging.error("cannot Insert into MySQL - %s rows dropped", len(rows))
+					logging.debug("cannot Insert into MySQL", exc_info=True)
+					rollback()
+				del pending[statement]
+		except:
+			logging.error("cannot Insert into MySQL")
+			logging.debug("cannot Insert into MySQL", exc_info=True)
+			rollback()
+			closeConnection()
+			requeue(pending)
+		finally:
+			try:
+				cursor.close()
+			except:
+				pass
+
+
+def rollback():
+	"""
+	Local helper to roll back the open transaction (nothing to do for MyISAM)
+
+	@return:    nothing
+	"""
+	try:
+		connection.rollback()
+	except:
+		pass
+
+
+def requeue(pending):
+	"""
+	Local helper to keep the rows which aren't written for the next flush
+	Must be called with the lock held
+
+	@type    pending: map
+	@param   pending: statement -> list of (row, alarm)
+
+	@return:    nothing
+	"""
+	global batchCount
+	for (statement, entries) in pending.items():
+		batches.setdefault(statement, [])[0:0] = entries
+		batchCount += len(entries)
+	if batchCount > maxPending:
+		logging.error("MySQL not reachable - %s rows dropped", batchCount - maxPending)
+		dropRows(batchCount - maxPending)
+
+
+def dropRows(count):
+	"""
+	Local helper to drop the oldest rows of the batches
+	Must be called with the lock held
+
+	@return:    nothing
+	"""
+	global batchCount
+	for entries in batches.values():
+		dropped = min(count, len(entries))
+		del entries[0:dropped]
+		batchCount -= dropped
+		count -= dropped
+
+
+def updateSignals(cursor, rows):
+	"""
+	Local helper to write the netIdent timestamps, one row per ric
+	With an unique key on the ric this is a single upsert, otherwise update or insert.
+
+	@type    cursor: MySQL cursor
+	@param   cursor: cursor of the connection
+	@type    rows:   list of tuples
+	@param   rows:   (timestamp, ric)
+
+	@return:    nothing
+	"""
+	table = globalVars.config.get("MySQL","tableSIG")
+	if sigUnique:
+		cursor.executemany("INSERT INTO "+table+" (`time`,`ric`) VALUES (FROM_UNIXTIME(%s),%s) ON DUPLICATE KEY UPDATE `time` = VALUES(`time`)", rows)
+	else:
+		for (timestamp, ric) in rows:
+			cursor.execute("UPDATE "+table+" SET time = FROM_UNIXTIME(%s) WHERE ric = %s", (timestamp, ric))
+			if cursor.rowcount == 0:
+				cursor.execute("INSERT INTO "+table+" (`time`,`ric`) VALUES (FROM_UNIXTIME(%s),%s)", (timestamp, ric))
+
+
+def flushLoop():
+	"""
+	Thread - flushes the batches when their oldest entry reaches batchAge
+
+	@return:    nothing
+	"""
+	while True:
+		time.sleep(min(batchAge, 1))
+		try:
+			if batchCount and time.time() - batchStart >= batchAge:
+				flush()
+		except:
+			logging.error("error in MySQL flush")
+			logging.debug("error in MySQL flush", exc_info=True)
 
 
 ##
@@ -54,10 +280,48 @@ def onLoad():
 
 	@return:    nothing
 	"""
-	# nothing to do for this plugin
+	global batchSize
+	global batchAge
+	if globalVars.config.has_option("MySQL", "batchSize"):
+		batchSize = max(globalVars.config.getint("MySQL", "batchSize"), 1)
+	if globalVars.config.has_option("MySQL", "batchAge"):
+		batchAge = max(globalVars.config.getint("MySQL", "batchAge"), 0)
+	logging.debug("MySQL batch size: %s, max. age: %ss", batchSize, batchAge)
+
+	if batchSize > 1 and batchAge > 0:
+		flushThread = threading.Thread(target=flushLoop, name="MySQLFlush")
+		flushThread.daemon = True
+		flushThread.start()
 	return
 
 
+##
+#
+# onUnload function of plugin
+# will be called one time by the pluginLoader on shutdown
+#
+def onUnload():
+	"""
+	Write the pending batches and close the connection
+	The alarms of rows which couldn't be written are handed to the retry queue.
+
+	@return:    nothing
+	"""
+	global batchCount
+	with lock:
+		flush()
+		if batchCount:
+			from includes import retryQueue
+			logging.warning("MySQL not reachable - %s rows handed to the retry queue", batchCount)
+			for entries in batches.values():
+				for (row, (typ, freq, data)) in entries:
+					retryQueue.put("MySQL", typ, freq, data)
+			batches.clear()
+			batchCount = 0
+		if connection:
+			closeConnection()
+
+
 ##
 #
 # Main function of MySQL-plugin
@@ -88,52 +352,31 @@ def run(typ,freq,data):
 
 			try:
 				#
-				# Connect to MySQL
+				# Create SQL-statement and add it to the batch
 				#
-				logging.debug("connect to MySQL")
-				connection = mysql.connector.connect(host = globalVars.config.get("MySQL","dbserver"), port = globalVars.config.get("MySQL","dbport"), user = globalVars.config.get("MySQL","dbuser"), passwd = globalVars.config.get("MySQL","dbpassword"), db = globalVars.config.get("MySQL","database"), charset = 'utf8mb4', collation = 'utf8mb4_general_ci')
-				cursor = connection.cursor()
-			except:
-				logging.error("cannot connect to MySQL")
-				logging.debug("cannot connect to MySQL", exc_info=True)
-			else: # Without connection, plugin couldn't work
-				try:
-					#
-					# Create and execute SQL-statement
-					#
-					logging.debug("Insert %s", typ)
-
-					if typ == "FMS":
-						cursor.execute("INSERT INTO "+globalVars.config.get("MySQL","tableFMS")+" (`time`, `fms`, `status`, `direction`, `directionText`, `tsi`, `description`) VALUES (FROM_UNIXTIME(%s),%s,%s,%s,%s,%s,%s)", (data["timestamp"], data["fms"], data["status"], data["direction"], data["directionText"], data["tsi"], data["description"]))
-
-					elif typ == "ZVEI":
-						cursor.execute("INSERT INTO "+globalVars.config.get("MySQL","tableZVEI")+" (`time`, `zvei`, `description`) VALUES (FROM_UNIXTIME(%s),%s,%s)", (data["timestamp"], data["zvei"], data["description"]))
-
-					elif typ == "POC":
-						if isSignal(data["ric"]):
-							if globalVars.config.getint("POC","netIdent_history"):
-								cursor.execute("INSERT INTO "+globalVars.config.get("MySQL","tableSIG")+" (`time`,`ric`) VALUES (NOW(), '"+data["ric"]+"');")
-							else:
-								cursor.execute("UPDATE "+globalVars.config.get("MySQL","tableSIG")+" SET time = NOW() WHERE ric = '"+data["ric"]+"';")
-								if cursor.rowcount == 0:
-									cursor.execute("INSERT INTO "+globalVars.config.get("MySQL","tableSIG")+" (`time`,`ric`) VALUES (NOW(), '"+data["ric"]+"');")
-						else:
-							cursor.execute("INSERT INTO "+globalVars.config.get("MySQL","tablePOC")+" (`time`, `ric`, `function`, `functionChar`, `msg`, `bitrate`, `description`) VALUES (FROM_UNIXTIME(%s),%s,%s,%s,%s,%s,%s)", (data["timestamp"], data["ric"], data["function"], data["functionChar"], data["msg"], data["bitrate"], data["description"]))
+				logging.debug("Insert %s", typ)
+
+				if typ == "FMS":
+					addRow("INSERT INTO "+globalVars.config.get("MySQL","tableFMS")+" (`time`, `fms`, `status`, `direction`, `directionText`, `tsi`, `description`) VALUES (FROM_UNIXTIME(%s),%s,%s,%s,%s,%s,%s)", (data["timestamp"], data["fms"], data["status"], data["direction"], data["directionText"], data["tsi"], data["description"]), (typ, freq, data))
 
+				elif typ == "ZVEI":
+					addRow("INSERT INTO "+globalVars.config.get("MySQL","tableZVEI")+" (`time`, `zvei`, `description`) VALUES (FROM_UNIXTIME(%s),%s,%s)", (data["timestamp"], data["zvei"], data["description"]), (typ, freq, data))
+
+				elif typ == "POC":
+					if isSignal(data["ric"]):
+						if globalVars.settings.POC.netIdent_history:
+							addRow("INSERT INTO "+globalVars.config.get("MySQL","tableSIG")+" (`time`,`ric`) VALUES (FROM_UNIXTIME(%s),%s)", (data["timestamp"], data["ric"]), (typ, freq, data))
+						else:
+							addRow("SIG", (data["timestamp"], data["ric"]), (typ, freq, data))
 					else:
-						logging.warning("Invalid Typ: %s", typ)
-				except:
-					logging.error("cannot Insert %s", typ)
-					logging.debug("cannot Insert %s", typ, exc_info=True)
-					return
-
-			finally:
-				logging.debug("close MySQL")
-				try:
-					cursor.close()
-					connection.close() #Close connection in every case
-				except:
-					pass
+						addRow("INSERT INTO "+globalVars.config.get("MySQL","tablePOC")+" (`time`, `ric`, `function`, `functionChar`, `msg`, `bitrate`, `description`) VALUES (FROM_UNIXTIME(%s),%s,%s,%s,%s,%s,%s)", (data["timestamp"], data["ric"], data["function"], data["functionChar"], data["msg"], data["bitrate"], data["description"]), (typ, freq, data))
+
+				else:
+					logging.warning("Invalid Typ: %s", typ)
+			except:
+				logging.error("cannot Insert %s", typ)
+				logging.debug("cannot Insert %s", typ, exc_info=True)
+				return
 
 	except:
 		logging.error("unknown error")
@@ -3,3 +3,8 @@ USE boswatch;
 -- rename old columns including little error-prevention
 ALTER IGNORE TABLE `bos_pocsag` change `funktion` `function` INT(1);
 ALTER IGNORE TABLE `bos_pocsag` change `funktionChar` `functionChar` TEXT(1);
+
+-- optional: unique key on the ric of the netIdent table (only without netIdent_history)
+-- with this key the plugin updates the netIdent timestamp in a single statement
+-- remove duplicate rics from `bos_signal` before adding the key
+-- ALTER TABLE `bos_signal` ADD UNIQUE KEY `SIGNAL_RIC_IDX` (`ric`);
@@ -10,12 +10,12 @@ Pushover-Plugin to send FMS-, ZVEI- and POCSAG - messages to Pushover Clients
 """
 
 import logging  # Global logger
-import httplib  # for the HTTP request
 import urllib
 from includes import globalVars  # Global variables
 
 # from includes.helper import timeHandler
 from includes.helper import configHandler
+from includes.helper import httpClient
 from includes.helper import wildcardHandler
 
 
@@ -133,9 +133,8 @@ def run(typ, freq, data):
                 if not sound:
                         sound = "pushover"
 
-                # start the connection
-                conn = httplib.HTTPSConnection("api.pushover.net:443")
-                conn.request("POST", "/1/messages.json",
+                # send the request, the connection is kept open by the httpClient
+                response = httpClient.request("POST", "https://api.pushover.net/1/messages.json",
                              urllib.urlencode({
                                  "token": globalVars.config.get("Pushover", "api_key"),
                                  "user": globalVars.config.get("Pushover", "user_key"),
@@ -157,7 +156,6 @@ def run(typ, freq, data):
                 #
                 # check Pushover-Response
                 #
-                response = conn.getresponse()
                 if str(response.status) == "200":  # Check Pushover Response and print a Log or Error
                     logging.debug("Pushover response: %s - %s", str(response.status), str(response.reason))
                 else:
@@ -167,13 +165,6 @@ def run(typ, freq, data):
                 logging.debug("cannot get Pushover response", exc_info=True)
                 return
 
-            finally:
-                logging.debug("close Pushover-Connection")
-                try:
-                    request.close()
-                except:
-                    pass
-
     except:
         logging.error("unknown error")
         logging.debug("unknown error", exc_info=True)
@@ -3,23 +3,29 @@
 
 """
 Plugin to send FMS-, ZVEI- and POCSAG-messages via Telegram
+The text message is sent first, then the maps and the location for the location RIC.
+Maps and locations of an address are cached.
 @author: Peter Laemmle
-@requires: Telegram BOT token, Telegram chat ID, library python-telegram-bot and optional requests and json
+@requires: Telegram BOT token, Telegram chat ID, library python-telegram-bot
 """
 
 #
 # Imports
 #
 import logging # Global logger
+import threading
+import json
+from io import BytesIO
 import telegram
 from telegram.error import (TelegramError, Unauthorized, BadRequest, NetworkError)
 from includes import globalVars  # Global variables
-if globalVars.config.get("Telegram","RICforLocationAPIKey"):
-	import requests, json
+from includes import alarmHandler
 
 # Helper function, uncomment to use
 from includes.helper import wildcardHandler
 from includes.helper import configHandler
+from includes.helper import httpClient
+from includes.helper.ttlCache import TTLCache
 
 # local variables
 BOTTokenAPIKey = None
@@ -27,6 +33,9 @@ BOTChatIDAPIKey = None
 RICforLocationAPIKey = None
 GoogleAPIKey = None
 RoutingOrigin = None
+bot = None
+locationCache = None # address -> (overview map, detail map, (lat, lng))
+sentTexts = None # alarm -> True, text sent but the location failed
 
 ##
 #
@@ -45,6 +54,9 @@ def onLoad():
 	global RICforLocationAPIKey
 	global GoogleAPIKey
 	global RoutingOrigin
+	global bot
+	global locationCache
+	global sentTexts
 
 	configHandler.checkConfig("Telegram")
 	BOTTokenAPIKey = globalVars.config.get("Telegram","BOTTokenAPIKey")
@@ -53,9 +65,127 @@ def onLoad():
 	GoogleAPIKey = globalVars.config.get("Telegram","GoogleAPIKey")
 	RoutingOrigin = globalVars.config.get("Telegram","RoutingOrigin")
 
+	cacheTime = 86400
+	if globalVars.config.has_option("Telegram", "LocationCacheTime"):
+		cacheTime = globalVars.config.getint("Telegram", "LocationCacheTime")
+	locationCache = TTLCache(64, cacheTime)
+	sentTexts = TTLCache(64, cacheTime)
+
+	# Initiate Telegram Bot once, the connection is reused for every alarm
+	logging.debug("Initiate Telegram BOT")
+	bot = telegram.Bot(token='%s' % BOTTokenAPIKey)
 	return
 
 
+def runParallel(*functions):
+	"""
+	Local helper to call the functions at the same time
+
+	@return:    list of the results
+	@exception: the first exception of the functions
+	"""
+	results = [None] * len(functions)
+	errors = []
+	def call(index, function):
+		try:
+			results[index] = function()
+		except Exception as e:
+			errors.append(e)
+	threads = [threading.Thread(target=call, args=(index, function), name="Telegram") for (index, function) in enumerate(functions)]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	if errors:
+		raise errors[0]
+	return results
+
+
+def googleRequest(api, params):
+	"""
+	Local helper to get the result of a Google Maps API
+
+	@return:    content of the response
+	@exception: Exception if the request failed
+	"""
+	response = httpClient.request("GET", "".join(["https://maps.googleapis.com/maps/api/", api, "?", params, "&key=", GoogleAPIKey]))
+	if response.status != 200:
+		raise IOError("Google %s API: %s %s" % (api, response.status, response.reason))
+	return response.body
+
+
+def getOverviewMap(address):
+	"""
+	Local helper to get the map with the route from RoutingOrigin to the address
+
+	@return:    png as string
+	"""
+	# Retrieve directions using Google API
+	logging.debug("Retrieve polylines from Directions API")
+	response = json.loads(googleRequest("directions/json", "origin="+RoutingOrigin+"&destination="+address+"&mode=driving").decode('utf-8'))
+	logging.debug("Directions API return status: %s" % response['status'])
+	# Retrieve static maps using Google API
+	logging.debug("Retrieve overview map from Google")
+	return googleRequest("staticmap", "size=480x640&maptype=roadmap&path=enc:"+response['routes'][0]['overview_polyline']['points']+"&language=de")
+
+
+def getDetailMap(address):
+	"""
+	Local helper to get the map of the address
+
+	@return:    png as string
+	"""
+	logging.debug("Retrieve detail map from Google")
+	return googleRequest("staticmap", "markers="+address+"&size=240x320&scale=2&maptype=hybrid&zoom=17&language=de")
+
+
+def getGeocode(address):
+	"""
+	Local helper to geocode the address
+
+	@return:    (lat, lng)
+	"""
+	logging.debug("Geocode address")
+	gcode_result = json.loads(googleRequest("geocode/json", "address="+address+"&language=de"))
+	logging.debug("Geocoding API return status: %s" % gcode_result['status'])
+	location = gcode_result['results'][0]['geometry']['location']
+	return (location['lat'], location['lng'])
+
+
+def sendLocation(address):
+	"""
+	Send the maps and the location of the address - called by run() after the text
+	Maps and location are taken from the cache or retrieved at the same time,
+	then sent one after the other.
+
+	@return:    True if maps and location were sent
+	"""
+	try:
+		location = locationCache.get(address)
+		if location is None:
+			location = runParallel(lambda: getOverviewMap(address), lambda: getDetailMap(address), lambda: getGeocode(address))
+			locationCache.put(address, location)
+		else:
+			logging.debug("maps and location of %s from cache", address)
+		(overviewMap, detailMap, (lat, lng)) = location
+	except:
+		logging.error("cannot create location")
+		logging.debug("cannot create location", exc_info=True)
+		return False
+
+	try:
+		# Send maps and location with Telegram
+		logging.debug("Send maps and location via Telegram BOT")
+		bot.sendPhoto('%s' % BOTChatIDAPIKey, BytesIO(overviewMap), disable_notification='true')
+		bot.sendPhoto('%s' % BOTChatIDAPIKey, BytesIO(detailMap), disable_notification='true')
+		bot.sendLocation('%s' % BOTChatIDAPIKey, lat, lng, disable_notification='true')
+	except TelegramError:
+		logging.error("Telegram Error: cannot send location")
+		logging.debug("Telegram Error: cannot send location", exc_info=True)
+		return False
+	return True
+
+
 ##
 #
 # Main function of plugin
@@ -76,7 +206,7 @@ def run(typ,freq,data):
 
 	@requires:  If necessary the configuration hast to be set in the config.ini.
 
-	@return:    nothing
+	@return:    False if the alarm should be sent again later
 	@exception: nothing, make sure this function will never thrown an exception
 	"""
 
@@ -89,49 +219,24 @@ def run(typ,freq,data):
 				text = globalVars.config.get("Telegram", "%s_message" % typ)
 				text = wildcardHandler.replaceWildcards(text, data)
 
-				# Initiate Telegram Bot
-				logging.debug("Initiate Telegram BOT")
-				bot = telegram.Bot(token='%s' % BOTTokenAPIKey)
-				# Send message to chat via Telegram BOT API
-				logging.debug("Send message to chat via Telegram BOT API")
-				bot.sendMessage('%s' % BOTChatIDAPIKey, text)
+				# a replay after a failed location doesn't send the text again
+				alarm = (typ, freq, repr(sorted(data.items())))
+				if alarmHandler.isReplay() and sentTexts.get(alarm):
+					logging.debug("text already sent")
+				else:
+					# Send message to chat via Telegram BOT API
+					logging.debug("Send message to chat via Telegram BOT API")
+					bot.sendMessage('%s' % BOTChatIDAPIKey, text)
 
 				# Generate location information only for specific RIC
 				if typ == "POC" and data["ric"] == RICforLocationAPIKey:
-					# Generate map
 					logging.debug("Extract address from POCSAG message")
 					address = "+".join(data["msg"].split(')')[0].split('/',1)[1].replace('(',' ').split())
-					# Retrieve directions using Google API
-					logging.debug("Retrieve polylines from Directions API")
-					url = "".join(["https://maps.googleapis.com/maps/api/directions/json?origin=",
-						       RoutingOrigin, "&destination=", address, "&mode=driving&key=", GoogleAPIKey])
-					response = json.loads(requests.get(url).content.decode('utf-8'))
-					logging.debug("Directions API return status: %s" % response['status'])
-					# Retrieve static maps using Google API
-					logging.debug("Retrieve maps from Google")
-					url = "".join(["https://maps.googleapis.com/maps/api/staticmap?&size=480x640&maptype=roadmap&path=enc:",
-						       response['routes'][0]['overview_polyline']['points'], "&language=de&key=", GoogleAPIKey])
-					with open("overview_map.png", "wb") as img: img.write(requests.get(url).content)
-					url = "".join(["https://maps.googleapis.com/maps/api/staticmap?markers=",
-						       address, "&size=240x320&scale=2&maptype=hybrid&zoom=17&language=de&key=", GoogleAPIKey])
-					with open("detail_map.png", "wb") as img: img.write(requests.get(url).content)
-
-					# Send message and map with Telegram
-					logging.debug("Send message and maps via Telegram BOT")
-					bot.sendPhoto('%s' % BOTChatIDAPIKey, open('overview_map.png', 'rb'), disable_notification='true')
-					bot.sendPhoto('%s' % BOTChatIDAPIKey, open('detail_map.png', 'rb'), disable_notification='true')
-
-					# Geocoding of address
-					logging.debug("Geocode address")
-					url = "".join(["https://maps.googleapis.com/maps/api/geocode/json?address=",
-						       address, "&language=de&key=", GoogleAPIKey])
-					gcode_result = json.loads(requests.get(url).content)
-					logging.debug("Geocoding API return status: %s" % gcode_result['status'])
-					logging.debug("Send location via Telegram BOT API")
-					bot.sendLocation('%s' % BOTChatIDAPIKey,
-							 gcode_result[results][0]['geometry']['location']['lat'],
-							 gcode_result[results][0]['geometry']['location']['lng'],
-							 disable_notification='true')
+					# maps and location after the text
+					if not sendLocation(address):
+						sentTexts.put(alarm, True)
+						# send again later
+						return False
 			else:
 				logging.warning("Invalid Typ: %s", typ)
 		except Unauthorized:
@@ -143,9 +248,13 @@ def run(typ,freq,data):
 		except NetworkError:
 			logging.error("Telegram Error: NetworkError")
 			logging.debug("Telegram Error: NetworkError", exc_info=True)
+			# send again later
+			return False
 		except TelegramError:
 			logging.error("Telegram Error: TelegramError")
 			logging.debug("Telegram Error: TelegramError", exc_info=True)
+			# send again later
+			return False
 		########## User Plugin CODE ##########
 
 	except:
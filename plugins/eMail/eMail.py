@@ -3,6 +3,8 @@
 
 """
 eMail-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages via eMail/SMTP
+The connection to the SMTP-Server is kept open (checked with NOOP before use).
+Optionally the alarms of digest_time seconds are collected into one eMail.
 
 @author: Jens Herrmann
 
@@ -10,6 +12,8 @@ eMail-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages via eMail/SMTP
 """
 
 import logging # Global logger
+import threading
+import socket
 
 import smtplib #for the SMTP client
 from email.mime.text import MIMEText # Import the email modules we'll need
@@ -18,11 +22,21 @@ from email.utils import formatdate # need for confirm to RFC2822 standard
 from email.utils import make_msgid # need for confirm to RFC2822 standard
 
 from includes import globalVars  # Global variables
+from includes import alarmHandler
 
 #from includes.helper import timeHandler # helper function
 from includes.helper import configHandler # helper function
 from includes.helper import wildcardHandler # helper function
 
+# local variables
+server = None # kept SMTP connection
+lock = threading.Lock()
+digestTime = 0 # seconds to collect alarms into one eMail (0: off)
+digestSubject = "BOSWatch: %COUNT% alarms"
+digest = [] # collected alarms: (typ, freq, data, subject, mailtext)
+digestTimer = None
+digestLock = threading.Lock()
+
 ##
 #
 # onLoad (init) function of plugin
@@ -37,9 +51,92 @@ def onLoad():
 
 	@return:    nothing
 	"""
-	# nothing to do for this plugin
+	global digestTime
+	global digestSubject
+	if globalVars.config.has_option("eMail", "digest_time"):
+		digestTime = max(globalVars.config.getint("eMail", "digest_time"), 0)
+	if globalVars.config.has_option("eMail", "digest_subject"):
+		digestSubject = globalVars.config.get("eMail", "digest_subject")
+	logging.debug("eMail digest time: %ss", digestTime)
 	return
 
+
+##
+#
+# onUnload function of plugin
+# will be called one time by the pluginLoader on shutdown
+#
+def onUnload():
+	"""
+	Send the collected alarms of the digest and close the SMTP connection
+
+	@return:    nothing
+	"""
+	sendDigest()
+	with lock:
+		closeServer()
+
+
+def getServer():
+	"""
+	Local helper to get the SMTP connection
+	An open connection is checked with NOOP, a lost connection is reopened.
+	Must be called with the lock held
+
+	@return:    SMTP-Object
+	@exception: Exception if the connection couldn't be opened
+	"""
+	global server
+	if server:
+		try:
+			if server.noop()[0] == 250:
+				return server
+		except:
+			logging.debug("eMail-Connection lost", exc_info=True)
+		closeServer()
+
+	logging.debug("connect to eMail")
+	#
+	# connect to SMTP-Server
+	#
+	try:
+		server = smtplib.SMTP_SSL(globalVars.config.get("eMail", "smtp_server"), globalVars.config.get("eMail", "smtp_port"))
+	except:
+		server = smtplib.SMTP(globalVars.config.get("eMail", "smtp_server"), globalVars.config.get("eMail", "smtp_port"))
+	try:
+		# debug-level to shell (0=no debug|1)
+		server.set_debuglevel(0)
+
+		# if tls is enabled, starttls
+		if globalVars.config.getboolean("eMail", "tls"):
+			server.starttls()
+
+		# if user is given, login
+		if globalVars.config.get("eMail", "user"):
+			server.login(globalVars.config.get("eMail", "user"), globalVars.config.get("eMail", "password"))
+	except:
+		closeServer()
+		raise
+	return server
+
+
+def closeServer():
+	"""
+	Local helper to close the SMTP connection
+	Must be called with the lock held
+
+	@return:    nothing
+	"""
+	global server
+	if server:
+		logging.debug("close eMail-Connection")
+		try:
+			server.quit()
+		except:
+			pass
+	server = None
+
+
 ##
 #
 # do send mail
@@ -73,6 +170,71 @@ def doSendmail(server, subject, mailtext):
 		raise
 
 
+def sendMail(subject, mailtext):
+	"""
+	Local helper to send an eMail over the kept SMTP connection
+	If the server has closed the connection in the meantime, the eMail is sent again over a new one.
+
+	@return:    nothing
+	@exception: Exception if the eMail couldn't be sent
+	"""
+	with lock:
+		try:
+			doSendmail(getServer(), subject, mailtext)
+		except (smtplib.SMTPServerDisconnected, socket.error):
+			closeServer()
+			doSendmail(getServer(), subject, mailtext)
+
+
+def addToDigest(typ, freq, data, subject, mailtext):
+	"""
+	Local helper to collect an alarm for the digest
+	The first alarm starts the timer, which sends the digest after digest_time seconds.
+
+	@return:    nothing
+	"""
+	global digestTimer
+	with digestLock:
+		digest.append((typ, freq, data, subject, mailtext))
+		if not digestTimer:
+			digestTimer = threading.Timer(digestTime, sendDigest)
+			digestTimer.name = "eMailDigest"
+			digestTimer.daemon = True
+			digestTimer.start()
+
+
+def sendDigest():
+	"""
+	Send the collected alarms - a single alarm as normal eMail, more as one digest eMail
+	If the digest couldn't be sent, the alarms are put into the retry queue.
+	The replays are sent as single eMails (see run), not collected again.
+
+	@return:    nothing
+	"""
+	global digest
+	global digestTimer
+	with digestLock:
+		if digestTimer:
+			digestTimer.cancel()
+		(entries, digest, digestTimer) = (digest, [], None)
+	if not entries:
+		return
+	try:
+		if len(entries) == 1:
+			sendMail(entries[0][3], entries[0][4])
+		else:
+			logging.debug("send eMail digest with %s alarms", len(entries))
+			# wildcards of the first alarm and the number of alarms
+			subject = wildcardHandler.replaceWildcards(digestSubject.replace("%COUNT%", str(len(entries))), entries[0][2])
+			sendMail(subject, "\n\n".join(entry[4] for entry in entries))
+	except:
+		logging.error("eMail digest failed")
+		logging.debug("eMail digest failed", exc_info=True)
+		from includes import retryQueue
+		for (typ, freq, data, subject, mailtext) in entries:
+			retryQueue.put("eMail", typ, freq, data)
+
+
 ##
 #
 # Main function of eMail-plugin
@@ -95,107 +257,38 @@ def run(typ,freq,data):
 
 	@requires:  eMail-Configuration has to be set in the config.ini
 
-	@return:    nothing
+	@return:    False if the alarm should be sent again later
 	"""
 	try:
 		if configHandler.checkConfig("eMail"): #read and debug the config
 
-			try:
-				#
-				# connect to SMTP-Server
-				#
+			if typ in ("FMS", "ZVEI", "POC"):
+				logging.debug("Start %s to eMail", typ)
 				try:
-					server = smtplib.SMTP_SSL(globalVars.config.get("eMail", "smtp_server"), globalVars.config.get("eMail", "smtp_port"))
+					# read subject-structure from config.ini
+					subject = globalVars.config.get("eMail", typ.lower()+"_subject")
+					# replace wildcards with helper function
+					subject = wildcardHandler.replaceWildcards(subject, data)
+
+					# read mailtext-structure from config.ini
+					mailtext = globalVars.config.get("eMail", typ.lower()+"_message")
+					# replace wildcards with helper function
+					mailtext = wildcardHandler.replaceWildcards(mailtext, data)
+
+					if digestTime and not alarmHandler.isReplay():
+						# collect the alarms for digest_time seconds into one eMail
+						addToDigest(typ, freq, data, subject, mailtext)
+					else:
+						# send eMail - a replay directly, so a failure reaches the retry queue
+						sendMail(subject, mailtext)
 				except:
-					server = smtplib.SMTP(globalVars.config.get("eMail", "smtp_server"), globalVars.config.get("eMail", "smtp_port"))
-				# debug-level to shell (0=no debug|1)
-				server.set_debuglevel(0)
-
-				# if tls is enabled, starttls
-				if globalVars.config.getboolean("eMail", "tls"):
-					server.starttls()
-
-				# if user is given, login
-				if globalVars.config.get("eMail", "user"):
-					server.login(globalVars.config.get("eMail", "user"), globalVars.config.get("eMail", "password"))
-
-			except:
-				logging.error("cannot connect to eMail")
-				logging.debug("cannot connect to eMail", exc_info=True)
-				# Without connection, plugin couldn't work
-				return
+					logging.error("%s to eMail failed", typ)
+					logging.debug("%s to eMail failed", typ, exc_info=True)
+					# send again later
+					return False
 
 			else:
-
-				if typ == "FMS":
-					logging.debug("Start FMS to eMail")
-					try:
-						# read subject-structure from config.ini
-						subject = globalVars.config.get("eMail", "fms_subject")
-						# replace wildcards with helper function
-						subject = wildcardHandler.replaceWildcards(subject, data)
-
-						# read mailtext-structure from config.ini
-						mailtext = globalVars.config.get("eMail", "fms_message")
-						# replace wildcards with helper function
-						mailtext = wildcardHandler.replaceWildcards(mailtext, data)
-
-						# send eMail
-						doSendmail(server, subject, mailtext)
-					except:
-						logging.error("%s to eMail failed", typ)
-						logging.debug("%s to eMail failed", typ, exc_info=True)
-						return
-
-				elif typ == "ZVEI":
-					logging.debug("Start ZVEI to eMail")
-					try:
-						# read subject-structure from config.ini
-						subject = globalVars.config.get("eMail", "zvei_subject")
-						# replace wildcards with helper function
-						subject = wildcardHandler.replaceWildcards(subject, data)
-
-						# read mailtext-structure from config.ini
-						mailtext = globalVars.config.get("eMail", "zvei_message")
-						# replace wildcards with helper function
-						mailtext = wildcardHandler.replaceWildcards(mailtext, data)
-
-						# send eMail
-						doSendmail(server, subject, mailtext)
-					except:
-						logging.error("%s to eMail failed", typ)
-						logging.debug("%s to eMail failed", typ, exc_info=True)
-						return
-
-				elif typ == "POC":
-					logging.debug("Start POC to eMail")
-					try:
-						# read subject-structure from config.ini
-						subject = globalVars.config.get("eMail", "poc_subject")
-						# replace wildcards with helper function
-						subject = wildcardHandler.replaceWildcards(subject, data)
-
-						# read mailtext-structure from config.ini
-						mailtext = globalVars.config.get("eMail", "poc_message")
-						# replace wildcards with helper function
-						mailtext = wildcardHandler.replaceWildcards(mailtext, data)
-
-						# send eMail
-						doSendmail(server, subject, mailtext)
-					except:
-						logging.error("%s to eMail failed", typ)
-						logging.debug("%s to eMail failed", typ, exc_info=True)
-						return
-
-				else:
-					logging.warning("Invalid Type: %s", typ)
-
-			finally:
-				logging.debug("close eMail-Connection")
-				try:
-					server.quit()
-				except:
-					pass
+				logging.warning("Invalid Type: %s", typ)
 
 	except:
 		# something very mysterious
@@ -2,10 +2,13 @@
 # -*- coding: UTF-8 -*-
 
 """
+gpiocontrol-Plugin to switch GPIO pins of the Raspberry Pi at an alarm
+One scheduler thread switches all pins: every pin is off or on until a time,
+which is kept in a heap. A new alarm while a pin is on extends its time.
 
 @author: KS
 
-@requires: none
+@requires: gpiocontrol-Configuration has to be set in the config.ini
 """
 
 # Imports
@@ -13,15 +16,23 @@
 import RPi.GPIO as GPIO
 import time
 import threading
+import heapq
 
 import logging # Global logger
 from includes import globalVars  # Global variables
 
 # Helper function, uncomment to use
-from includes.helper import timeHandler
-from includes.helper import wildcardHandler
 from includes.helper import configHandler
 
+# local variables
+pins = {} # pin -> time until the pin is on (0: off)
+timers = [] # heap of (time, pin) - entries of extended pins are skipped
+condition = threading.Condition()
+schedulerThread = None
+running = False
+waitTime = 0
+activeRics = frozenset()
+
 ##
 #
 # onLoad (init) function of plugin
@@ -32,29 +43,98 @@ def onLoad():
 	While loading the plugins by pluginLoader.loadPlugins()
 	this onLoad() routine is called one time for initialize the plugin
 
-	@requires:  nothing
+	@requires:  gpiocontrol-Configuration has to be set in the config.ini
 
 	@return:    nothing
 	@exception: Exception if init has an fatal error so that the plugin couldn't work
 
 	"""
-	global GPIOPIN
 	global waitTime
+	global activeRics
+	global schedulerThread
+	global running
 
-	GPIOPIN = globalVars.config.getint("gpiocontrol","pin")
 	waitTime = globalVars.config.getint("gpiocontrol","triggertime")
+	activeRics = frozenset(configHandler.toList(globalVars.config.get("gpiocontrol", "activerics")))
 
 	GPIO.setmode(GPIO.BCM)
 	GPIO.setwarnings(False)
-	GPIO.setup(GPIOPIN, GPIO.OUT)
+	for pin in configHandler.toList(globalVars.config.get("gpiocontrol","pin")):
+		pins[int(pin)] = 0
+		GPIO.setup(int(pin), GPIO.OUT)
+		# HIGH is off
+		GPIO.output(int(pin), GPIO.HIGH)
+
+	running = True
+	schedulerThread = threading.Thread(target=scheduler, name="gpioScheduler")
+	schedulerThread.daemon = True
+	schedulerThread.start()
+	return
 
-	#GPIO schalten beim START
-    	#GPIO.output(GPIOPIN, GPIO.LOW)
-	#time.sleep(1)
 
-	GPIO.output(GPIOPIN, GPIO.HIGH)
+##
+#
+# onUnload function of plugin
+# will be called one time by the pluginLoader on shutdown
+#
+def onUnload():
+	"""
+	Stop the scheduler and switch all pins off
+
+	@return:    nothing
+	"""
+	global running
+	with condition:
+		running = False
+		condition.notify()
+		for pin in pins:
+			GPIO.output(pin, GPIO.HIGH)
+			pins[pin] = 0
+
+
+def trigger():
+	"""
+	Switch all pins on for waitTime seconds
+	A pin, which is already on, keeps on and its time is extended.
+
+	@return:    nothing
+	"""
+	with condition:
+		until = time.time() + waitTime
+		for pin in pins:
+			if not pins[pin]:
+				GPIO.output(pin, GPIO.LOW)
+				logging.info("GPIOPIN %s angeschaltet", pin)
+			else:
+				logging.info("GPIOPIN %s verlaengert", pin)
+			pins[pin] = until
+			heapq.heappush(timers, (until, pin))
+		condition.notify()
+
+
+def scheduler():
+	"""
+	Thread - switches the pins off when their time is over
+
+	@return:    nothing
+	"""
+	with condition:
+		while running:
+			if not timers:
+				condition.wait()
+				continue
+			(until, pin) = timers[0]
+			now = time.time()
+			if until > now:
+				condition.wait(until - now)
+				continue
+			heapq.heappop(timers)
+			# an extended pin has a newer entry in the heap
+			if pins[pin] == until:
+				GPIO.output(pin, GPIO.HIGH)
+				pins[pin] = 0
+				logging.info("GPIOPIN %s ausgeschaltet", pin)
 
-	return
 
 #
 #
@@ -70,7 +150,7 @@ def run(typ,freq,data):
 	@type    freq: string
 	@keyword freq: frequency of the SDR Stick
 
-	@requires:  If necessary the configuration hast to be set in the config.ini.
+	@requires:  gpiocontrol-Configuration has to be set in the config.ini
 
 	@return:    nothing
 	@exception: nothing, make sure this function will never thrown an exception
@@ -78,28 +158,16 @@ def run(typ,freq,data):
 	try:
 		if configHandler.checkConfig("gpiocontrol"): #read and debug the config (let empty if no config used)
 
-			logging.debug(globalVars.config.get("gpiocontrol", "pin"))
-			logging.debug(globalVars.config.get("gpiocontrol", "triggertime"))
-
 			########## User Plugin CODE ##########
 			if typ == "FMS":
-				th = threading.Thread(target = trigger)
-				th.start()
-				#logging.warning("%s not supported", typ)
+				trigger()
 			elif typ == "ZVEI":
-				th = threading.Thread(target = trigger)
-				th.start()
-				#logging.warning("%s not supported", typ)
+				trigger()
 			elif typ == "POC":
-				if globalVars.config.get("gpiocontrol", "activerics") == "":
-                    		th = threading.Thread(target = trigger)
-                    		th.start()
-              			else
-                 			if  data["ric"] in globalVars.config.get("gpiocontrol", "activerics"):
-                				th = threading.Thread(target = trigger)
-                    				th.start()
-                    			else:
-                        			logging.info("Ric not in activerics")
+				if not activeRics or data["ric"] in activeRics:
+					trigger()
+				else:
+					logging.info("Ric not in activerics")
 			else:
 				logging.warning("Invalid Typ: %s", typ)
 			########## User Plugin CODE ##########
@@ -107,12 +175,3 @@ def run(typ,freq,data):
 	except:
 		logging.error("unknown error")
 		logging.debug("unknown error", exc_info=True)
-
-def trigger():
-	GPIO.output(GPIOPIN, GPIO.LOW)
-	logging.info("GPIOPIN %s angeschaltet", GPIOPIN)
-	time.sleep(waitTime)
-        GPIO.output(GPIOPIN, GPIO.HIGH)
-	logging.info("GPIOPIN %s ausgeschaltet", GPIOPIN)
-
-	return
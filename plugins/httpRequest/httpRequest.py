@@ -3,6 +3,8 @@
 
 """
 httpRequest-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages to an URL
+Multiple URLs are requested at the same time, every URL with its own retries -
+so a dead endpoint costs only its own timeout.
 
 @author: Bastian Schroll
 @author: TheJockel
@@ -15,7 +17,10 @@ httpRequest-Plugin to dispatch FMS-, ZVEI- and POCSAG - messages to an URL
 # Imports
 #
 import urllib
-import urllib2
+import socket
+import httplib
+import time
+import threading
 import logging # Global logger
 from includes import globalVars  # Global variables
 
@@ -23,6 +28,7 @@ from includes import globalVars  # Global variables
 #from includes.helper import timeHandler
 from includes.helper import wildcardHandler
 from includes.helper import configHandler
+from includes.helper import httpClient
 
 ##
 #
@@ -42,6 +48,50 @@ def onLoad():
 	return
 
 
+def getOption(option, default):
+	"""
+	Local helper to read an optional integer of section [httpRequest]
+
+	@return:    value of the option or default
+	"""
+	if globalVars.config.has_option("httpRequest", option):
+		return globalVars.config.getint("httpRequest", option)
+	return default
+
+
+def sendRequest(url, timeout, retries, results, index):
+	"""
+	Local helper to send one request - thread of run()
+	A failed request or a server error (5xx) is sent again up to retries times.
+
+	@type    url:     string
+	@param   url:     URL with replaced wildcards
+	@type    timeout: tuple
+	@param   timeout: (connect, read) timeout in seconds
+	@type    retries: integer
+	@param   retries: max. repetitions of the request
+	@type    results: list
+	@param   results: result of the request is stored at results[index]
+
+	@return:    nothing
+	"""
+	start = time.time()
+	for attempt in range(retries + 1):
+		if attempt:
+			time.sleep(min(attempt, 3))
+		try:
+			response = httpClient.request("GET", url, timeout=timeout, followRedirects=True)
+			results[index] = (response.status, attempt + 1, time.time() - start)
+			if response.status < 500:
+				return
+		except (socket.error, httplib.HTTPException) as e:
+			results[index] = ("HTTP-specific error: %s" % str(e.args), attempt + 1, time.time() - start)
+		except Exception as e:
+			# invalid URL etc. - no retry
+			results[index] = ("error: %s" % str(e), attempt + 1, time.time() - start)
+			return
+
+
 ##
 #
 # Main function of HTTP-plugin
@@ -96,15 +146,26 @@ def run(typ,freq,data):
 				#
 				# HTTP-Request
 				#
+				urls = [url for url in urls if url]
 				logging.debug("send %s HTTP requests", typ)
 
-				for url in urls:
-					try:
-						urllib2.urlopen(url)
-					except urllib2.HTTPError as e:
-    						logging.warning("HTTP response: %s", e.code)
-					except urllib2.URLError as e:
-    						logging.warning("HTTP-specific error: %s", e.args)
+				timeout = (getOption("connectTimeout", 5), getOption("readTimeout", 10))
+				retries = max(getOption("retries", 1), 0)
+				results = [None] * len(urls)
+				threads = []
+				for (i, url) in enumerate(urls):
+					thread = threading.Thread(target=sendRequest, args=(url, timeout, retries, results, i), name="httpRequest")
+					thread.daemon = True
+					thread.start()
+					threads.append(thread)
+				for thread in threads:
+					thread.join()
+
+				for (url, (result, attempts, duration)) in zip(urls, results):
+					if isinstance(result, int) and result < 400:
+						logging.debug("HTTP response %s from %s (%s attempt(s), %.2fs)", result, url, attempts, duration)
+					else:
+						logging.warning("HTTP request to %s failed: %s (%s attempt(s), %.2fs)", url, result, attempts, duration)
 
 			except:
 				logging.error("cannot send HTTP request")
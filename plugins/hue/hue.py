@@ -4,6 +4,8 @@
 """
 
 Plugin to control Philips hue lights and switches
+The light sequence (blinking and keepon) runs in a background thread,
+so run() returns at once. A new alarm replaces the running sequence.
 
 @author: Fabian Kessler
 
@@ -16,13 +18,20 @@ Plugin to control Philips hue lights and switches
 import logging # Global logger
 from includes import globalVars  # Global variables
 import json
-import requests
 import time
+import threading
 
 # Helper function, uncomment to use
 #from includes.helper import timeHandler
 #from includes.helper import wildcardHandler
 from includes.helper import configHandler
+from includes.helper import httpClient
+
+# local variables
+steps = [] # light sequence: list of (time, url, data)
+condition = threading.Condition()
+sequencerThread = None
+running = False
 
 ##
 #
@@ -39,13 +48,78 @@ def onLoad():
 	"""
 	try:
 		########## User onLoad CODE ##########
-		pass
+		global sequencerThread
+		global running
+		running = True
+		sequencerThread = threading.Thread(target=sequencer, name="hueSequencer")
+		sequencerThread.daemon = True
+		sequencerThread.start()
 		########## User onLoad CODE ##########
 	except:
 		logging.error("unknown error")
 		logging.debug("unknown error", exc_info=True)
 		raise
 
+
+##
+#
+# onUnload function of plugin
+# will be called one time by the pluginLoader on shutdown
+#
+def onUnload():
+	"""
+	Stop the sequencer, the light keeps its current state
+
+	@return:    nothing
+	"""
+	global running
+	with condition:
+		running = False
+		condition.notify()
+	if sequencerThread:
+		sequencerThread.join(3)
+
+
+def sequencer():
+	"""
+	Thread - switches the light at the times of the sequence
+	The sequence can be replaced at any time by setSequence().
+
+	@return:    nothing
+	"""
+	while True:
+		with condition:
+			while running and not (steps and steps[0][0] <= time.time()):
+				# wait for the next step or a new sequence
+				condition.wait(steps[0][0] - time.time() if steps else None)
+			if not running:
+				return
+			(due, url, data) = steps.pop(0)
+		try:
+			# the connection to the bridge is kept open by the httpClient
+			httpClient.request("PUT", url, data)
+			logging.debug("hue switched: %s", data)
+		except:
+			logging.error("cannot switch hue")
+			logging.debug("cannot switch hue", exc_info=True)
+
+
+def setSequence(sequence):
+	"""
+	Replace the running sequence - the light continues with the new one at once
+
+	@type    sequence: list
+	@param   sequence: (time, url, data) ordered by time
+
+	@return:    nothing
+	"""
+	with condition:
+		if steps:
+			logging.debug("running hue sequence replaced")
+		steps[:] = sequence
+		condition.notify()
+
+
 ##
 #
 # Main function of plugin
@@ -96,23 +170,22 @@ def run(typ,freq,data):
 				url = "http://" + bridgeip + "/api/" + apikey + "/lights/" + deviceid + "/state"
 				logging.debug("hue REST API URL: %s", url)
 				
-				#blinking  
+				#blinking, the sequence is switched by the sequencer thread
+				sequence = []
+				now = time.time()
 				for _ in xrange(repeat):
-					requests.put(url, data=data_on)
-					logging.debug("on for %s seconds", timeon)
-					time.sleep(timeon)
-					requests.put(url, data=data_off)
-					logging.debug("off for %s seconds", timeoff)
-					time.sleep(timeoff)
+					sequence.append((now, url, data_on))
+					now += timeon
+					sequence.append((now, url, data_off))
+					now += timeoff
 				if keepon > 0:
-					logging.debug("switch to on and wait for keepon to expire")
-					requests.put(url, data=data_on)
-					logging.debug("keep on for %s seconds", keepon)
-					time.sleep(keepon)
-					requests.put(url, data=data_off)
+					logging.debug("switch to on and keep on for %s seconds", keepon)
+					sequence.append((now, url, data_on))
+					sequence.append((now + keepon, url, data_off))
 				else:
-					logging.debug("switch to on and exit plugin")
-					requests.put(url, data=data_on)
+					logging.debug("switch to on")
+					sequence.append((now, url, data_on))
+				setSequence(sequence)
 			else:
 				logging.warning("Invalid Typ: %s", typ)
 			########## User Plugin CODE ##########
@@ -3,6 +3,8 @@
 
 """
 jsonSocket-Plugin to dispatch FMS-, ZVEI- and POCSAG-messages via UDP/TCP
+Messages are sent as newline-delimited JSON. In TCP mode the connection to every
+server is kept open and reopened automatically; messages are buffered meanwhile.
 
 @author: Jens Herrmann
 
@@ -13,11 +15,143 @@ import logging # Global logger
 
 import socket  # for connection
 import json    # for data-transfer
+import select
+import threading
+import Queue
 
 from includes import globalVars  # Global variables
 
 from includes.helper import configHandler
 
+# local variables
+receivers = [] # TCP: one Receiver per server
+udpSocket = None
+bufferSize = 100 # max. messages kept per receiver while it isn't reachable
+
+
+class Receiver(object):
+	"""Persistent TCP connection to one server with its own send buffer and sender thread"""
+
+	def __init__(self, server, port):
+		self.server = server
+		self.port = port
+		self.sendQueue = Queue.Queue(bufferSize)
+		self.stopEvent = threading.Event()
+		self.thread = threading.Thread(target=self._sender, name="jsonSocket-"+str(self))
+		self.thread.daemon = True
+		self.thread.start()
+
+
+	def __str__(self):
+		return "%s:%s" % (self.server, self.port)
+
+
+	def put(self, frame):
+		"""
+		Put a message into the send buffer - if it is full, the oldest message is dropped
+
+		@return:    nothing
+		"""
+		while True:
+			try:
+				self.sendQueue.put_nowait(frame)
+				return
+			except Queue.Full:
+				try:
+					self.sendQueue.get_nowait()
+					logging.warning("jsonSocket buffer for %s is full - oldest message dropped", self)
+				except Queue.Empty:
+					pass
+
+
+	def _sender(self):
+		"""
+		Sender thread - keeps the connection and sends the buffered messages
+		A lost connection is reopened with increasing delay, the message is sent again.
+
+		@return:    nothing
+		"""
+		sock = None
+		delay = 1
+		while True:
+			frame = self.sendQueue.get()
+			if frame is None:
+				break
+			while not self.stopEvent.is_set():
+				try:
+					if sock and isClosed(sock):
+						logging.debug("jsonSocket connection to %s closed by server", self)
+						sock.close()
+						sock = None
+					if not sock:
+						sock = socket.create_connection((self.server, self.port), 10)
+						sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+						logging.debug("jsonSocket connected to %s", self)
+						delay = 1
+					sock.sendall(frame)
+					break
+				except socket.error:
+					logging.warning("jsonSocket connection to %s failed - retry in %ss", self, delay)
+					logging.debug("jsonSocket connection to %s failed", self, exc_info=True)
+					if sock:
+						sock.close()
+						sock = None
+					self.stopEvent.wait(delay)
+					delay = min(delay * 2, 60)
+		if sock:
+			sock.close()
+
+
+	def stop(self, timeout):
+		"""
+		Send the buffered messages within the timeout and close the connection
+
+		@return:    nothing
+		"""
+		try:
+			self.sendQueue.put(None, True, timeout)
+		except Queue.Full:
+			pass
+		self.thread.join(timeout)
+		self.stopEvent.set()
+
+
+def isClosed(sock):
+	"""
+	Local helper to check if the server has closed the connection
+	The server doesn't send anything, so a readable socket is closed (or sends waste).
+
+	@return:    True if the connection is closed
+	"""
+	(readable, writable, failed) = select.select([sock], [], [], 0)
+	if not readable:
+		return False
+	try:
+		return not sock.recv(4096)
+	except socket.error:
+		return True
+
+
+def getServers():
+	"""
+	Local helper to read the servers from the config.ini
+	server can be a comma separated list of host or host:port
+
+	@return:    list of (host, port)
+	"""
+	servers = []
+	for entry in globalVars.config.get("jsonSocket", "server").split(","):
+		entry = entry.strip()
+		if not entry:
+			continue
+		if ":" in entry:
+			(host, port) = entry.rsplit(":", 1)
+			servers.append((host.strip(), int(port)))
+		else:
+			servers.append((entry, globalVars.config.getint("jsonSocket", "port")))
+	return servers
+
+
 ##
 #
 # onLoad (init) function of plugin
@@ -28,14 +162,44 @@ def onLoad():
 	While loading the plugins by pluginLoader.loadPlugins()
 	this onLoad() routine is called one time for initialize the plugin
 
-	@requires:  nothing
+	@requires:  jsonSocket-Configuration has to be set in the config.ini
 
 	@return:    nothing
+	@exception: Exception if the sockets couldn't be initialized
 	"""
-	# nothing to do for this plugin
+	global udpSocket
+	try:
+		if globalVars.config.get("jsonSocket", "protocol") == "TCP":
+			for (server, port) in getServers():
+				logging.debug("jsonSocket receiver: %s:%s", server, port)
+				receivers.append(Receiver(server, port))
+		else:
+			# SOCK_DGRAM is the socket type to use for UDP sockets
+			udpSocket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+	except:
+		logging.error("cannot initialize %s-socket", globalVars.config.get("jsonSocket", "protocol"))
+		logging.debug("cannot initialize %s-socket", globalVars.config.get("jsonSocket", "protocol"), exc_info=True)
+		raise
 	return
 
 
+##
+#
+# onUnload function of plugin
+# will be called one time by the pluginLoader on shutdown
+#
+def onUnload():
+	"""
+	Send the buffered messages and close the connections
+
+	@return:    nothing
+	"""
+	for receiver in receivers:
+		receiver.stop(2)
+	if udpSocket:
+		udpSocket.close()
+
+
 ##
 #
 # Main function of jsonSocket-plugin
@@ -47,6 +211,8 @@ def run(typ,freq,data):
 	It will send the data via UDP/TCP
 
 	The configuration for the Connection is set in the config.ini.
+	Every message is one JSON object followed by a line break (newline-delimited JSON).
+	In TCP mode the message is put into the send buffer of every server.
 
 	@type    typ:  string (FMS|ZVEI|POC)
 	@param   typ:  Typ of the dataset for sending via UDP/TCP
@@ -62,48 +228,26 @@ def run(typ,freq,data):
 	try:
 		if configHandler.checkConfig("jsonSocket"): #read and debug the config
 
-			try:
-					#
-				# initialize to socket-Server
-				#
-				# SOCK_DGRAM is the socket type to use for UDP sockets
-				# SOCK_STREAM is the socket type to use for TCP sockets
-				if globalVars.config.get("jsonSocket", "protocol") == "TCP":
-					sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-					sock.connect((globalVars.config.get("jsonSocket", "server"), globalVars.config.getint("jsonSocket", "port")))
-				else:
-					sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-
-			except:
-				logging.error("cannot initialize %s-socket", globalVars.config.get("jsonSocket", "protocol"))
-				logging.debug("cannot initialize %s-socket", globalVars.config.get("jsonSocket", "protocol"), exc_info=True)
-				# Without connection, plugin couldn't work
-				return
-
-			else:
-				# toDo is equals for all types, so only check if typ is supported
-				supportedTypes = ["FMS", "ZVEI", "POC"]
-				if typ in supportedTypes:
-					logging.debug("Start %s to %s", typ, globalVars.config.get("jsonSocket", "protocol"))
-					try:
-						# dump data to json-string
-						sendData = json.dumps(data)
-						# send data
-						sock.sendto(sendData, (globalVars.config.get("jsonSocket", "server"), globalVars.config.getint("jsonSocket", "port")))
-					except:
-						logging.error("%s to %s failed", typ, globalVars.config.get("jsonSocket", "protocol"))
-						logging.debug("%s to %s failed", typ, globalVars.config.get("jsonSocket", "protocol"), exc_info=True)
-						return
-
-				else:
-					logging.warning("Invalid Typ: %s", typ)
-
-			finally:
-				logging.debug("close %s-Connection", globalVars.config.get("jsonSocket", "protocol"))
+			# toDo is equals for all types, so only check if typ is supported
+			supportedTypes = ["FMS", "ZVEI", "POC"]
+			if typ in supportedTypes:
+				logging.debug("Start %s to %s", typ, globalVars.config.get("jsonSocket", "protocol"))
 				try:
-					sock.close()
+					# dump data to json-string, one message per line
+					sendData = json.dumps(data) + "\n"
+					if udpSocket:
+						for server in getServers():
+							udpSocket.sendto(sendData, server)
+					else:
+						for receiver in receivers:
+							receiver.put(sendData)
 				except:
-					pass
+					logging.error("%s to %s failed", typ, globalVars.config.get("jsonSocket", "protocol"))
+					logging.debug("%s to %s failed", typ, globalVars.config.get("jsonSocket", "protocol"), exc_info=True)
+					return
+
+			else:
+				logging.warning("Invalid Typ: %s", typ)
 
 	except:
 		# something very mysterious